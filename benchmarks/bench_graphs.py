@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_graphs.py
+
+Compara os dois motores de grafo do agente (NetworkxGraph e CompactGraph) num grafo em grelha
+com pesos aleatórios: memória ocupada, tempo de construção e tempo de uma pesquisa de caminhos
+mais curtos a partir de uma origem (a mesma usada por PathCache).
+Uso: python benchmarks/bench_graphs.py
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+SIDES = [10, 50, 150]
+SOURCES = 5
+
+
+def build(graph, side):
+    """Constrói uma grelha side x side, com as arestas adicionadas por ordem, como no mapa do agente."""
+    rng = random.Random(side)
+    g = graph()
+    for i in range(side):
+        for j in range(side):
+            if i + 1 < side:
+                g.add_edge((i, j), (i + 1, j), weight=rng.uniform(1.0, 10.0))
+            if j + 1 < side:
+                g.add_edge((i, j), (i, j + 1), weight=rng.uniform(1.0, 10.0))
+    return g
+
+
+def run():
+    print("{0:>8}  {1:>14}  {2:>12}  {3:>12}  {4:>14}".format("nodos", "motor", "memória KiB", "criação ms", "Dijkstra ms"))
+    for side in SIDES:
+        for graph in (agente.NetworkxGraph, agente.CompactGraph):
+            tracemalloc.start()
+            start = time.perf_counter()
+            g = build(graph, side)
+            built = time.perf_counter() - start
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            cache = agente.PathCache(g)
+            start = time.perf_counter()
+            for k in range(SOURCES):
+                cache.row((k, k))
+            search = (time.perf_counter() - start) / SOURCES
+
+            print("{0:>8}  {1:>14}  {2:>12.1f}  {3:>12.2f}  {4:>14.2f}".format(
+                side * side, graph.__name__, memory / 1024, built * 1e3, search * 1e3))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_instrumentation.py
+
+Mede o custo da instrumentação (agente.Instrumentation) num episódio do simulador headless:
+ciclos por segundo com a instrumentação nunca ligada, ligada, e ligada e depois desligada.
+Uso: python benchmarks/bench_instrumentation.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import simulador
+
+
+TICKS = 20000
+SEED = 2
+REPEAT = 3
+
+
+def episode(mode):
+    """Executa um episódio e devolve os ciclos por segundo (o melhor de REPEAT)."""
+    best = 0.0
+    for _ in range(REPEAT):
+        simulator = simulador.Simulator()
+        instrumentation = simulator.session.instrumentation
+        if mode != "desligada":
+            instrumentation.enable()
+        if mode == "religada":
+            instrumentation.disable()
+        elapsed = simulator.run(simulador.RandomExplorer(SEED), TICKS)
+        best = max(best, TICKS / elapsed)
+    return (best, instrumentation)
+
+
+def run():
+    print("{0:>14}  {1:>12}".format("instrumentação", "ciclos/s"))
+    for mode in ("desligada", "ligada", "religada"):
+        (rate, instrumentation) = episode(mode)
+        print("{0:>14}  {1:>12.0f}".format(mode, rate))
+    (_, instrumentation) = episode("ligada")
+    print()
+    print(instrumentation.toText())
+
+
+if __name__ == "__main__":
+    run()
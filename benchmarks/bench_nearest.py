@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_nearest.py
+
+Compara o índice espacial do agente (SpatialIndex) com a pesquisa original do médico mais próximo
+(calcular a distância a todos e ordenar a lista) para cada vez mais pessoas registadas.
+A densidade é a do piso original (cerca de 38 objetos em 800x600), pelo que o piso cresce com o número de pontos.
+Uso: python benchmarks/bench_nearest.py
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+SIZES = [38, 1000, 10000, 100000]
+QUERIES = 5000
+DENSITY = 38 / (800 * 600)
+
+
+def linear(points, x, y):
+    """Pesquisa original: distância a todos os pontos, ordenada, e o primeiro."""
+    return sorted([(math.hypot(px - x, py - y), value) for (px, py, value) in points], key=lambda p: p[0])[0]
+
+
+def run():
+    print("{0:>10}  {1:>14}  {2:>14}  {3:>14}".format("pontos", "ordenação µs", "grelha µs", "raio µs"))
+    for size in SIZES:
+        rng = random.Random(size)
+        side = int(math.sqrt(size / DENSITY))
+        points = [(rng.uniform(0, side), rng.uniform(0, side), "p{0}".format(i)) for i in range(size)]
+        index = agente.SpatialIndex()
+        for (x, y, value) in points:
+            index.add(x, y, value)
+        queries = [(rng.uniform(0, side), rng.uniform(0, side)) for _ in range(QUERIES)]
+
+        n = min(QUERIES, max(20, 2000000 // size))
+        start = time.perf_counter()
+        for (x, y) in queries[:n]:
+            expected = linear(points, x, y)
+        scan = (time.perf_counter() - start) / n
+
+        start = time.perf_counter()
+        for (x, y) in queries:
+            found = index.nearest(x, y, 1)
+        grid = (time.perf_counter() - start) / QUERIES
+
+        start = time.perf_counter()
+        for (x, y) in queries:
+            found = index.within(x, y, 100)
+        radius = (time.perf_counter() - start) / QUERIES
+
+        assert all(index.nearest(x, y, 1)[0] == linear(points, x, y) for (x, y) in queries[:20])
+        print("{0:>10}  {1:>14.2f}  {2:>14.2f}  {3:>14.2f}".format(size, scan * 1e6, grid * 1e6, radius * 1e6))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_paths.py
+
+Mede a latência das perguntas 3 e 5 em função do número de perguntas feitas por tick.
+Em cada tick o robot muda de divisão, o que altera o grafo map; a primeira pergunta após a alteração
+atualiza a cache de caminhos e as seguintes são simples consultas.
+Para comparação, é também medida a abordagem anterior (uma pesquisa A* por sala de destino).
+Uso: python benchmarks/bench_paths.py
+"""
+
+import os
+import sys
+import time
+
+import networkx as nx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+# Divisões visitadas para construir o mapa, pela ordem do percurso
+TOUR = [1, 5, 1, 6, 1, 7, 1, 3, 8, 3, 9, 3, 10, 3, 4, 11, 4, 12, 4, 13, 4, 14, 4, 2, 1, 0, 1]
+QUERIES_PER_TICK = [1, 2, 4, 8, 16, 32]
+TICKS = 200
+
+
+def explore():
+    """Cria uma sessão e percorre as divisões de TOUR, com uma sala de enfermeiros na sala 12."""
+    session = agente.AgentSession()
+    for room in TOUR:
+        objects = ["mesa_mesa4", "cadeira_cadeira7"] if room == 12 else []
+        session.work(list(session.hospital.getRoomMidPoint(room)), 100.0, objects)
+    return session
+
+
+def legacy(hospital, position, targets):
+    """Abordagem anterior: o robot é adicionado ao grafo e é feita uma pesquisa A* por destino."""
+    graph = hospital.getMapGraph()
+    graph.add_node(agente.MAP_ROBOT)
+    for e in list(nx.all_neighbors(graph, hospital.roomToStr(hospital.getRoomIndex()))):
+        if e != agente.MAP_ROBOT:
+            graph.add_edge(agente.MAP_ROBOT, e, weight=agente.Utils.distance(graph.nodes[e][agente.MAP_MIDPOINT], position))
+    for t in targets:
+        nx.astar_path(graph, agente.MAP_ROBOT, t)
+        nx.astar_path_length(graph, agente.MAP_ROBOT, t)
+    graph.remove_node(agente.MAP_ROBOT)
+
+
+def run():
+    print("{0:>12}  {1:>16}  {2:>16}".format("perguntas", "cache µs/perg.", "A* µs/perg."))
+    for k in QUERIES_PER_TICK:
+        session = explore()
+        hospital = session.hospital
+        targets = [hospital.roomToStr(12), hospital.roomToStr(0)]
+        cached, astar = 0.0, 0.0
+
+        for i in range(TICKS):
+            # Alterna entre o corredor 4 e a sala 13, com a porta em posições ligeiramente diferentes
+            room = 13 if i % 2 else 4
+            x = 500 + (i % 7)
+            session.work([x, 440 if room == 4 else 470], 100.0, [])
+
+            start = time.perf_counter()
+            for _ in range(k):
+                for t in targets:
+                    hospital.getDistanceFromRobot(t)
+            cached += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(k):
+                legacy(hospital, session.robot.getPosition(), targets)
+            astar += time.perf_counter() - start
+
+        n = TICKS * k * len(targets)
+        print("{0:>12}  {1:>16.2f}  {2:>16.2f}".format(k, cached / n * 1e6, astar / n * 1e6))
+
+
+if __name__ == "__main__":
+    run()
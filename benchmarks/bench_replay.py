@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_replay.py
+
+Mede o custo do registo binário das leituras dos sensores e a velocidade da sua reprodução:
+grava episódios do simulador headless (com e sem registo) e reproduz o registo numa sessão nova,
+verificando que as respostas da sessão reproduzida são as da sessão original.
+Uso: python benchmarks/bench_replay.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+import mundo
+import registo
+import simulador
+
+
+TICKS = [5000, 20000, 50000]
+SEED = 1
+
+
+def episode(ticks, log=None):
+    """Executa um episódio do simulador headless e devolve (sessão, tempo gasto em work())."""
+    session = agente.AgentSession(clock=agente.TickClock(1 / mundo.FPS), log=log)
+    simulator = simulador.Simulator(session)
+    controller = simulador.RandomExplorer(SEED)
+    elapsed = 0.0
+    for _ in range(ticks):
+        keys = controller(simulator)
+        start = time.perf_counter()
+        simulator.step(keys)
+        elapsed += time.perf_counter() - start
+    return (session, elapsed)
+
+
+def answers(session):
+    return [getattr(session, "resp{0}".format(q))() for q in range(1, 9)]
+
+
+def run():
+    print("{0:>8}  {1:>14}  {2:>14}  {3:>14}  {4:>12}".format("ciclos", "sem registo/s", "com registo/s", "reprodução/s", "bytes/ciclo"))
+    with tempfile.TemporaryDirectory() as folder:
+        for ticks in TICKS:
+            path = os.path.join(folder, "episodio{0}.log".format(ticks))
+            (_, plain) = episode(ticks)
+            with registo.TickLogWriter(path) as log:
+                (original, logged) = episode(ticks, log)
+
+            start = time.perf_counter()
+            (session, count) = registo.replay(path)
+            replayed = time.perf_counter() - start
+
+            assert count == ticks and answers(session) == answers(original)
+            print("{0:>8}  {1:>14.0f}  {2:>14.0f}  {3:>14.0f}  {4:>12.1f}".format(
+                ticks, ticks / plain, ticks / logged, ticks / replayed, os.path.getsize(path) / ticks))
+
+
+if __name__ == "__main__":
+    run()
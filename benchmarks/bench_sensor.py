@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_sensor.py
+
+Compara o sensor do simulador (índice em grelha) com a pesquisa linear do simulador original
+em pisos com cada vez mais objetos. A densidade de objetos é a do piso original (cerca de 38 em 800x600),
+pelo que o piso cresce com o número de objetos.
+Uso: python benchmarks/bench_sensor.py
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import simulador
+
+
+SIZES = [38, 1000, 10000, 100000]
+QUERIES = 20000
+DENSITY = 38 / (800 * 600)
+
+
+def linear(items, x, y):
+    """Pesquisa do simulador original: uma distância de Manhattan por objeto."""
+    return [value for ((ox, oy), value) in items if abs(x - ox) + abs(y - oy) < simulador.SENSOR_RANGE]
+
+
+def run():
+    print("{0:>10}  {1:>14}  {2:>14}".format("objetos", "linear µs", "grelha µs"))
+    for size in SIZES:
+        rng = random.Random(size)
+        side = int(math.sqrt(size / DENSITY))
+        items = [((rng.randrange(side), rng.randrange(side)), "obj{0}".format(i)) for i in range(size)]
+        index = simulador.ProximityIndex(simulador.SENSOR_RANGE, items)
+        queries = [(rng.randrange(side), rng.randrange(side)) for _ in range(QUERIES)]
+
+        n = min(QUERIES, max(20, 2000000 // size))
+        start = time.perf_counter()
+        for (x, y) in queries[:n]:
+            expected = linear(items, x, y)
+        scan = (time.perf_counter() - start) / n
+
+        start = time.perf_counter()
+        for (x, y) in queries:
+            found = index.near(x, y)
+        grid = (time.perf_counter() - start) / QUERIES
+
+        assert all(index.near(x, y) == linear(items, x, y) for (x, y) in queries[:20])
+        print("{0:>10}  {1:>14.2f}  {2:>14.2f}".format(size, scan * 1e6, grid * 1e6))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_sessions.py
+
+Mede a memória ocupada por várias sessões do agente a correr no mesmo processo.
+Uso: python benchmarks/bench_sessions.py [número de sessões]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+# Percurso curto que atravessa o corredor 1, a sala 5 e o corredor 2
+TICKS = [
+    ([100 + 5 * i, 100], 100.0 - 0.01 * i, []) for i in range(20)
+] + [
+    ([200, 100 + 5 * i], 99.0 - 0.01 * i, ["cama_cama5"] if i > 25 else []) for i in range(40)
+]
+
+
+def run(sessions):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    pool = [agente.AgentSession() for _ in range(sessions)]
+    for session in pool:
+        for (position, battery, objects) in TICKS:
+            session.work(position, battery, objects)
+
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = after - before
+    print("sessões:           {0}".format(sessions))
+    print("memória total:     {0:.1f} KiB".format(total / 1024))
+    print("memória/sessão:    {0:.1f} KiB".format(total / 1024 / sessions))
+    print("pico:              {0:.1f} KiB".format(peak / 1024))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
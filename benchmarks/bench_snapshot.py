@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_snapshot.py
+
+Mede o tempo de guardar (estado.dumps) e de carregar (estado.loads) instantâneos de hospitais sintéticos
+com cada vez mais salas, e o seu tamanho. Verifica que um instantâneo carregado e guardado de novo é idêntico.
+Uso: python benchmarks/bench_snapshot.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+import estado
+import sintetico
+
+
+SIZES = [100, 1000, 10000]
+
+
+def run():
+    print("{0:>8}  {1:>8}  {2:>10}  {3:>12}  {4:>12}  {5:>12}".format(
+        "salas", "objetos", "arestas", "guardar ms", "carregar ms", "tamanho KiB"))
+    for rooms in SIZES:
+        session = sintetico.syntheticSession(rooms)
+        state = session.getState()
+
+        start = time.perf_counter()
+        data = estado.dumps(session)
+        saved = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored = estado.loads(data, clock=agente.TickClock())
+        loaded = time.perf_counter() - start
+
+        assert estado.dumps(restored) == data
+        print("{0:>8}  {1:>8}  {2:>10}  {3:>12.1f}  {4:>12.1f}  {5:>12.1f}".format(
+            rooms, len(state['hospital']['objects']), len(state['hospital']['mapAdjacency'][1]) // 2,
+            saved * 1e3, loaded * 1e3, len(data) / 1024))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench_things.py
+
+Mede o custo de work() à medida que o registo de objetos já vistos cresce.
+O custo por tick deve manter-se constante, independentemente do tamanho do registo.
+Uso: python benchmarks/bench_things.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+SIZES = [0, 1000, 10000, 100000]
+TICKS = 5000
+
+
+def run():
+    print("{0:>10}  {1:>12}".format("registo", "µs/tick"))
+    for size in SIZES:
+        session = agente.AgentSession()
+
+        # Preenche o registo com pessoas e objetos fictícios
+        for i in range(size):
+            category = agente.CATEGORY_ALL[i % len(agente.CATEGORY_ALL)]
+            session.things.add(category, "fake{0}".format(i))
+
+        # Cada tick reporta objetos já conhecidos, o caso mais frequente durante a exploração:
+        # os três primeiros objetos do registo ou, com o registo vazio, três objetos que o primeiro tick regista
+        known = session.things.getListOfObjects()[:3] or [(category, "fake") for category in agente.CATEGORY_OBJECT[:3]]
+        objects = ["{0}_{1}".format(category, name) for (category, name) in known]
+        session.work([100, 100], 100.0, objects)
+        start = time.perf_counter()
+        for i in range(TICKS):
+            session.work([100 + (i % 40), 100], 100.0 - (i + 1) * 1e-4, objects)
+        elapsed = time.perf_counter() - start
+
+        print("{0:>10}  {1:>12.2f}".format(size, elapsed / TICKS * 1e6))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+sintetico.py
+
+Hospitais sintéticos para os benchmarks: um piso em grelha com o número de salas pedido, ligadas por portas
+(uma árvore de cobertura, para que todas as salas sejam alcançáveis, mais algumas portas ao acaso),
+com pessoas e objetos ao acaso em cada sala. O modelo do mundo é construído diretamente no formato de
+AgentSession.getState(), como se o robot já tivesse percorrido todo o piso, sem simular a exploração.
+As salas do piso (ver syntheticRooms()) e leituras dos sensores de um robot que o percorre (ver syntheticTicks())
+permitem continuar a sessão com work(), tal como o simulador faria.
+"""
+
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+
+
+# Lado de cada sala, em píxeis
+ROOM_SIZE = 150
+
+# Probabilidade de uma porta entre duas salas vizinhas que não estejam já ligadas pela árvore de cobertura
+EXTRA_DOORS = 0.2
+
+# Número médio de pessoas e objetos por sala
+OBJECTS_PER_ROOM = 3
+
+# Leituras sintéticas: deslocamento por ciclo, alcance do sensor (distância de Manhattan), consumo da bateria por ciclo
+# (como fração da carga), carga abaixo da qual a bateria é recarregada e probabilidade de uma pessoa nova numa sala
+STEP          = 5
+SENSOR_RANGE  = 50
+BATTERY_DRAIN = 2000.0
+BATTERY_LOW   = 20.0
+VISITORS      = 0.05
+
+
+def gridSide(rooms):
+    """Número de salas de cada fila da grelha."""
+    return int(math.ceil(math.sqrt(rooms)))
+
+
+def syntheticRooms(rooms):
+    """Devolve as salas do piso sintético de rooms salas, no formato de Hospital._rooms (ver AgentSession)."""
+    side = gridSide(rooms)
+    return [
+        [((r % side) * ROOM_SIZE, (r % side + 1) * ROOM_SIZE - 1), ((r // side) * ROOM_SIZE, (r // side + 1) * ROOM_SIZE - 1)]
+        for r in range(rooms)
+    ]
+
+
+def syntheticState(rooms, seed=0, objects=OBJECTS_PER_ROOM):
+    """Devolve o estado de uma sessão (ver AgentSession.getState()) com um piso de rooms salas em grelha.
+    A sala 0 (escadas) fica num canto; as pessoas e os objetos têm nomes únicos."""
+    rng = random.Random(seed)
+    side = gridSide(rooms)
+    cell = lambda r: (r % side, r // side)
+    geometry = syntheticRooms(rooms)
+    center = lambda r: agente.Utils.midpoint(*geometry[r])      # Tal como Hospital.getRoomMidPoint()
+
+    # Portas: árvore de cobertura aleatória (Prim) sobre a grelha, mais algumas portas extra
+    def neighbors(r):
+        (x, y) = cell(r)
+        for (dx, dy) in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            if 0 <= x + dx < side and 0 <= y + dy < side and (y + dy) * side + x + dx < rooms:
+                yield (y + dy) * side + x + dx
+
+    doors, visited, frontier = [], {0}, [(0, n) for n in neighbors(0)]
+    while frontier:
+        (a, b) = frontier.pop(rng.randrange(len(frontier)))
+        if b not in visited:
+            visited.add(b)
+            doors.append((a, b))
+            frontier += [(b, n) for n in neighbors(b) if n not in visited]
+    tree = set((min(a, b), max(a, b)) for (a, b) in doors)
+    doors += [(a, b) for a in range(rooms) for b in neighbors(a)
+              if a < b and (a, b) not in tree and rng.random() < EXTRA_DOORS]
+
+    # Grafo map: salas e portas, com as arestas sala-porta e porta-porta dentro de cada sala
+    position = {}
+    for r in range(rooms):
+        position[agente.Hospital.roomToStr(r)] = center(r)
+    for (a, b) in doors:
+        (ca, cb) = (center(a), center(b))
+        position[agente.Hospital.doorToStr(a, b)] = ((ca[0] + cb[0]) / 2, (ca[1] + cb[1]) / 2)
+    byRoom = {r: [] for r in range(rooms)}
+    for (a, b) in doors:
+        byRoom[a].append(b)
+        byRoom[b].append(a)
+    floor, floorMap = agente.NetworkxGraph(), agente.NetworkxGraph()
+    floor.add_nodes_from(range(rooms))
+    floor.add_edges_from((a, b) for (a, b) in doors)
+    floorMap.add_nodes_from(position)
+    for r in range(rooms):
+        room = agente.Hospital.roomToStr(r)
+        names = [agente.Hospital.doorToStr(r, n) for n in byRoom[r]]
+        edges = [(room, d) for d in names] + [(names[i], names[j]) for i in range(len(names)) for j in range(i + 1, len(names))]
+        for (u, v) in edges:
+            floorMap.add_edge(u, v, weight=agente.Utils.distance(position[u], position[v]))
+    (_, floorPtr, floorIdx, _) = floor.getAdjacency()
+    (mapNodes, mapPtr, mapIdx, mapWeights) = floorMap.getAdjacency(weighted=True)
+
+    # Pessoas e objetos
+    people, things, items = [], [], []
+    for r in range(rooms):
+        (x0, y0) = (cell(r)[0] * ROOM_SIZE, cell(r)[1] * ROOM_SIZE)
+        for _ in range(rng.randrange(2 * objects + 1)):
+            category = rng.choice(agente.CATEGORY_ALL)
+            name = "{0}{1}".format(category, len(items))
+            items.append((r, category, name, (x0 + rng.uniform(10, ROOM_SIZE - 10), y0 + rng.uniform(10, ROOM_SIZE - 10))))
+            (people if category in agente.CATEGORY_PEOPLE else things).append((category, name))
+
+    # Robot: algumas leituras ao longo da primeira fila de salas
+    robot = agente.Robot(agente.TickClock())
+    for i in range(200):
+        robot.updateRobot((ROOM_SIZE / 2 + i * 5 % (side * ROOM_SIZE), ROOM_SIZE / 2), 100.0 - i * 0.05)
+
+    return {
+        'things': {
+            'people':       people,
+            'objects':      things,
+            'lastPeople':   (people[-1][1], people[-2][1]) if len(people) >= 2 else ("", ""),
+            'lastWasBlank': True
+        },
+        'robot': robot.getState(),
+        'hospital': {
+            'currentRoom':    0,
+            'lastVisited':    byRoom[0][0] if byRoom[0] else 0,
+            'floorNodes':     list(range(rooms)),
+            'floorAdjacency': (floorPtr, floorIdx),
+            'objects':        items,
+            'mapNodes':       [(n, position[n]) for n in mapNodes],
+            'mapAdjacency':   (mapPtr, mapIdx, mapWeights)
+        }
+    }
+
+
+def syntheticTicks(state, ticks, seed=0, visitors=VISITORS):
+    """Gera as leituras dos sensores (posição, bateria e objetos, como os argumentos de work()) de um robot que
+    percorre durante ticks ciclos o piso de um estado sintético (ver syntheticState()), a partir da sala atual:
+    vai de sala em sala pelas portas, passando por um ponto ao acaso de cada sala. O sensor reporta as pessoas e os
+    objetos da sala ao seu alcance; ao entrar numa sala aparece nela, com probabilidade visitors, uma pessoa nova.
+    O robot só volta às escadas (sala 0) se for a única saída, pois o agente não as regista como sala visitada."""
+    rng = random.Random(seed)
+    hospital = state['hospital']
+    rooms = len(hospital['floorNodes'])
+    side, geometry = gridSide(rooms), syntheticRooms(rooms)
+    (ptr, idx) = hospital['floorAdjacency']
+    doors = dict(hospital['mapNodes'])
+    sensed = {}
+    for (room, category, name, position) in hospital['objects']:
+        sensed.setdefault(room, []).append((position, category + agente.SEPARATOR + name))
+
+    def interior(r):
+        ((x0, x1), (y0, y1)) = geometry[r]
+        return (rng.randrange(x0 + 2 * STEP, x1 - 2 * STEP), rng.randrange(y0 + 2 * STEP, y1 - 2 * STEP))
+
+    def moves(a, b):
+        steps = max(1, int(math.ceil(agente.Utils.distance(a, b) / STEP)))
+        for k in range(1, steps + 1):
+            yield (int(round(a[0] + (b[0] - a[0]) * k / steps)), int(round(a[1] + (b[1] - a[1]) * k / steps)))
+
+    room = hospital['currentRoom']
+    position = agente.Utils.midpoint(*geometry[room])
+    battery, visitor, count = 100.0, 0, 0
+    while True:
+        neighbors = [n for n in idx[ptr[room]:ptr[room + 1]] if n != 0] or list(idx[ptr[room]:ptr[room + 1]])
+        target = rng.choice(neighbors)
+        if rng.random() < visitors:
+            category = rng.choice(agente.CATEGORY_PEOPLE)
+            sensed.setdefault(target, []).append((interior(target), "{0}{1}visitante{2}".format(category, agente.SEPARATOR, visitor)))
+            visitor += 1
+        for waypoint in (doors[agente.Hospital.doorToStr(room, target)], interior(target)):
+            for position in moves(position, waypoint):
+                here = (position[1] // ROOM_SIZE) * side + position[0] // ROOM_SIZE
+                objects = [name for ((x, y), name) in sensed.get(here, ())
+                           if abs(position[0] - x) + abs(position[1] - y) < SENSOR_RANGE]
+                yield (list(position), battery, objects)
+                count += 1
+                if count == ticks:
+                    return
+                battery -= battery / BATTERY_DRAIN
+                if battery < BATTERY_LOW:
+                    battery = 100.0
+        room = target
+
+
+def syntheticSession(rooms, seed=0, **options):
+    """Cria uma sessão com um hospital sintético de rooms salas (as opções são passadas a AgentSession)."""
+    options.setdefault('clock', agente.TickClock())
+    options.setdefault('rooms', syntheticRooms(rooms))
+    options.setdefault('corridors', ())     # O piso sintético não tem corredores
+    session = agente.AgentSession(**options)
+    session.setState(syntheticState(rooms, seed))
+    return session
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+suite.py
+
+Bateria de benchmarks dos caminhos críticos do agente, sobre hospitais sintéticos (ver sintetico.py) de 15, 1000 e
+50000 salas. Para cada tamanho, uma sessão com o piso já percorrido continua com leituras sintéticas dos sensores e mede:
+    work        ciclos por segundo de work() (instrumentação desligada)
+    resp1-8     latência de cada pergunta (percentil 50 e máximo, em µs), repetida QUERIES vezes depois dos ciclos
+    memory      memória (KiB) dos grafos floor e map de cada implementação (pico durante a construção,
+                a partir da adjacência do estado) e pico ao carregar a sessão completa
+Os resultados são guardados em JSON e comparados com uma baseline (por omissão, baselines.json, ao lado deste ficheiro),
+para que as regressões entre commits possam ser comparadas; os tempos só são comparáveis na mesma máquina.
+
+Uso: python benchmarks/suite.py [-t 15 1000 ...] [-o resultados.json]     (corre e compara com a baseline)
+     python benchmarks/suite.py -g                                        (corre e grava como nova baseline)
+     python benchmarks/suite.py -d antes.json depois.json                 (compara dois resultados, sem correr)
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sintetico
+import agente
+
+
+# Número de salas -> ciclos de work() medidos
+SIZES = {15: 20000, 1000: 5000, 50000: 1000}
+
+# Repetições de cada pergunta
+QUERIES = 20
+
+SEED = 0
+
+# Variação relativa a partir da qual uma métrica é assinalada como regressão (ou melhoria)
+TOLERANCE = 0.25
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+FORMAT    = 1
+
+GRAPHS = [('networkx', agente.NetworkxGraph), ('compact', agente.CompactGraph)]
+
+
+
+# -----------------------------------------------------------------------------
+# MEDIÇÕES
+# -----------------------------------------------------------------------------
+
+def traced(function):
+    """Executa uma função com o tracemalloc ligado e devolve (resultado, pico de memória em KiB)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (result, peak / 1024)
+
+
+def measureMemory(rooms, state):
+    """Memória dos grafos floor e map de cada implementação e pico ao carregar a sessão completa."""
+    hospital = state['hospital']
+    (floorPtr, floorIdx) = hospital['floorAdjacency']
+    mapNodes = [n for (n, _) in hospital['mapNodes']]
+    (mapPtr, mapIdx, mapWeights) = hospital['mapAdjacency']
+    memory = {}
+    for (name, graph) in GRAPHS:
+        def floor():
+            g = graph()
+            g.setAdjacency(hospital['floorNodes'], floorPtr, floorIdx)
+            return g
+        def floorMap():
+            g = graph()
+            g.setAdjacency(mapNodes, mapPtr, mapIdx, mapWeights)
+            return g
+        memory[name] = {'floor_kib': round(traced(floor)[1], 1), 'map_kib': round(traced(floorMap)[1], 1)}
+    memory['session_kib'] = round(traced(lambda: session(rooms, state))[1], 1)
+    return memory
+
+
+def session(rooms, state):
+    """Cria uma sessão com o piso de um estado sintético."""
+    s = agente.AgentSession(clock=agente.TickClock(), rooms=sintetico.syntheticRooms(rooms), corridors=())
+    s.setState(state)
+    return s
+
+
+def measureWork(s, ticks):
+    """Ciclos por segundo de work() ao longo das leituras dadas."""
+    work = s.work
+    gc.collect()
+    start = time.perf_counter()
+    for (position, battery, objects) in ticks:
+        work(position, battery, objects)
+    elapsed = time.perf_counter() - start
+    return {'ticks': len(ticks), 'time_s': round(elapsed, 4), 'ticks_per_s': round(len(ticks) / elapsed, 1)}
+
+
+def measureQueries(s):
+    """Latência de cada pergunta, com a instrumentação da sessão (a primeira chamada preenche as caches)."""
+    instrumentation = s.instrumentation
+    instrumentation.reset()
+    instrumentation.enable()
+    for question in range(1, 9):
+        respond = getattr(s, "resp{0}".format(question))
+        for _ in range(QUERIES):
+            respond()
+    instrumentation.disable()
+    stages = instrumentation.getSummary()['stages']
+    return {
+        "resp{0}".format(q): {
+            'p50_us': round(stages["resp{0}".format(q)]['p50_us'], 2),
+            'max_us': round(stages["resp{0}".format(q)]['max_us'], 2)
+        }
+        for q in range(1, 9)
+    }
+
+
+def measure(rooms, ticks):
+    """Todas as medições de um tamanho."""
+    state = sintetico.syntheticState(rooms, SEED)
+    stream = list(sintetico.syntheticTicks(state, ticks, SEED))
+    hospital = state['hospital']
+    result = {
+        'rooms':     rooms,
+        'objects':   len(hospital['objects']),
+        'map_nodes': len(hospital['mapNodes']),
+        'map_edges': len(hospital['mapAdjacency'][1]) // 2,
+        'memory':    measureMemory(rooms, state)
+    }
+    s = session(rooms, state)
+    result['work'] = measureWork(s, stream)
+    result['queries'] = measureQueries(s)
+    return result
+
+
+def run(sizes):
+    """Corre a bateria para os tamanhos dados e devolve os resultados."""
+    results = {}
+    for rooms in sizes:
+        start = time.perf_counter()
+        results[str(rooms)] = measure(rooms, SIZES.get(rooms, min(SIZES.values())))
+        print("{0:>6} salas: {1:.1f} s".format(rooms, time.perf_counter() - start), file=sys.stderr)
+    return {
+        'format':  FORMAT,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.machine()},
+        'date':    time.strftime("%Y-%m-%d"),
+        'results': results
+    }
+
+
+
+# -----------------------------------------------------------------------------
+# COMPARAÇÃO
+# -----------------------------------------------------------------------------
+
+def metrics(result):
+    """Métricas comparáveis de um tamanho: (nome, valor, sentido), com sentido 1 se menor é melhor e -1 se maior é melhor.
+    Os máximos das perguntas (a primeira chamada, sem caches) são demasiado ruidosos e não são comparados."""
+    yield ('work.ticks_per_s', result['work']['ticks_per_s'], -1)
+    for (question, latency) in sorted(result['queries'].items()):
+        yield ("{0}.p50_us".format(question), latency['p50_us'], 1)
+    for (name, memory) in sorted(result['memory'].items()):
+        if isinstance(memory, dict):
+            for (graph, value) in sorted(memory.items()):
+                yield ("memory.{0}.{1}".format(name, graph), value, 1)
+        else:
+            yield ("memory.{0}".format(name), memory, 1)
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """Imprime a variação de cada métrica em relação à baseline e devolve o número de regressões."""
+    regressions = 0
+    print("{0:>6}  {1:<28}  {2:>12}  {3:>12}  {4:>8}".format("salas", "métrica", "baseline", "atual", "variação"))
+    for (rooms, result) in current['results'].items():
+        before = baseline['results'].get(rooms)
+        if before is None:
+            continue
+        old = {name: value for (name, value, _) in metrics(before)}
+        for (name, value, sense) in metrics(result):
+            if name not in old:
+                continue
+            change = (value - old[name]) / old[name] if old[name] else 0.0
+            mark = ""
+            if change * sense > tolerance:
+                mark = "  regressão"
+                regressions += 1
+            elif change * sense < -tolerance:
+                mark = "  melhoria"
+            print("{0:>6}  {1:<28}  {2:>12.1f}  {3:>12.1f}  {4:>+7.0%}{5}".format(rooms, name, old[name], value, change, mark))
+    return regressions
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+
+
+# -----------------------------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Bateria de benchmarks do agente sobre hospitais sintéticos.")
+    parser.add_argument('-t', type=int, nargs='+', default=sorted(SIZES), help="número de salas de cada hospital")
+    parser.add_argument('-b', default=BASELINES, help="ficheiro da baseline")
+    parser.add_argument('-o', default=None, help="gravar também os resultados neste ficheiro")
+    parser.add_argument('-g', action='store_true', help="gravar os resultados como nova baseline")
+    parser.add_argument('-l', type=float, default=TOLERANCE, help="variação relativa assinalada como regressão")
+    parser.add_argument('-d', nargs=2, metavar=('ANTES', 'DEPOIS'), help="comparar dois ficheiros de resultados")
+    args = parser.parse_args()
+
+    if args.d:
+        regressions = compare(load(args.d[0]), load(args.d[1]), args.l)
+        sys.exit(1 if regressions else 0)
+
+    results = run(args.t)
+    if args.o:
+        save(results, args.o)
+    if args.g:
+        save(results, args.b)
+        print(json.dumps(results['results'], indent=2))
+    elif os.path.exists(args.b):
+        regressions = compare(load(args.b), results, args.l)
+        sys.exit(1 if regressions else 0)
+    else:
+        print(json.dumps(results['results'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,16 @@ agente.py
 41381, Igor Cordeiro Bordalo Nunes
 """
 
+import collections
+import functools
+import heapq
+import json
+import math
+import threading
 import time
 
+from array import array
+
 # A biblioteca networkx fornece métodos para trabalhar com grafos
 import networkx as nx
 
@@ -34,6 +42,19 @@ CATEGORY_FURNITURE = [OBJ_BED, OBJ_CHAIR, OBJ_TABLE]                # Mobília
 CATEGORY_ALL       = CATEGORY_PEOPLE + CATEGORY_OBJECT              # Todos
 
 
+# Estrutura da rede Bayesiana sobre a presença de cada categoria numa sala: categoria -> categorias pais.
+# A mobília determina o tipo de sala, que por sua vez condiciona os livros e as pessoas que lá se encontram.
+NETWORK_DEFAULT = {
+    OBJ_BED:     [],
+    OBJ_CHAIR:   [],
+    OBJ_TABLE:   [],
+    OBJ_BOOK:    [OBJ_CHAIR, OBJ_BED],
+    OBJ_NURSE:   [OBJ_CHAIR, OBJ_TABLE],
+    OBJ_PATIENT: [OBJ_BED, OBJ_NURSE],
+    OBJ_DOCTOR:  [OBJ_BED, OBJ_PATIENT]
+}
+
+
 # O separador utilizado pelo robot para distinguir a categoria do nome do objeto
 SEPARATOR = '_'
 
@@ -50,12 +71,14 @@ ROOM_CORRIDOR = 1
 ROOM_BEDROOM  = 2
 ROOM_NURSES   = 3
 ROOM_WAITING  = 4
+ROOM_STAIRS   = 5
 ROOM_DESCRIPTION = [
     "Não tenho informação suficiente para determinar",
     "Corredor",
     "Quarto",
     "Sala de enfermeiros",
-    "Sala de espera"
+    "Sala de espera",
+    "Escadas"
 ]
 
 # DIR_*: Codifica cada direção do robot com um inteiro
@@ -75,68 +98,177 @@ ERROR_NOT_ENOUGH_PEOPLE = "Não foram encontradas pelo menos 2 pessoas até ao m
 # Posição inicial do robot segundo o enunciado
 INIT_POS = (100, 100)
 
+# Tolerância na comparação de distâncias (erros de arredondamento)
+EPSILON = 1e-9
+
+# Valor crítico da distribuição normal para os intervalos de confiança a 95%
+CONFIDENCE_Z = 1.96
+
+# Duração de um ciclo do simulador, em segundos (50 ciclos por segundo)
+CLOCK_TICK = 1 / 50
+
+# Número de bits de precisão dos histogramas de latência: 2^5 = 32 divisões por potência de 2 (erro relativo < 3.2%)
+HISTOGRAM_BITS = 5
+
+# Percentis indicados nos resumos da instrumentação
+PERCENTILES = [50, 90, 99, 99.9]
+
+# Número máximo de linhas da cache de caminhos; cada linha ocupa memória proporcional ao número de nodos do grafo map
+PATH_CACHE_ROWS = 32
+
 
 # -----------------------------------------------------------------------------
 # CLASSES
 # -----------------------------------------------------------------------------
 
-class LinearFunction:
-    """Esta classe gere uma função linear do tipo y=mx+b."""
+class LinearEstimator:
+    """Estimador online de uma reta y = mx + b pelo método dos mínimos quadrados.
+    Guarda apenas somas acumuladas (pesadas) das amostras, pelo que cada atualização tem custo constante.
+    As subclasses definem o peso das amostras antigas: todas iguais, com decaimento exponencial ou numa janela fixa.
+    Os valores de x são guardados relativamente à primeira amostra, para evitar erros de arredondamento."""
 
     def __init__(self):
-        self._m = 0.0           # Declive
-        self._b = 0.0           # Intersecção com o eixo YY
-        self._p = (0, 0)        # Ponto A: primeiro ponto da reta
-        self._q = (0, 0)        # Ponto B: segundo ponto da reta
-        self._defined = False   # Flag que indica se a função está definida
-
-    def setFrom2Points(self, p, q):
-        """Define a função dados dois pontos"""
-        try:
-            m = (p[1] - q[1]) / (p[0] - q[0])
-            b = p[1] - m * p[0]
-            self._p = tuple(p)
-            self._q = tuple(q)
-            self._m = m
-            self._b = b
-            self._defined = True
-        except:
-            self._defined = False
-    
-    def setPointB(self, q):
-        """Redefine a função mudando o ponto B e mantendo o ponto A"""
-        self.setFrom2Points(self._p, q)
-    
+        self.reset()
+
+    def reset(self):
+        """Reinicia a instância ao estado inicial"""
+        self._origin = None     # Primeira abcissa
+        self._count  = 0        # Número de amostras
+        self._w   = 0.0         # Soma dos pesos
+        self._sx  = 0.0         # Somas pesadas de x, y, x², xy e y²
+        self._sy  = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+        self._syy = 0.0
+
+    def _accumulate(self, x, y, w):
+        self._w   += w
+        self._sx  += w * x
+        self._sy  += w * y
+        self._sxx += w * x * x
+        self._sxy += w * x * y
+        self._syy += w * y * y
+
+    def add(self, x, y):
+        """Acrescenta a amostra (x, y)"""
+        if self._origin is None:
+            self._origin = x
+        self._count += 1
+        self._accumulate(x - self._origin, y, 1.0)
+
+    def _moments(self):
+        """Devolve as médias de x e y e as somas centradas de x², xy e y²."""
+        mx, my = self._sx / self._w, self._sy / self._w
+        return (mx, my,
+                max(self._sxx - self._w * mx * mx, 0.0),
+                self._sxy - self._w * mx * my,
+                max(self._syy - self._w * my * my, 0.0))
+
+    def _variance(self, sxx, sxy, syy):
+        """Variância dos resíduos, ou 0.0 se não houver amostras suficientes para a estimar."""
+        if self._count <= 2 or self._w <= 2.0 or sxx <= 0.0:
+            return 0.0
+        return max(syy - sxy * sxy / sxx, 0.0) / (self._w - 2.0)
+
+    def isDefined(self):
+        """Indica se a reta está definida (pelo menos duas amostras com abcissas diferentes)"""
+        return self._count >= 2 and self._w > 0.0 and self._moments()[2] > EPSILON
+
+    def getSlope(self):
+        """Devolve o declive da reta"""
+        (_, _, sxx, sxy, _) = self._moments()
+        return sxy / sxx
+
     def getY(self, x):
         """Dado um valor X, devolve o Y correspondente"""
-        return self._m * x + self._b
-    
+        (mx, my, sxx, sxy, _) = self._moments()
+        return my + sxy / sxx * (x - self._origin - mx)
+
     def getX(self, y):
-        """Dado um valor Y, devolve o X correspondente"""
-        if self._m != 0.0:
-            return (y - self._b) / self._m
-        else:
-            return self._b
-    
-    def getPointA(self):
-        """Retorna o ponto A da reta"""
-        return self._p
-    
-    def getPointB(self):
-        """Retorna o ponto B da reta"""
-        return self._q
-    
-    def isDefined(self):
-        """Indica se a função está corretamente definida"""
-        return self._defined
-    
+        """Dado um valor Y, devolve o X correspondente e o respetivo intervalo de confiança: (x, mínimo, máximo)"""
+        (mx, my, sxx, sxy, syy) = self._moments()
+        m = sxy / sxx
+        if m == 0.0:
+            raise ZeroDivisionError("Horizontal line")
+        x = mx + (y - my) / m
+        s2 = self._variance(sxx, sxy, syy)
+        error = CONFIDENCE_Z * math.sqrt(s2 / self._w + (x - mx) ** 2 * s2 / sxx) / abs(m)
+        x += self._origin
+        return (x, x - error, x + error)
+
+    def getMeanY(self):
+        """Devolve a média pesada de Y e o respetivo intervalo de confiança: (média, mínimo, máximo)"""
+        (_, my, sxx, sxy, syy) = self._moments()
+        error = CONFIDENCE_Z * math.sqrt(self._variance(sxx, sxy, syy) / self._w)
+        return (my, my - error, my + error)
+
+    def getState(self):
+        """Devolve o estado do estimador (a classe, a primeira abcissa, o número de amostras e as somas)."""
+        return {
+            'kind':   type(self).__name__,
+            'origin': self._origin,
+            'count':  self._count,
+            'sums':   (self._w, self._sx, self._sy, self._sxx, self._sxy, self._syy)
+        }
+
+    def setState(self, state):
+        """Repõe um estado devolvido por getState() por um estimador da mesma classe."""
+        if state['kind'] != type(self).__name__:
+            raise ValueError("Estimator {0} cannot restore the state of {1}".format(type(self).__name__, state['kind']))
+        self._origin = state['origin']
+        self._count  = state['count']
+        (self._w, self._sx, self._sy, self._sxx, self._sxy, self._syy) = state['sums']
+
+
+
+class LeastSquaresEstimator(LinearEstimator):
+    """Mínimos quadrados sobre todas as amostras desde a última reinicialização."""
+    pass
+
+
+
+class EwmaEstimator(LinearEstimator):
+    """Mínimos quadrados com pesos que decaem exponencialmente: em cada amostra, os pesos anteriores são multiplicados por 1 - alpha."""
+
+    def __init__(self, alpha=0.05):
+        self._alpha = alpha
+        super().__init__()
+
+    def add(self, x, y):
+        decay = 1.0 - self._alpha
+        self._w, self._sx, self._sy = self._w * decay, self._sx * decay, self._sy * decay
+        self._sxx, self._sxy, self._syy = self._sxx * decay, self._sxy * decay, self._syy * decay
+        super().add(x, y)
+
+
+
+class WindowEstimator(LinearEstimator):
+    """Mínimos quadrados sobre as últimas size amostras. A amostra mais antiga é retirada das somas em cada atualização."""
+
+    def __init__(self, size=250):
+        self._size = size
+        super().__init__()
+
     def reset(self):
-        """Reinicia a instância ao estado inicial"""
-        self._m = 0.0
-        self._b = 0.0
-        self._p = (0, 0)
-        self._q = (0, 0)
-        self._defined = False
+        super().reset()
+        self._window = collections.deque()
+
+    def add(self, x, y):
+        super().add(x, y)
+        self._window.append((x - self._origin, y))
+        if len(self._window) > self._size:
+            (ox, oy) = self._window.popleft()
+            self._accumulate(ox, oy, -1.0)
+            self._count -= 1
+
+    def getState(self):
+        state = super().getState()
+        state['window'] = list(self._window)
+        return state
+
+    def setState(self, state):
+        super().setState(state)
+        self._window = collections.deque(state['window'])
 
 
 
@@ -163,82 +295,362 @@ class Things:
     """Classe que guarda em memória as pessoas e os objetos que o robot encontrou sem os repetir.
     Guarda de igual forma a penúltima pessoa encontrada."""
 
-    _list_people     = []
-    _list_objects    = []
-    _two_last_people = ("", "")     # [Current, Last]
-    _last_was_blank  = True
+    def __init__(self):
+        self._seen            = set()   # Pares (categoria, nome) já encontrados
+        self._list_people     = []      # Pessoas pela ordem em que foram encontradas
+        self._list_objects    = []      # Objetos pela ordem em que foram encontrados
+        self._two_last_people = ("", "")     # [Current, Last]
+        self._last_was_blank  = True
 
-    @staticmethod
-    def add(category, name):
+    def add(self, category, name):
         """Adiciona a categoria e o nome do objeto se for novo.
         Atualiza, se necessário e se for o caso, o tuplo das duas últimas pessoas encontradas."""
-        if not Things.contains(category, name):
+        if not self.contains(category, name):
+            self._seen.add((category, name))
             if category in CATEGORY_PEOPLE:
-                Things._list_people.append((category, name))
+                self._list_people.append((category, name))
             else:
-                Things._list_objects.append((category, name))
-        if category in CATEGORY_PEOPLE and Things._last_was_blank:
-            Things._two_last_people = Utils.swap(Things._two_last_people[0], name)
+                self._list_objects.append((category, name))
+        if category in CATEGORY_PEOPLE and self._last_was_blank:
+            self._two_last_people = Utils.swap(self._two_last_people[0], name)
     
-    @staticmethod
-    def contains(category, name):
+    def contains(self, category, name):
         """Verifica se um dado par (categoria, nome) já foi encontrado."""
-        return (category, name) in (Things._list_people + Things._list_objects)
+        return (category, name) in self._seen
     
-    @staticmethod
-    def setWasBlank(blank):
+    def setWasBlank(self, blank):
         """Define se o robot não encontrou nada na última atualização de estado."""
-        Things._last_was_blank = blank
+        self._last_was_blank = blank
     
-    @staticmethod
-    def getLastButOnePerson():
+    def getLastButOnePerson(self):
         """[PERGUNTA 1]
         Obtém a penúltima pessoa vista, se disponível."""
-        if Things._two_last_people[1] != "":
-            return Things._two_last_people[1]
+        if self._two_last_people[1] != "":
+            return self._two_last_people[1]
         else:
             return ERROR_NOT_ENOUGH_PEOPLE
     
-    @staticmethod
-    def getListOfPeople():
-        return Things._list_people
+    def getListOfPeople(self):
+        return self._list_people
     
-    @staticmethod
-    def getListOfObjects():
-        return Things._list_objects
+    def getListOfObjects(self):
+        return self._list_objects
+
+    def getState(self):
+        """Devolve o estado do registo: pessoas e objetos pela ordem em que foram encontrados e as duas últimas pessoas."""
+        return {
+            'people':       list(self._list_people),
+            'objects':      list(self._list_objects),
+            'lastPeople':   self._two_last_people,
+            'lastWasBlank': self._last_was_blank
+        }
+
+    def setState(self, state):
+        """Repõe um estado devolvido por getState()."""
+        self._list_people     = list(state['people'])
+        self._list_objects    = list(state['objects'])
+        self._seen            = set(self._list_people) | set(self._list_objects)
+        self._two_last_people = tuple(state['lastPeople'])
+        self._last_was_blank  = state['lastWasBlank']
+
+
+
+class CooccurrenceCounter:
+    """Contagem das salas por combinação de categorias de objetos presentes, para calcular probabilidades em O(1).
+    Cada sala tem uma máscara de bits com as categorias já encontradas nela. Para cada máscara m é mantido
+    o número de salas cuja máscara contém m, atualizado apenas quando uma categoria aparece pela primeira vez numa sala.
+    As salas não contabilizadas (corredores e escadas) ficam de fora tanto das contagens como do total,
+    pelo que count() / getTotal() é sempre uma probabilidade."""
+
+    def __init__(self, categories=CATEGORY_ALL):
+        self._bits     = {c: 1 << i for (i, c) in enumerate(categories)}   # Categoria -> bit
+        self._masks    = {}                                                # Sala contabilizada -> máscara
+        self._excluded = set()                                             # Salas não contabilizadas
+        self._counts   = [0] * (1 << len(categories))                      # Máscara -> salas que a contêm
+        self._version  = 0                                                 # Incrementada a cada alteração
+
+    def mask(self, categories):
+        """Devolve a máscara de um conjunto de categorias."""
+        m = 0
+        for c in categories:
+            m |= self._bits[c]
+        return m
+
+    def addRoom(self, room, counted=True):
+        """Regista uma sala sem objetos. Só as salas com counted contam, nas contagens e no total de salas."""
+        if room not in self._masks and room not in self._excluded:
+            if counted:
+                self._masks[room] = 0
+                self._counts[0] += 1
+                self._version += 1
+            else:
+                self._excluded.add(room)
+
+    def add(self, room, category):
+        """Regista a presença de uma categoria numa sala. Categorias desconhecidas e salas não contabilizadas
+        são ignoradas; uma sala ainda não registada é contabilizada."""
+        self.addRoom(room)
+        if room in self._excluded:
+            return
+        old = self._masks[room]
+        new = old | self._bits.get(category, 0)
+        if new != old:
+            self._masks[room] = new
+            self._version += 1
+            # As máscaras contidas na nova máscara mas não na anterior ganham uma sala
+            sub = new
+            while sub:
+                if sub & ~old:
+                    self._counts[sub] += 1
+                sub = (sub - 1) & new
+
+    def count(self, present=(), absent=()):
+        """Número de salas com todas as categorias de present e nenhuma das de absent (por inclusão-exclusão)."""
+        base, extra = self.mask(present), [self._bits[c] for c in absent]
+        total = 0
+        for i in range(1 << len(extra)):
+            m, sign = base, 1
+            for (j, bit) in enumerate(extra):
+                if i >> j & 1:
+                    m, sign = m | bit, -sign
+            total += sign * self._counts[m]
+        return total
+
+    def getTotal(self):
+        return self._counts[0]
+
+    def getMask(self, room):
+        return self._masks.get(room, 0)
+
+    def getVersion(self):
+        return self._version
+
+
+
+class Factor:
+    """Fator sobre variáveis binárias, usado na eliminação de variáveis.
+    A tabela tem 2^n valores; no índice de uma atribuição, o bit i é o valor da i-ésima variável."""
+
+    def __init__(self, variables, values):
+        self.variables = tuple(variables)
+        self.values    = list(values)
+
+    def multiply(self, other):
+        """Devolve o produto deste fator com outro."""
+        variables = self.variables + tuple(v for v in other.variables if v not in self.variables)
+        position = {v: i for (i, v) in enumerate(variables)}
+        mine   = [position[v] for v in self.variables]
+        theirs = [position[v] for v in other.variables]
+        values = []
+        for i in range(1 << len(variables)):
+            a = sum(((i >> p) & 1) << k for (k, p) in enumerate(mine))
+            b = sum(((i >> p) & 1) << k for (k, p) in enumerate(theirs))
+            values.append(self.values[a] * other.values[b])
+        return Factor(variables, values)
+
+    def sumOut(self, variable):
+        """Devolve o fator que resulta de somar uma variável."""
+        k = self.variables.index(variable)
+        values = [0.0] * (len(self.values) >> 1)
+        for (i, x) in enumerate(self.values):
+            values[(i & ((1 << k) - 1)) | ((i >> (k + 1)) << k)] += x
+        return Factor(self.variables[:k] + self.variables[k + 1:], values)
+
+    def reduce(self, evidence):
+        """Devolve o fator restrito às entradas compatíveis com a evidência {variável: valor}."""
+        fixed = [(k, int(evidence[v])) for (k, v) in enumerate(self.variables) if v in evidence]
+        if not fixed:
+            return self
+        variables = tuple(v for v in self.variables if v not in evidence)
+        values = [x for (i, x) in enumerate(self.values) if all((i >> k) & 1 == b for (k, b) in fixed)]
+        return Factor(variables, values)
+
+
+
+class BayesianNetwork:
+    """Rede Bayesiana sobre a presença de categorias de objetos numa sala.
+    As tabelas de probabilidades condicionadas são estimadas (máxima verosimilhança) a partir das contagens de
+    um CooccurrenceCounter e ficam em cache até este mudar, pelo que acompanham a descoberta de novas salas.
+    As perguntas são respondidas por eliminação de variáveis, restrita aos antepassados das variáveis envolvidas;
+    os resultados ficam igualmente em cache enquanto as contagens não mudarem."""
+
+    def __init__(self, counter, parents=NETWORK_DEFAULT):
+        self._counter = counter
+        self._parents = {v: list(p) for (v, p) in parents.items()}
+        self._version = None
+        self._cpts    = {}      # Variável -> Factor
+        self._cache   = {}      # Atribuição -> probabilidade
+
+
+    def _refresh(self):
+        """Esquece as tabelas e os resultados calculados se as contagens mudaram."""
+        if self._version != self._counter.getVersion():
+            self._version = self._counter.getVersion()
+            self._cpts.clear()
+            self._cache.clear()
+
+
+    def cpt(self, variable):
+        """Devolve a tabela de P(variável | pais) como um fator sobre (variável, pais...).
+        Uma combinação dos pais sem salas usa a probabilidade marginal da variável.
+        As salas são as do total do contador (sem corredores nem escadas), tal como em Hospital.getProbability()."""
+        self._refresh()
+        if variable not in self._cpts:
+            counter, parents = self._counter, self._parents[variable]
+            rooms = counter.getTotal()
+            if rooms == 0:
+                raise ZeroDivisionError("No rooms are known yet")
+            marginal = counter.count([variable]) / rooms
+            values = [0.0] * (1 << (len(parents) + 1))
+            for j in range(1 << len(parents)):
+                present = [p for (k, p) in enumerate(parents) if (j >> k) & 1]
+                absent  = [p for (k, p) in enumerate(parents) if not (j >> k) & 1]
+                n = counter.count(present, absent)
+                p = counter.count(present + [variable], absent) / n if n > 0 else marginal
+                values[j << 1]       = 1.0 - p
+                values[(j << 1) | 1] = p
+            self._cpts[variable] = Factor([variable] + parents, values)
+        return self._cpts[variable]
+
+
+    def ancestors(self, variables):
+        """Devolve as variáveis dadas e todos os seus antepassados."""
+        found, stack = set(), list(variables)
+        while stack:
+            v = stack.pop()
+            if v not in found:
+                found.add(v)
+                stack.extend(self._parents[v])
+        return found
+
+
+    def jointProbability(self, assignment):
+        """Determina a probabilidade de uma atribuição parcial {variável: valor} por eliminação de variáveis."""
+        self._refresh()
+        key = frozenset(assignment.items())
+        if key not in self._cache:
+            # As variáveis que não são antepassadas da atribuição somam 1 e podem ser ignoradas
+            relevant = self.ancestors(assignment)
+            factors = [self.cpt(v).reduce(assignment) for v in relevant]
+            hidden = relevant - set(assignment)
+            while hidden:
+                # Elimina primeiro a variável cujo produto de fatores é menor
+                v = min(hidden, key=lambda h: len(set().union(*(f.variables for f in factors if h in f.variables))))
+                hidden.discard(v)
+                touching = [f for f in factors if v in f.variables]
+                product = touching[0]
+                for f in touching[1:]:
+                    product = product.multiply(f)
+                factors = [f for f in factors if v not in f.variables] + [product.sumOut(v)]
+            result = 1.0
+            for f in factors:
+                result *= f.values[0]
+            self._cache[key] = result
+        return self._cache[key]
+
+
+    def query(self, event, given=()):
+        """Determina P(event | given). Cada argumento é um dicionário {categoria: presente} ou uma lista
+        de categorias presentes. Lança ZeroDivisionError se a evidência tiver probabilidade nula."""
+        event = dict(event) if isinstance(event, dict) else {c: True for c in event}
+        given = dict(given) if isinstance(given, dict) else {c: True for c in given}
+        if any(given.get(v, b) != b for (v, b) in event.items()):
+            return 0.0
+        joint = dict(given)
+        joint.update(event)
+        return self.jointProbability(joint) / self.jointProbability(given)
+
+
+
+class WallClock:
+    """Relógio do robot baseado no relógio do sistema.
+    Os relógios indicam o instante atual com now() e são avançados com tick() em cada leitura dos sensores."""
+
+    def now(self):
+        return time.time()
+
+    def setTime(self, timestamp):
+        pass        # O relógio do sistema não pode ser acertado
+
+    def tick(self):
+        pass
+
+
+
+class TickClock:
+    """Relógio simulado: avança um período fixo (por omissão, um ciclo do simulador) em cada leitura dos sensores.
+    As estimativas de tempo não dependem da velocidade a que a simulação é executada."""
+
+    def __init__(self, period=CLOCK_TICK, start=0.0):
+        self._period = period
+        self._time   = start
+
+    def now(self):
+        return self._time
+
+    def setTime(self, timestamp):
+        self._time = timestamp
+
+    def tick(self):
+        self._time += self._period
+
+
+
+class ReplayClock:
+    """Relógio que reproduz instantes previamente registados, um por cada leitura dos sensores.
+    Os instantes podem ser dados à partida ou definidos antes de cada leitura com setTime()."""
+
+    def __init__(self, timestamps=(), start=0.0):
+        self._timestamps = iter(timestamps)
+        self._time       = start
+
+    def now(self):
+        return self._time
+
+    def setTime(self, timestamp):
+        self._time = timestamp
+
+    def tick(self):
+        self._time = next(self._timestamps, self._time)
 
 
 
 class Robot:
     """Classe para gerir os recursos do robot e estimar os gastos de bateria e a velocidade a cada momento."""
 
-    # Posição: anterior e atual
-    _lastPos = INIT_POS
-    _currPos = INIT_POS
+    def __init__(self, clock=None, estimator=LeastSquaresEstimator):
+        # Relógio usado para medir o tempo entre leituras (por omissão, o relógio do sistema)
+        self._clock = clock if clock is not None else WallClock()
 
-    # Bateria: anterior e atual
-    _lastBat = 100.0
-    _currBat = 100.0
+        # Posição: anterior e atual
+        self._lastPos = INIT_POS
+        self._currPos = INIT_POS
 
-    # Tempo (relógio): anterior e atual
-    _lastTime = time.time()
-    _currTime = time.time()
-    
-    # Velocidade: anterior e atual
-    _lastVel = 0.0
-    _currVel = 0.0
+        # Bateria: anterior e atual
+        self._lastBat = 100.0
+        self._currBat = 100.0
 
-    _funVB = LinearFunction()   # Velocity vs. Battery
-    _funBT = LinearFunction()   # Battery  vs. Time
-    _funVT = LinearFunction()   # Velocity vs. Time
+        # Tempo (relógio): inicial, da última leitura, e anterior e atual (das leituras em que o robot se moveu)
+        self._startTime = self._clock.now()
+        self._tickTime  = self._startTime
+        self._lastTime  = self._startTime
+        self._currTime  = self._startTime
 
-    @staticmethod
-    def getDirection():
+        # Velocidade: anterior e atual
+        self._lastVel = 0.0
+        self._currVel = 0.0
+
+        # Estimadores (estimator é a classe, ou uma função sem argumentos que devolve um estimador)
+        self._estVB = estimator()   # Velocity vs. Battery
+        self._estBT = estimator()   # Battery  vs. Time
+        self._estVT = estimator()   # Velocity vs. Time
+
+    def getDirection(self):
         """Determina a direção do robot tendo em conta a posição atual e a anterior.
         Devolve uma lista de 1 a 2 elementos que permite estimar 8 direções ou se está parado."""
 
-        x0, y0 = Robot._lastPos[0], Robot._lastPos[1]
-        x1, y1 = Robot._currPos[0], Robot._currPos[1]
+        x0, y0 = self._lastPos[0], self._lastPos[1]
+        x1, y1 = self._currPos[0], self._currPos[1]
         dx, dy = x1 - x0, y1 - y0
         
         if dx == 0 and dy == 0:
@@ -252,123 +664,711 @@ class Robot:
         return direction
     
 
-    @staticmethod
-    def getAdaptedPosition():
+    def getAdaptedPosition(self):
         """Devolve a posição adaptada de um objeto encontrado tendo em conta a posição atual e a direção do robot."""
-        pos = tuple(Robot._currPos)
-        direction = Robot.getDirection()
+        pos = tuple(self._currPos)
+        direction = self.getDirection()
         if DIR_STATIC in direction:
             return pos
         pos = (pos[0] + SIZE_OBJECT if DIR_RIGHT in direction else -SIZE_OBJECT, pos[1] + SIZE_OBJECT if DIR_DOWN in direction else -SIZE_OBJECT)
         return pos
 
 
-    @staticmethod
-    def updateVelocity():
-        """Atualiza a velocidade caso o robot se tenha movido"""
-        if Robot._lastPos != Robot._currPos:
-            Robot._currTime, Robot._lastTime = Utils.swap(Robot._currTime, time.time())
-            Robot._currVel, Robot._lastVel = Utils.swap(Robot._currVel, Utils.distance(Robot._lastPos, Robot._currPos) / (Robot._currTime - Robot._lastTime))
+    def updateVelocity(self):
+        """Atualiza a velocidade caso o robot se tenha movido e devolve se foi obtida uma nova amostra.
+        Se o relógio não avançou desde a última amostra (por exemplo, um ReplayClock sem mais instantes),
+        a velocidade não pode ser calculada e a amostra é ignorada."""
+        if self._lastPos != self._currPos and self._tickTime > self._currTime:
+            self._currTime, self._lastTime = Utils.swap(self._currTime, self._tickTime)
+            self._currVel, self._lastVel = Utils.swap(self._currVel, Utils.distance(self._lastPos, self._currPos) / (self._currTime - self._lastTime))
+            return True
+        return False
     
 
-    @staticmethod
-    def refreshFunctions():
-        """Atualiza as funções lineares que permitem estimar os parâmetros bateria, velocidade e tempo."""
-
-        # Se o robot foi carregado, as funções são reiniciadas
-        if Robot._currBat > Robot._lastBat:
-            Robot._funVB.reset()
-            Robot._funBT.reset()
-            Robot._funVT.reset()
-        else:
-            # Caso as funções estejam definidas, é apenas atualizado o ponto B
-            if not Robot._funVB.isDefined():
-                Robot._funVB.setFrom2Points((Robot._lastBat, Robot._lastVel), (Robot._currBat, Robot._currVel))
-            else:
-                Robot._funVB.setPointB((Robot._currBat, Robot._currVel))
+    def refreshFunctions(self, moved=True):
+        """Atualiza os estimadores que permitem prever os parâmetros bateria, velocidade e tempo.
+        moved indica se updateVelocity() obteve uma nova amostra da velocidade nesta leitura."""
 
-            if not Robot._funBT.isDefined():
-                Robot._funBT.setFrom2Points((Robot._lastTime, Robot._lastBat), (Robot._currTime, Robot._currBat))
-            else:
-                Robot._funBT.setPointB((Robot._currTime, Robot._currBat))
-            
-            if not Robot._funVT.isDefined():
-                Robot._funVT.setFrom2Points((Robot._lastTime, Robot._lastVel), (Robot._currTime, Robot._currVel))
-            else:
-                Robot._funVT.setPointB((Robot._currTime, Robot._currVel))
+        # Se o robot foi carregado, os estimadores são reiniciados
+        if self._currBat > self._lastBat:
+            self._estVB.reset()
+            self._estBT.reset()
+            self._estVT.reset()
+        else:
+            # A bateria é amostrada em cada leitura; a velocidade apenas quando o robot se move
+            self._estBT.add(self._tickTime, self._currBat)
+            if moved and self._lastPos != self._currPos:
+                self._estVB.add(self._currBat, self._currVel)
+                self._estVT.add(self._currTime, self._currVel)
 
     
-    @staticmethod
-    def predictTimeFromDistance(distance):
+    def predictTimeFromDistance(self, distance):
         """Estima quanto tempo deverá demorar a percorrer uma dada distância.
+        Devolve (estimativa, mínimo, máximo), com um intervalo de confiança a 95%.
         Não verifica a validade da distância!"""
 
-        if Robot._funVT.isDefined():
-            vf, vi = Robot._funVT.getPointA()[1], Robot._funVT.getPointB()[1]
-            return 2 * distance / (vf + vi)
-
-            # Algoritmo:
-            # v = d/t, portanto t = d/v.
-            # Contudo, a velocidade inicial e final são diferentes, pelo que podemos representar o problema como um trapézio:
-            # 
-            #       <---vf-->
-            # 
-            #       +-------+     ^
-            #      /         \    |
-            #     /     d     \   Δt
-            #    /             \  |
-            #    +-------------+  V
-            # 
-            #    <------vi----->
-            # 
-            # Tal deve-se ao facto de a função utilizada ser linear.
-            # Ora, se a distância é a área sob a curva da função v(t), e a "curva" é um segmento de reta, ficamos com um trapézio.
-            # Por matemática clássica, temos que:
-            #   d = (vf + vi) / 2 * Δt
-            # Portanto:
-            #   Δt = (2 * d) / (vf + vi)
-
-        else:
-            raise Exception("Cannot predict time")
+        # A velocidade média é a média das velocidades amostradas, que para uma velocidade linear no tempo
+        # corresponde à média entre a velocidade inicial e a final (t = 2d / (vi + vf)).
+        if self._estVT.isDefined():
+            (v, low, high) = self._estVT.getMeanY()
+            if v > 0.0:
+                return (distance / v, distance / high, distance / low if low > 0.0 else math.inf)
+        raise Exception("Cannot predict time")
     
 
-    @staticmethod
-    def predictTimeFromBattery(battery):
+    def predictTimeFromBattery(self, battery):
         """Estima quanto tempo deverá demorar até atingir um certo nível de bateria.
         O valor é fornecido em percentagem (de 0.0 a 100.0).
+        Devolve (estimativa, mínimo, máximo), com um intervalo de confiança a 95%, cujo mínimo nunca é negativo.
+        Se a reta estimada já atingiu esse nível no passado, a bateria não está a descer como a reta indica
+        (por exemplo, um consumo exponencial com todas as amostras desde o carregamento, ver LeastSquaresEstimator)
+        e não é feita nenhuma estimativa; os estimadores WindowEstimator e EwmaEstimator seguem o consumo recente.
         Não verifica a valodade do valor da bateria!"""
 
-        if Robot._funBT.isDefined():
-            return Robot._funBT.getX(battery) - Robot._funBT.getPointB()[0]
-        else:
-            raise Exception("Cannot predict time")
+        if self._estBT.isDefined() and self._estBT.getSlope() < 0.0:
+            now = self._clock.now()
+            (t, low, high) = self._estBT.getX(battery)
+            if t >= now:
+                return (t - now, max(low - now, 0.0), high - now)
+        raise Exception("Cannot predict time")
 
 
-    @staticmethod
-    def setBattery(battery):
+    def setBattery(self, battery):
         """Atualiza o estado da bateria (em percentagem)."""
-        Robot._currBat, Robot._lastBat = Utils.swap(Robot._currBat, battery)
+        self._currBat, self._lastBat = Utils.swap(self._currBat, battery)
 
 
-    @staticmethod
-    def setPosition(x, y):
+    def setPosition(self, x, y):
         """Atualiza a posição atual do robot."""
-        Robot._currPos, Robot._lastPos = Utils.swap(Robot._currPos, (x, y))
+        self._currPos, self._lastPos = Utils.swap(self._currPos, (x, y))
     
 
-    @staticmethod
-    def updateRobot(position, battery):
+    def updateRobot(self, position, battery):
         """Atualiza o estado completo do robot tendo em conta a posição atual e a bateria restante."""
         assert len(position) == 2
-        Robot.setBattery(battery)
-        Robot.setPosition(position[0], position[1])
-        Robot.updateVelocity()
-        Robot.refreshFunctions()
+        self._clock.tick()
+        self._tickTime = self._clock.now()      # O relógio é lido uma única vez por leitura
+        self.setBattery(battery)
+        self.setPosition(position[0], position[1])
+        moved = self.updateVelocity()
+        self.refreshFunctions(moved)
     
-    @staticmethod
-    def getPosition():
+    def getPosition(self):
         """Devolve a posição atual do robot."""
-        return Robot._currPos
+        return self._currPos
+
+    def getClock(self):
+        """Devolve o relógio do robot."""
+        return self._clock
+
+    def getStartTime(self):
+        """Devolve o instante do relógio em que o robot foi criado."""
+        return self._startTime
+
+    def getTickTime(self):
+        """Devolve o instante do relógio na última leitura dos sensores."""
+        return self._tickTime
+
+    def getState(self):
+        """Devolve o estado do robot: posições, bateria, instantes, velocidades e estado dos estimadores."""
+        return {
+            'positions':  (tuple(self._lastPos), tuple(self._currPos)),
+            'battery':    (self._lastBat, self._currBat),
+            'times':      (self._startTime, self._tickTime, self._lastTime, self._currTime),
+            'velocity':   (self._lastVel, self._currVel),
+            'estimators': [self._estVB.getState(), self._estBT.getState(), self._estVT.getState()]
+        }
+
+    def setState(self, state):
+        """Repõe um estado devolvido por getState(). O relógio é acertado no instante da última leitura, se o permitir."""
+        (self._lastPos, self._currPos) = (tuple(p) for p in state['positions'])
+        (self._lastBat, self._currBat) = state['battery']
+        (self._startTime, self._tickTime, self._lastTime, self._currTime) = state['times']
+        (self._lastVel, self._currVel) = state['velocity']
+        for (estimator, estimatorState) in zip((self._estVB, self._estBT, self._estVT), state['estimators']):
+            estimator.setState(estimatorState)
+        self._clock.setTime(self._tickTime)
+
+
+
+class RoomLocator:
+    """Classe base para localizar a divisão do piso que contém um ponto.
+    As divisões são retângulos [(x0, x1), (y0, y1)]; em caso de sobreposição prevalece a de menor índice.
+    Memoriza a última divisão encontrada para evitar a pesquisa enquanto o robot não sai dela."""
+
+    def __init__(self, rooms):
+        self._rooms = rooms
+        self._last  = None      # Índice da última divisão encontrada
+
+        # Para cada divisão, as divisões de menor índice que a intersetam.
+        # Um ponto na zona de sobreposição pertence à de menor índice, pelo que invalida a memorização.
+        self._shadows = [
+            [j for j in self.candidates(i) if RoomLocator.intersects(rooms[i], rooms[j])] for i in range(len(rooms))
+        ]
+
+    def candidates(self, room):
+        """Divisões de menor índice que podem intersetar uma divisão (todas, por omissão)."""
+        return range(room)
+
+    @staticmethod
+    def intersects(a, b):
+        """Determina se dois retângulos se intersetam (limites incluídos)."""
+        return a[0][0] <= b[0][1] and b[0][0] <= a[0][1] and a[1][0] <= b[1][1] and b[1][0] <= a[1][1]
+
+    def contains(self, room, x, y):
+        """Determina se o ponto (x, y) se encontra dentro de uma divisão."""
+        rx, ry = self._rooms[room]
+        return Utils.inRange(x, rx) and Utils.inRange(y, ry)
+
+    def locate(self, x, y):
+        """Devolve o índice da divisão que contém o ponto (x, y), ou None se estiver fora de todas."""
+        last = self._last
+        if last is not None and self.contains(last, x, y):
+            if not any(self.contains(j, x, y) for j in self._shadows[last]):
+                return last
+        self._last = self.search(x, y)
+        return self._last
+
+    def search(self, x, y):
+        """Pesquisa propriamente dita, a implementar pelas subclasses."""
+        raise NotImplementedError
+
+
+
+class LinearRoomLocator(RoomLocator):
+    """Percorre todas as divisões pela ordem em que foram definidas."""
+
+    def search(self, x, y):
+        for i in range(len(self._rooms)):
+            if self.contains(i, x, y):
+                return i
+        return None
+
+
+
+class GridRoomLocator(RoomLocator):
+    """Índice espacial em grelha uniforme: cada célula guarda as divisões que a intersetam.
+    Uma consulta apenas testa as poucas divisões da célula onde o ponto se encontra."""
+
+    def __init__(self, rooms, cell=None):
+        # Por omissão, as células têm a dimensão média das divisões
+        if cell is None:
+            sizes = [min(r[0][1] - r[0][0], r[1][1] - r[1][0]) for r in rooms]
+            cell = max(1, sum(sizes) // max(1, len(sizes)))
+        self._cell  = cell
+        self._cells = {}
+
+        # As divisões são inseridas por ordem crescente de índice, pelo que cada célula fica ordenada
+        for i, (rx, ry) in enumerate(rooms):
+            for key in self.cellsOf(rx, ry):
+                self._cells.setdefault(key, []).append(i)
+
+        # As sobreposições são procuradas apenas nas células de cada divisão
+        super().__init__(rooms)
+
+    def cellsOf(self, rx, ry):
+        """Células intersetadas por um retângulo."""
+        cell = self._cell
+        return [(cx, cy) for cx in range(rx[0] // cell, rx[1] // cell + 1) for cy in range(ry[0] // cell, ry[1] // cell + 1)]
+
+    def candidates(self, room):
+        (rx, ry) = self._rooms[room]
+        return sorted(set(j for key in self.cellsOf(rx, ry) for j in self._cells[key] if j < room))
+
+    def search(self, x, y):
+        for i in self._cells.get((x // self._cell, y // self._cell), ()):
+            if self.contains(i, x, y):
+                return i
+        return None
+
+
+
+class SpatialIndex:
+    """Índice espacial em grelha uniforme para pontos inseridos incrementalmente (por exemplo, os médicos encontrados).
+    Responde aos k pontos mais próximos e aos pontos dentro de um raio percorrendo apenas as células à volta
+    da posição pedida, em anéis sucessivos, sem ordenar todos os pontos.
+    Os pontos são tuplos (x, y, valor); em caso de empate na distância prevalece o inserido primeiro."""
+
+    def __init__(self, cell=50):
+        self._cell   = cell
+        self._cells  = {}       # (coluna, linha) -> [(x, y, ordem, valor)]
+        self._count  = 0
+        self._bounds = None     # Células extremas ocupadas: (coluna mínima, linha mínima, coluna máxima, linha máxima)
+
+
+    def __len__(self):
+        return self._count
+
+
+    def add(self, x, y, value):
+        """Insere um ponto com um valor associado."""
+        (cx, cy) = (int(x // self._cell), int(y // self._cell))
+        self._cells.setdefault((cx, cy), []).append((x, y, self._count, value))
+        self._count += 1
+        b = self._bounds
+        if b is None:
+            self._bounds = (cx, cy, cx, cy)
+        elif not (b[0] <= cx <= b[2] and b[1] <= cy <= b[3]):
+            self._bounds = (min(b[0], cx), min(b[1], cy), max(b[2], cx), max(b[3], cy))
+
+
+    def items(self):
+        """Devolve os pontos (x, y, valor) pela ordem de inserção."""
+        entries = sorted((entry for bucket in self._cells.values() for entry in bucket), key=lambda e: e[2])
+        return [(x, y, value) for (x, y, _, value) in entries]
+
+
+    def _ring(self, cx, cy, r):
+        """Itera sobre as entradas das células à distância (de Chebyshev) r da célula (cx, cy)."""
+        cells = self._cells
+        if r == 0:
+            yield from cells.get((cx, cy), ())
+            return
+        for i in range(cx - r, cx + r + 1):
+            yield from cells.get((i, cy - r), ())
+            yield from cells.get((i, cy + r), ())
+        for j in range(cy - r + 1, cy + r):
+            yield from cells.get((cx - r, j), ())
+            yield from cells.get((cx + r, j), ())
+
+
+    def _maxRing(self, cx, cy):
+        """Anel a partir do qual já não há células ocupadas."""
+        b = self._bounds
+        return max(cx - b[0], b[2] - cx, cy - b[1], b[3] - cy)
+
+
+    def nearest(self, x, y, k=1):
+        """Devolve os k pontos mais próximos de (x, y), do mais próximo para o mais afastado, como tuplos (distância, valor)."""
+        if self._count == 0 or k <= 0:
+            return []
+        (cx, cy) = (int(x // self._cell), int(y // self._cell))
+        last = self._maxRing(cx, cy)
+        best = []       # Heap máxima (negada) com os k melhores: (-distância, -ordem, valor)
+        r = 0
+        while r <= last:
+            for (px, py, order, value) in self._ring(cx, cy, r):
+                entry = (-math.hypot(px - x, py - y), -order, value)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+            # Os pontos dos anéis seguintes estão a pelo menos r células de distância
+            if len(best) == k and -best[0][0] <= r * self._cell:
+                break
+            r += 1
+        return [(-d, value) for (d, _, value) in sorted(best, reverse=True)]
+
+
+    def within(self, x, y, radius):
+        """Devolve os pontos a uma distância de (x, y) não superior a radius, pela ordem de inserção,
+        como tuplos (distância, valor)."""
+        if self._count == 0:
+            return []
+        (cx, cy) = (int(x // self._cell), int(y // self._cell))
+        found = []
+        for r in range(min(int(radius // self._cell) + 1, self._maxRing(cx, cy)) + 1):
+            for (px, py, order, value) in self._ring(cx, cy, r):
+                d = math.hypot(px - x, py - y)
+                if d <= radius:
+                    found.append((order, d, value))
+        found.sort()
+        return [(d, value) for (_, d, value) in found]
+
+
+
+class NetworkxGraph(nx.Graph):
+    """Grafo networkx utilizado por omissão pela classe Hospital.
+    Acrescenta os métodos comuns a CompactGraph usados pelas pesquisas de caminhos."""
+
+    def weightedNeighbors(self, n):
+        """Itera sobre os pares (vizinho, peso da aresta) de um nodo."""
+        return ((m, attr[MAP_DISTANCE]) for (m, attr) in self._adj[n].items())
+
+    def shortestPaths(self, source):
+        """Algoritmo de Dijkstra a partir de um nodo: devolve (distâncias, predecessores) de todos os nodos alcançáveis,
+        pela ordem em que são encontrados. Em caso de empate na heap é fixado primeiro o nodo de menor label."""
+        adj, dist, pred, heap = self._adj, {source: 0.0}, {source: None}, [(0.0, source)]
+        while heap:
+            d, n = heapq.heappop(heap)
+            if d > dist[n]:
+                continue
+            for (m, attr) in adj[n].items():
+                nd = d + attr[MAP_DISTANCE]
+                if nd < dist.get(m, float('inf')):
+                    dist[m], pred[m] = nd, n
+                    heapq.heappush(heap, (nd, m))
+        return (dist, pred)
+
+    def toNetworkx(self):
+        """Exporta o grafo para networkx (neste caso, o próprio grafo)."""
+        return self
+
+    def getAdjacency(self, weighted=False):
+        """Devolve a adjacência em formato CSR: (nodos, indptr, indices, pesos), pela ordem dos nodos e,
+        para cada nodo, pela ordem dos seus vizinhos. Os pesos (MAP_DISTANCE) são None se não for weighted."""
+        labels = list(self._node)
+        index = {n: i for (i, n) in enumerate(labels)}
+        indptr, indices, weights = [0], [], [] if weighted else None
+        for n in labels:
+            neighbors = self._adj[n]
+            indices.extend(map(index.__getitem__, neighbors))
+            if weighted:
+                weights.extend(attr[MAP_DISTANCE] for attr in neighbors.values())
+            indptr.append(len(indices))
+        return (labels, indptr, indices, weights)
+
+    def setAdjacency(self, labels, indptr, indices, weights=None):
+        """Preenche um grafo vazio a partir de uma adjacência devolvida por getAdjacency(),
+        mantendo a ordem dos nodos e dos vizinhos de cada nodo (que determina os desempates nas pesquisas de caminhos)."""
+        self.add_nodes_from(labels)
+        adj = self._adj
+        for (i, u) in enumerate(labels):
+            neighbors = adj[u]
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                v = labels[j]
+                if j < i:
+                    neighbors[v] = adj[v][u]        # Os atributos da aresta são partilhados pelos dois sentidos
+                else:
+                    neighbors[v] = {MAP_DISTANCE: weights[k]} if weights is not None else {}
+
+
+
+class CompactNodeView:
+    """Vista sobre os nodos de um CompactGraph, compatível com G.nodes do networkx."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __call__(self, data=False):
+        if data:
+            return ((label, self._graph.nodeData(i)) for (i, label) in enumerate(self._graph._labels))
+        return iter(self._graph._labels)
+
+    def __iter__(self):
+        return iter(self._graph._labels)
+
+    def __len__(self):
+        return len(self._graph._labels)
+
+    def __contains__(self, n):
+        return n in self._graph._ids
+
+    def __getitem__(self, n):
+        return self._graph.nodeData(self._graph._ids[n])
+
+
+
+class CompactGraph:
+    """Grafo não dirigido compacto, alternativo ao networkx.
+    Os nodos são identificados internamente por inteiros, com uma tabela label <-> id.
+    A adjacência é guardada em formato CSR (indptr, indices, weights) em arrays de inteiros e de floats;
+    as arestas mais recentes ficam em pequenas listas por nodo até serem integradas no CSR.
+    Implementa o subconjunto da interface do networkx usado pela classe Hospital; toNetworkx() exporta o grafo.
+    Ocupa cerca de um quarto da memória de NetworkxGraph e as pesquisas de caminhos (shortestPaths()) são um pouco
+    mais rápidas, mas a construção aresta a aresta é mais lenta (cerca de 1.5 vezes), por causa das reconstruções do CSR
+    (ver benchmarks/bench_graphs.py): é a escolha para pisos grandes, em que a memória pesa mais do que a construção."""
+
+    # Número mínimo de entradas fora do CSR antes de este ser reconstruído
+    _MIN_PENDING = 64
+
+    def __init__(self):
+        self._ids     = {}                  # label -> id
+        self._labels  = []                  # id -> label
+        self._data    = []                  # id -> atributos do nodo (criados apenas quando pedidos)
+        self._indptr  = array('l', [0])     # CSR: a adjacência do nodo i está em [indptr[i], indptr[i+1])
+        self._indices = array('l')          # CSR: vizinhos
+        self._weights = array('d')          # CSR: pesos das arestas
+        self._extraN  = {}                  # id -> vizinhos ainda fora do CSR
+        self._extraW  = {}                  # id -> pesos ainda fora do CSR
+        self._pending = 0                   # Entradas fora do CSR
+        self._edges   = 0                   # Número de arestas
+        self.nodes    = CompactNodeView(self)
+
+
+    def _id(self, n):
+        """Devolve o id de um nodo, criando-o se não existir."""
+        i = self._ids.get(n)
+        if i is None:
+            i = len(self._labels)
+            self._ids[n] = i
+            self._labels.append(n)
+            self._data.append(None)
+        return i
+
+
+    def _locate(self, a, b):
+        """Devolve (array de pesos, posição) da entrada b na adjacência de a, ou None se não existir."""
+        if a < len(self._indptr) - 1:
+            indices = self._indices
+            for k in range(self._indptr[a], self._indptr[a + 1]):
+                if indices[k] == b:
+                    return (self._weights, k)
+        extra = self._extraN.get(a)
+        if extra is not None:
+            for k in range(len(extra)):
+                if extra[k] == b:
+                    return (self._extraW[a], k)
+        return None
+
+
+    def _compact(self):
+        """Reconstrói o CSR integrando as arestas que estavam fora dele."""
+        n = len(self._labels)
+        base = len(self._indptr) - 1
+        indptr, indices, weights = array('l', [0]), array('l'), array('d')
+        for i in range(n):
+            if i < base:
+                indices.extend(self._indices[self._indptr[i]:self._indptr[i + 1]])
+                weights.extend(self._weights[self._indptr[i]:self._indptr[i + 1]])
+            if i in self._extraN:
+                indices.extend(self._extraN[i])
+                weights.extend(self._extraW[i])
+            indptr.append(len(indices))
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+        self._extraN, self._extraW, self._pending = {}, {}, 0
+
+
+    def nodeData(self, i):
+        """Devolve o dicionário de atributos do nodo com id i."""
+        if self._data[i] is None:
+            self._data[i] = {}
+        return self._data[i]
+
+
+    def add_node(self, n, **attr):
+        i = self._id(n)
+        if attr:
+            self.nodeData(i).update(attr)
+
+
+    def add_edge(self, u, v, **attr):
+        """Adiciona uma aresta ou redefine o seu peso. O único atributo suportado é o peso (MAP_DISTANCE)."""
+        weight = attr.get(MAP_DISTANCE, 1.0)
+        a, b = self._ids.get(u), self._ids.get(v)
+        if a is not None and b is not None:
+            found = self._locate(a, b)
+            if found is not None:
+                found[0][found[1]] = weight
+                found = self._locate(b, a)
+                found[0][found[1]] = weight
+                return
+        # Um nodo acabado de criar ainda não tem arestas
+        if a is None:
+            a = self._id(u)
+        if b is None:
+            b = self._id(v)
+        extraN, extraW = self._extraN, self._extraW
+        for (x, y) in ((a, b), (b, a)) if a != b else ((a, b),):
+            if x in extraN:
+                extraN[x].append(y)
+                extraW[x].append(weight)
+            else:
+                extraN[x], extraW[x] = [y], [weight]
+            self._pending += 1
+        self._edges += 1
+        if self._pending > max(self._MIN_PENDING, len(self._indices) // 2):
+            self._compact()
+
+
+    def has_node(self, n):
+        return n in self._ids
+
+
+    def has_edge(self, u, v):
+        return u in self._ids and v in self._ids and self._locate(self._ids[u], self._ids[v]) is not None
+
+
+    def get_edge_data(self, u, v, default=None):
+        if u not in self._ids or v not in self._ids:
+            return default
+        found = self._locate(self._ids[u], self._ids[v])
+        return {MAP_DISTANCE: found[0][found[1]]} if found is not None else default
+
+
+    def weightedNeighbors(self, n):
+        """Itera sobre os pares (vizinho, peso da aresta) de um nodo."""
+        i, labels = self._ids[n], self._labels
+        if i < len(self._indptr) - 1:
+            indices, weights = self._indices, self._weights
+            for k in range(self._indptr[i], self._indptr[i + 1]):
+                yield (labels[indices[k]], weights[k])
+        if i in self._extraN:
+            for (j, w) in zip(self._extraN[i], self._extraW[i]):
+                yield (labels[j], w)
+
+
+    def neighbors(self, n):
+        if n not in self._ids:
+            raise nx.NetworkXError("The node {0} is not in the graph.".format(n))
+        return (m for (m, _) in self.weightedNeighbors(n))
+
+
+    def shortestPaths(self, source):
+        """Algoritmo de Dijkstra a partir de um nodo, como em NetworkxGraph.shortestPaths(), mas sobre os ids e o CSR:
+        as distâncias e os predecessores ficam em listas indexadas pelo id e só no fim são passados para dicionários."""
+        if self._pending > 0:
+            self._compact()
+        labels, indptr, indices, weights = self._labels, self._indptr, self._indices, self._weights
+        inf = float('inf')
+        dist, pred = [inf] * len(labels), [-1] * len(labels)
+        s = self._ids[source]
+        dist[s] = 0.0
+        found, heap = [], [(0.0, source, s)]
+        while heap:
+            d, _, i = heapq.heappop(heap)
+            if d > dist[i]:
+                continue
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                nd = d + weights[k]
+                if nd < dist[j]:
+                    if dist[j] == inf:
+                        found.append(j)
+                    dist[j], pred[j] = nd, i
+                    heapq.heappush(heap, (nd, labels[j], j))
+        distances, predecessors = {source: 0.0}, {source: None}
+        for j in found:
+            if j != s:
+                distances[labels[j]], predecessors[labels[j]] = dist[j], labels[pred[j]]
+        return (distances, predecessors)
+
+
+    def number_of_nodes(self):
+        return len(self._labels)
+
+
+    def number_of_edges(self):
+        return self._edges
+
+
+    def __contains__(self, n):
+        return n in self._ids
+
+
+    def __iter__(self):
+        return iter(self._labels)
+
+
+    def __len__(self):
+        return len(self._labels)
+
+
+    def getAdjacency(self, weighted=False):
+        """Devolve a adjacência em formato CSR: (nodos, indptr, indices, pesos), como em NetworkxGraph.getAdjacency()."""
+        if self._pending > 0:
+            self._compact()
+        return (list(self._labels), list(self._indptr), list(self._indices), list(self._weights) if weighted else None)
+
+
+    def setAdjacency(self, labels, indptr, indices, weights=None):
+        """Preenche um grafo vazio a partir de uma adjacência devolvida por getAdjacency() (copiada diretamente para o CSR)."""
+        self._ids     = {n: i for (i, n) in enumerate(labels)}
+        self._labels  = list(labels)
+        self._data    = [None] * len(self._labels)
+        self._indptr  = array('l', indptr)
+        self._indices = array('l', indices)
+        self._weights = array('d', weights) if weights is not None else array('d', [1.0]) * len(self._indices)
+        self._extraN, self._extraW, self._pending = {}, {}, 0
+        self._edges   = sum(1 for i in range(len(self._labels))
+                            for k in range(indptr[i], indptr[i + 1]) if indices[k] >= i)
+
+
+    def toNetworkx(self):
+        """Exporta o grafo para um nx.Graph, com os atributos dos nodos e os pesos das arestas."""
+        graph = nx.Graph()
+        for (i, label) in enumerate(self._labels):
+            graph.add_node(label, **(self._data[i] or {}))
+        for label in self._labels:
+            for (m, w) in self.weightedNeighbors(label):
+                graph.add_edge(label, m, weight=w)
+        return graph
+
+
+
+class PathCache:
+    """Cache de caminhos mais curtos sobre o grafo map.
+    Para cada nodo de origem pedido guarda as distâncias e os predecessores de todos os nodos alcançáveis.
+    As linhas são calculadas apenas quando necessárias e atualizadas à medida que o grafo recebe novas arestas.
+    São guardadas no máximo capacity linhas (por omissão, PATH_CACHE_ROWS): quando é calculada uma linha nova,
+    é descartada a usada há mais tempo. A memória e o custo de edgeChanged() ficam assim limitados a capacity linhas,
+    independentemente do número de origens pedidas ao longo da sessão."""
+
+    def __init__(self, graph, capacity=PATH_CACHE_ROWS):
+        self._graph    = graph
+        self._capacity = capacity
+        self._rows     = collections.OrderedDict()    # origem -> (distâncias, predecessores), da menos para a mais recente
+
+
+    def row(self, source):
+        """Devolve o par (distâncias, predecessores) a partir de um nodo, calculando-o se necessário."""
+        if source in self._rows:
+            self._rows.move_to_end(source)
+        else:
+            self._rows[source] = self._graph.shortestPaths(source)
+            if len(self._rows) > self._capacity:
+                self._rows.popitem(last=False)
+        return self._rows[source]
+
+
+    def distance(self, source, target):
+        """Distância mais curta entre dois nodos (infinito se não houver caminho)."""
+        return self.row(source)[0].get(target, float('inf'))
+
+
+    def path(self, source, target):
+        """Caminho mais curto de target até source, seguindo os predecessores guardados na linha de source."""
+        dist, pred = self.row(source)
+        if target not in dist:
+            raise nx.NetworkXNoPath("No path between {0} and {1}".format(source, target))
+        path = [target]
+        while pred[path[-1]] is not None:
+            path.append(pred[path[-1]])
+        return path
+
+
+    def edgeChanged(self, u, v, old, new):
+        """Atualiza as linhas guardadas depois de a aresta (u, v) passar do peso old (None se nova) para new."""
+
+        # Algoritmo:
+        # Se o peso aumentou, apenas as linhas cuja árvore de caminhos usa a aresta ficam inválidas e são descartadas.
+        # Se a aresta é nova ou o peso diminuiu, cada linha é corrigida propagando a melhoria a partir de u e v,
+        # o que apenas visita os nodos cuja distância de facto diminui.
+
+        for source in list(self._rows):
+            dist, pred = self._rows[source]
+            if old is not None and new > old:
+                if pred.get(v) == u or pred.get(u) == v:
+                    del self._rows[source]
+                continue
+            heap = []
+            for (a, b) in ((u, v), (v, u)):
+                if a in dist and dist[a] + new < dist.get(b, float('inf')):
+                    dist[b], pred[b] = dist[a] + new, a
+                    heap.append((dist[b], b))
+            if heap:
+                heapq.heapify(heap)
+                self._propagate(dist, pred, heap)
+
+
+    def clear(self):
+        """Descarta todas as linhas guardadas."""
+        self._rows = collections.OrderedDict()
+
+
+    def _propagate(self, dist, pred, heap):
+        """Algoritmo de Dijkstra a partir dos nodos na heap, sobre distâncias já parcialmente conhecidas."""
+        graph = self._graph
+        while heap:
+            d, n = heapq.heappop(heap)
+            if d > dist[n]:
+                continue
+            for (m, w) in graph.weightedNeighbors(n):
+                nd = d + w
+                if nd < dist.get(m, float('inf')):
+                    dist[m], pred[m] = nd, n
+                    heapq.heappush(heap, (nd, m))
 
 
 
@@ -394,36 +1394,83 @@ class Hospital:
         [(615, 770), (455, 770)],   # Sala 14
     ]
 
-    _lastVisited = 0        # Última sala visitada
-    _currentRoom = 0        # Sala onde o robot se encontra atualmente
+    # Índices dos corredores em _rooms
+    _corridors = range(1, 5)
 
-    # Grafo "floor":
-    # Grafo para as ligações entres as salas (permite determinar as conexões entre salas por portas).
-    # Cada nodo armazena um dicionário com os objetos encontrados, onde as categorias são as keys do dicionário.
-    # Permite determinar qual o tipo de cada sala e quais os objetos em si presentes.
-    _floor = nx.Graph()
+    def __init__(self, robot, things, graph=None, rooms=None, corridors=None):
+        """Cria um piso vazio associado ao robot e ao registo de objetos de uma sessão.
+        graph é a classe usada para os grafos floor e map (NetworkxGraph por omissão, ou CompactGraph).
+        rooms e corridors permitem usar outras salas e corredores (no formato de _rooms, com a sala 0 nas escadas,
+        e os índices dos corredores), por exemplo os de uma planta (ver planta.FloorPlan)."""
 
-    # Grafo "map":
-    # Grafo para representar os pontos médios das salas e a localização das portas.
-    # Cada nodo armazena a posição (x, y) e cada aresta armazena a distância entre os nodos.
-    # Permite determinar os caminhos mais curtos entre salas e, com o auxílio da classe Robot, estimar o tempo para chegar até uma sala.
-    _map = nx.Graph()
+        graph = graph or NetworkxGraph
+        if rooms is not None:
+            self._rooms = rooms
+        if corridors is not None:
+            self._corridors = corridors
 
+        self._robot  = robot     # Robot cuja posição é utilizada para atualizar o piso
+        self._things = things    # Registo das pessoas e objetos já encontrados
 
-    @staticmethod
-    def getRoomMidPoint(room):
+        self._lastVisited = 0        # Última sala visitada
+        self._currentRoom = 0        # Sala onde o robot se encontra atualmente
+
+        # Localizador das divisões, construído uma única vez a partir de _rooms
+        self._locator = GridRoomLocator(self._rooms)
+
+        # Grafo "floor":
+        # Grafo para as ligações entres as salas (permite determinar as conexões entre salas por portas).
+        # Cada nodo armazena um dicionário com os objetos encontrados, onde as categorias são as keys do dicionário.
+        # Permite determinar qual o tipo de cada sala e quais os objetos em si presentes.
+        self._floor = graph()
+
+        # Grafo "map":
+        # Grafo para representar os pontos médios das salas e a localização das portas.
+        # Cada nodo armazena a posição (x, y) e cada aresta armazena a distância entre os nodos.
+        # Permite determinar os caminhos mais curtos entre salas e, com o auxílio da classe Robot, estimar o tempo para chegar até uma sala.
+        self._map = graph()
+
+        # Caminhos mais curtos já calculados sobre o grafo map
+        self._paths = PathCache(self._map)
+
+        # Tipo de cada sala do grafo floor, mantido à medida que são encontrados objetos:
+        # contadores de mobília por sala e índice inverso do tipo para o conjunto de salas.
+        self._roomTypes   = {}                                      # sala -> tipo
+        self._furniture   = {}                                      # sala -> {categoria: contagem}
+        self._roomsByType = {t: set() for t in range(len(ROOM_DESCRIPTION))}
+
+        # Categorias presentes em cada sala, para as perguntas de probabilidades.
+        # Nem as contagens nem o total de salas incluem as escadas ou os corredores.
+        self._cooccurrence = CooccurrenceCounter(CATEGORY_ALL)
+
+        # Rede Bayesiana sobre as categorias presentes em cada sala, estimada a partir das mesmas contagens
+        self._network = BayesianNetwork(self._cooccurrence)
+
+        # Índice espacial por categoria das pessoas e objetos registados no grafo floor: valores (sala, nome)
+        self._spatial = {category: SpatialIndex() for category in CATEGORY_ALL}
+
+        # Salas onde cada categoria foi encontrada, pela ordem em que o foi (dicionários usados como conjuntos ordenados)
+        self._roomsByCategory = {}                                  # categoria -> {sala: None}
+
+
+    def getRoomMidPoint(self, room):
         """Calcula o ponto médio de uma divisão do piso."""
-        return Utils.midpoint(Hospital._rooms[room][0], Hospital._rooms[room][1])
+        return Utils.midpoint(self._rooms[room][0], self._rooms[room][1])
 
 
-    @staticmethod
-    def getFloorGraph():
-        return Hospital._floor
+    def setRoomLocator(self, locator):
+        """Substitui o localizador das divisões (ver RoomLocator)."""
+        self._locator = locator
+
+
+    def getFloorGraph(self):
+        """Devolve o grafo floor (utilizar toNetworkx() para o exportar)."""
+        return self._floor
     
 
-    @staticmethod
-    def getMapGraph():
-        return Hospital._map
+    def getMapGraph(self):
+        """Devolve o grafo map (utilizar toNetworkx() para o exportar)."""
+        return self._map
     
 
     @staticmethod
@@ -434,8 +1481,12 @@ class Hospital:
 
     @staticmethod
     def doorToStr(r1, r2):
-        """Codifica uma porta no formato DXXYY, onde XX e YY são os números das salas que a porta conecta."""
-        return "D{0:02d}{1:02d}".format(min(r1, r2), max(r1, r2))
+        """Codifica uma porta no formato DXXYY, onde XX e YY são os números das salas que a porta conecta.
+        Em pisos com 100 ou mais salas, os números são separados (DXX_YY), para que cada porta tenha um só código."""
+        (r1, r2) = (min(r1, r2), max(r1, r2))
+        if r2 < 100:
+            return "D{0:02d}{1:02d}".format(r1, r2)
+        return "D{0:02d}_{1:02d}".format(r1, r2)
     
 
     @staticmethod
@@ -453,92 +1504,126 @@ class Hospital:
         return (Hospital.doorToStr(r1, r2), Hospital.doorToStr(r1, r3))
 
     
-    @staticmethod
-    def computeDirectDoorPaths():
+    def computeDirectDoorPaths(self, door=None):
         """Atualiza o grafo map com ligações diretas entre portas que permitam reduzir o caminho do robot.
         Tal permite evitar que o caminho estimado considere sempre o ponto médio das salas, o que eventualmente
-        poderia gerar resultados indesejáveis nos algoritmos de path finding."""
+        poderia gerar resultados indesejáveis nos algoritmos de path finding.
+        door, um par de salas (r1, r2), limita a atualização às ligações da porta entre ambas, acabada de acrescentar
+        ao grafo floor; sem door, são verificados todos os pares de portas do piso."""
 
         # Algoritmo:
         # Para cada nodo do grafo floor são considerados os seus vizinhos.
         # Entre cada par de vizinhos é criada uma aresta, caso não exista, no grafo map entre as respetivas portas.
-
-        for r in Hospital._floor.nodes():
-            rooms = sorted(list(nx.all_neighbors(Hospital._floor, r)))
-            for i in range(0, len(rooms)-1):
-                for j in range(i+1, len(rooms)):
-                    edge = Hospital.getEdgeBetweenDoorAndDoor(r, rooms[i], rooms[j])
-                    if not Hospital._map.has_edge(*edge):
-                        door_i = Hospital._map.nodes[Hospital.doorToStr(r, rooms[i])][MAP_MIDPOINT]
-                        door_j = Hospital._map.nodes[Hospital.doorToStr(r, rooms[j])][MAP_MIDPOINT]
-                        distance = Utils.distance(door_i, door_j)
-                        Hospital._map.add_edges_from([edge], weight=distance)
+        # Uma porta nova entre r1 e r2 apenas cria pares novos nas salas r1 (com r2) e r2 (com r1),
+        # pelo que o custo é proporcional ao número de portas destas duas salas e não ao tamanho do piso.
+
+        if door is None:
+            for r in self._floor.nodes():
+                rooms = sorted(list(self._floor.neighbors(r)))
+                for i in range(0, len(rooms)-1):
+                    for j in range(i+1, len(rooms)):
+                        self.addDoorToDoorEdge(r, rooms[i], rooms[j])
+        else:
+            for (r, new) in (door, door[::-1]):
+                for other in sorted(self._floor.neighbors(r)):
+                    if other != new:
+                        self.addDoorToDoorEdge(r, min(new, other), max(new, other))
+
+
+    def addDoorToDoorEdge(self, r1, r2, r3):
+        """Cria, caso não exista, a aresta do grafo map entre as portas da sala r1 com as salas r2 e r3 (r2 < r3)."""
+        edge = self.getEdgeBetweenDoorAndDoor(r1, r2, r3)
+        if not self._map.has_edge(*edge):
+            door_i = self._map.nodes[self.doorToStr(r1, r2)][MAP_MIDPOINT]
+            door_j = self._map.nodes[self.doorToStr(r1, r3)][MAP_MIDPOINT]
+            distance = Utils.distance(door_i, door_j)
+            self.addMapEdge(edge, distance)
     
 
-    @staticmethod
-    def updateMap():
+    def addMapEdge(self, edge, distance):
+        """Adiciona (ou redefine) uma aresta do grafo map e mantém a cache de caminhos coerente."""
+        u, v = edge
+        data = self._map.get_edge_data(u, v)
+        old = data[MAP_DISTANCE] if data is not None else None
+        self._map.add_edge(u, v, weight=distance)
+        if old != distance:
+            self._paths.edgeChanged(u, v, old, distance)
+
+
+    def updateMap(self):
         """Atualiza o grafo map com os novos dados anteriormente obtidos."""
 
-        cr, lv, rpos = Hospital._currentRoom, Hospital._lastVisited, Robot.getPosition()
+        cr, lv, rpos = self._currentRoom, self._lastVisited, self._robot.getPosition()
 
         # Faz a ligação entre a sala atual e a porta com a sala anterior
-        midpoint = Hospital.getRoomMidPoint(cr)
+        midpoint = self.getRoomMidPoint(cr)
         distance = Utils.distance(midpoint, rpos)
-        Hospital._map.add_edges_from([Hospital.getEdgeBetweenRoomAndDoor(cr, lv)], weight=distance)
-        Hospital._map.nodes[Hospital.roomToStr(cr)][MAP_MIDPOINT] = midpoint
+        self.addMapEdge(self.getEdgeBetweenRoomAndDoor(cr, lv), distance)
+        self._map.nodes[self.roomToStr(cr)][MAP_MIDPOINT] = midpoint
 
         # Faz a ligação entre a sala anterior e a porta com a sala corrente
-        midpoint = Hospital.getRoomMidPoint(lv)
+        midpoint = self.getRoomMidPoint(lv)
         distance = Utils.distance(midpoint, rpos)
-        Hospital._map.add_edges_from([Hospital.getEdgeBetweenRoomAndDoor(lv, cr)], weight=distance)
-        Hospital._map.nodes[Hospital.roomToStr(lv)][MAP_MIDPOINT] = midpoint
+        self.addMapEdge(self.getEdgeBetweenRoomAndDoor(lv, cr), distance)
+        self._map.nodes[self.roomToStr(lv)][MAP_MIDPOINT] = midpoint
 
         # Indica a posição da porta:
-        Hospital._map.nodes[Hospital.doorToStr(cr, lv)][MAP_MIDPOINT] = rpos
+        self._map.nodes[self.doorToStr(cr, lv)][MAP_MIDPOINT] = rpos
 
         # Resultado:   (Sala CR) ------------ [Porta CR/LV] ------------ (Sala LV)
 
-        # Atualiza o grafo map com ligações diretas entre portas
-        Hospital.computeDirectDoorPaths()
+        # Atualiza o grafo map com ligações diretas entre portas, apenas nas duas salas que a porta liga
+        self.computeDirectDoorPaths((cr, lv))
 
 
-    @staticmethod
-    def updateFloor(newRoom):
+    def updateFloor(self, newRoom):
         """Atualiza, se necessário, o grafo floor com uma nova sala.
         Em caso de atualização, é feita automaticamente a atualização do grafo map."""
 
         if newRoom != 0:
-            if Hospital._currentRoom != newRoom:
-                Hospital._currentRoom, Hospital._lastVisited = Utils.swap(Hospital._currentRoom, newRoom)
-                Hospital._floor.add_edge(Hospital._currentRoom, Hospital._lastVisited)
-                Hospital.updateMap()
-    
-
-    @staticmethod
-    def addRobotToMap():
-        """Adiciona o robot ao grafo map na sua posição atual.
-        Essencial para estimar corretamente os caminhos mais curtos com algoritmos de path finding.
-        Faz a ligação entre o robot e todos os vizinhos da sala atual no grafo map."""
-
-        Hospital._map.add_node(MAP_ROBOT)
-        edges = nx.all_neighbors(Hospital._map, Hospital.roomToStr(Hospital._currentRoom))
-        for e in edges:
-            distance = Utils.distance(Hospital._map.nodes[e][MAP_MIDPOINT], Robot.getPosition())
-            Hospital._map.add_edge(MAP_ROBOT, e, weight=distance)
+            if self._currentRoom != newRoom:
+                self._currentRoom, self._lastVisited = Utils.swap(self._currentRoom, newRoom)
+                self._floor.add_edge(self._currentRoom, self._lastVisited)
+                self.registerRoom(self._currentRoom)
+                self.registerRoom(self._lastVisited)
+                self.updateMap()
     
 
-    @staticmethod
-    def removeRobotFromMap():
-        """Remove o robot do grafo map.
-        Esta função deve ser invocada assim que o robot deixe de ser necessário para path finding."""
-        try:
-            Hospital._map.remove_node(MAP_ROBOT)
-        except:
-            pass
-
-
-    @staticmethod
-    def updateWithPosition(position):
+    def getRobotSources(self):
+        """Devolve os pares (nodo, distância) que ligam o robot, na sua posição atual, aos vizinhos da sala atual no grafo map.
+        O robot é assim tratado como uma origem virtual nas pesquisas de caminhos, sem alterar o grafo map,
+        pelo que as pesquisas são apenas de leitura."""
+
+        current = self.roomToStr(self._currentRoom)
+        if current not in self._map:
+            raise nx.NetworkXNoPath("The robot is not in the map yet")
+        position = self._robot.getPosition()
+        return [(e, Utils.distance(self._map.nodes[e][MAP_MIDPOINT], position)) for e in self._map.neighbors(current)]
+
+
+    def getDistanceFromRobot(self, target):
+        """Determina a distância mais curta do robot até um nodo do grafo map e o respetivo caminho.
+        O robot é tratado como uma origem virtual ligada aos vizinhos da sala atual, e o resto do percurso
+        é obtido da cache de caminhos. Devolve um tuplo (distância, caminho), com o caminho a começar em MAP_ROBOT."""
+
+        # As distâncias de target a todos os nodos são obtidas de uma só vez (o grafo não é dirigido),
+        # pelo que basta somar a distância do robot a cada vizinho da sala atual.
+        # Em caso de empate é preferido o caminho com menos nodos, para não passar por portas que estão no caminho.
+        best = (float('inf'), [])
+        for (e, hop) in self.getRobotSources():
+            distance = hop + self._paths.distance(target, e)
+            if distance < best[0] - EPSILON:
+                best = (distance, self._paths.path(target, e))
+            elif distance < best[0] + EPSILON:
+                path = self._paths.path(target, e)
+                if len(path) < len(best[1]):
+                    best = (min(distance, best[0]), path)
+        if len(best[1]) == 0:
+            raise nx.NetworkXNoPath("No path between {0} and {1}".format(MAP_ROBOT, target))
+        return (best[0], [MAP_ROBOT] + best[1])
+
+
+    def updateWithPosition(self, position):
         """Atualiza o grafo floor (e, por conseguinte, o grafo map) com a sala atual.
         Tal só será de facto efetivado caso a sala seja diferente da anterior."""
 
@@ -546,18 +1631,14 @@ class Hospital:
             return 0
         else:
             assert len(position) == 2
-            px, py = position[0], position[1]
-            for i in range(len(Hospital._rooms)):
-                rx, ry = Hospital._rooms[i][0], Hospital._rooms[i][1]
-                if Utils.inRange(px, rx) and Utils.inRange(py, ry):
-                    Hospital.updateFloor(i)
-                    return i
-            else:
+            i = self._locator.locate(position[0], position[1])
+            if i is None:
                 return 0
+            self.updateFloor(i)
+            return i
 
     
-    @staticmethod
-    def updateWithObjects(objects, position):
+    def updateWithObjects(self, objects, position):
         """Atualiza o grafo floor com os objetos encontrados na sala e posição atuais.
         Irá de igual forma informar a classe Things destes objetos."""
 
@@ -569,17 +1650,34 @@ class Hospital:
             position = tuple(position)
             for obj in objects:
                 [category, name] = obj.split(SEPARATOR, 1)
-                if not Things.contains(category, name):
-                    try:
-                        currentObjects = list(map(lambda n: n[1], Hospital._floor.nodes[Hospital._currentRoom][category]))
-                        if name not in currentObjects:
-                            Hospital._floor.nodes[Hospital._currentRoom][category].append((Robot.getAdaptedPosition(), name))
-                    except KeyError:
-                        Hospital._floor.nodes[Hospital._currentRoom][category] = [(position, name)]
-                Things.add(category, name)
-            Things.setWasBlank(False)   # Foram encontrados objetos ou pessoas
+                if not self._things.contains(category, name):
+                    data = self._floor.nodes[self._currentRoom]
+                    if category in data:
+                        if name not in map(lambda n: n[1], data[category]):
+                            self.addObject(self._currentRoom, category, name, self._robot.getAdaptedPosition())
+                    else:
+                        self.addObject(self._currentRoom, category, name, position)
+                self._things.add(category, name)
+            self._things.setWasBlank(False)   # Foram encontrados objetos ou pessoas
         else:
-            Things.setWasBlank(True)    # Não há objetos encontrados
+            self._things.setWasBlank(True)    # Não há objetos encontrados
+
+
+    def addObject(self, room, category, name, position):
+        """Regista uma pessoa ou objeto novo numa sala do grafo floor, na posição dada.
+        Atualiza o tipo da sala, as contagens de categorias por sala e o índice espacial da categoria."""
+        data = self._floor.nodes[room]
+        first = category not in data
+        if first:
+            data[category] = [(position, name)]
+        else:
+            data[category].append((position, name))
+        self.countObject(room, category)
+        self.indexObject(room, category, name, position)
+        if first:
+            self._roomsByCategory.setdefault(category, {})[room] = None
+            self._cooccurrence.addRoom(room, self.isCountedRoom(room))
+            self._cooccurrence.add(room, category)
 
 
     @staticmethod
@@ -589,201 +1687,329 @@ class Hospital:
 
 
     @staticmethod
-    def getTypeOfRoom(room):
-        """Determina qual o tipo de sala dado o seu número.
-        Devolve um inteiro que codifica a informação.
-        A sua descrição pode ser obtida com o método roomDescription()."""
+    def classifyRoom(room, counter, corridors=_corridors):
+        """Determina o tipo de uma sala dado o seu número, o número de objetos de cada categoria de mobília
+        e os índices dos corredores."""
 
         # Quarto:               >= 1 cama
         # Sala de enfermeiros:  0 camas, >= 1 cadeiras AND >= 1 mesas
         # Sala de espera:       > 2 cadeiras, 0 mesas, 0 camas
-        # Corredor:             índices de 1 a 4
+        # Corredor:             índices dos corredores (de 1 a 4, no piso original)
         # Escadas:              índice 0
 
-        if room in range(1, 5):
+        if room in corridors:
             return ROOM_CORRIDOR
-
-        counter = {}
-        room_data = Hospital._floor.nodes[room]
-        for category in CATEGORY_FURNITURE:
-            try:
-                counter[category] = len(room_data[category])
-            except KeyError:
-                counter[category] = 0
-        
-        if counter[OBJ_BED] >= 1:
+        elif counter.get(OBJ_BED, 0) >= 1:
             return ROOM_BEDROOM
-        elif counter[OBJ_CHAIR] >= 1 and counter[OBJ_TABLE] >= 1:
+        elif counter.get(OBJ_CHAIR, 0) >= 1 and counter.get(OBJ_TABLE, 0) >= 1:
             return ROOM_NURSES
-        elif counter[OBJ_CHAIR] > 2:
+        elif counter.get(OBJ_CHAIR, 0) > 2:
             return ROOM_WAITING
         else:
             return ROOM_UNKNOWN
-    
 
-    @staticmethod
-    def getCurrentTypeOfRoom():
+
+    def isCountedRoom(self, room):
+        """Indica se uma sala conta para as probabilidades, isto é, se não é corredor nem escadas."""
+        return room != 0 and room not in self._corridors
+
+
+    def registerRoom(self, room):
+        """Regista o tipo de uma sala acabada de acrescentar ao grafo floor, caso ainda não o tenha."""
+        if room not in self._roomTypes:
+            self._cooccurrence.addRoom(room, self.isCountedRoom(room))
+            self._furniture[room] = {}
+            self._roomTypes[room] = Hospital.classifyRoom(room, self._furniture[room], self._corridors)
+            self._roomsByType[self._roomTypes[room]].add(room)
+
+
+    def countObject(self, room, category):
+        """Contabiliza um objeto novo numa sala e, se for mobília, atualiza o tipo da sala."""
+        if category in CATEGORY_FURNITURE:
+            self.registerRoom(room)
+            counter = self._furniture[room]
+            counter[category] = counter.get(category, 0) + 1
+            old, new = self._roomTypes[room], Hospital.classifyRoom(room, counter, self._corridors)
+            if old != new:
+                self._roomsByType[old].discard(room)
+                self._roomsByType[new].add(room)
+                self._roomTypes[room] = new
+
+
+    def getTypeOfRoom(self, room):
+        """Determina qual o tipo de sala dado o seu número.
+        Devolve um inteiro que codifica a informação.
+        A sua descrição pode ser obtida com o método roomDescription().
+        O tipo é mantido à medida que são encontrados objetos, pelo que a consulta tem custo constante."""
+
+        if room in self._corridors:
+            return ROOM_CORRIDOR
+        return self._roomTypes[room]
+
+
+    def getRoomsOfType(self, room_type):
+        """Devolve o conjunto das salas conhecidas do tipo indicado. As escadas (ROOM_STAIRS) correspondem à sala 0.
+        O conjunto devolvido não deve ser alterado."""
+        if room_type == ROOM_STAIRS:
+            return {0} if 0 in self._roomTypes else set()
+        return self._roomsByType[room_type]
+
+
+    def getCurrentTypeOfRoom(self):
         """Permite determinar o tipo da sala onde o robot se encontra atualmente."""
-        return Hospital.getTypeOfRoom(Hospital._currentRoom)
+        return self.getTypeOfRoom(self._currentRoom)
 
 
-    @staticmethod
-    def getDistanceToNearestDoctor():
+    def indexObject(self, room, category, name, position):
+        """Acrescenta uma pessoa ou objeto registado numa sala ao índice espacial da sua categoria."""
+        if category in self._spatial:
+            self._spatial[category].add(position[0], position[1], (room, name))
+
+
+    def getNearestObjects(self, category, k=1, position=None):
+        """Devolve as k pessoas ou objetos de uma categoria mais próximos de uma posição (por omissão, a do robot),
+        em linha reta, como tuplos (distância, sala, nome), do mais próximo para o mais afastado."""
+        (x, y) = position if position is not None else self._robot.getPosition()
+        return [(d, room, name) for (d, (room, name)) in self._spatial[category].nearest(x, y, k)]
+
+
+    def getObjectsWithinRadius(self, category, radius, position=None):
+        """Devolve as pessoas ou objetos de uma categoria a uma distância em linha reta não superior a radius
+        de uma posição (por omissão, a do robot), como tuplos (distância, sala, nome), pela ordem em que foram encontrados."""
+        (x, y) = position if position is not None else self._robot.getPosition()
+        return [(d, room, name) for (d, (room, name)) in self._spatial[category].within(x, y, radius)]
+
+
+    def getNearestObjectsByWalking(self, category, k=1):
+        """Devolve as k pessoas ou objetos de uma categoria mais próximos do robot a pé, pelo grafo map,
+        como tuplos (distância, sala, nome), do mais próximo para o mais afastado.
+        Na sala atual a distância é em linha reta; nas restantes é a distância a pé até à porta de entrada mais
+        o percurso em linha reta desde a porta. Só é explorada a parte do grafo map mais próxima do que
+        a k-ésima pessoa ou objeto encontrado, e só são consideradas as salas onde a categoria foi encontrada."""
+
+        # Algoritmo:
+        # Pesquisa de Dijkstra a partir do robot como origem virtual (ver nearestRoomOfType()). Quando é fixada
+        # uma porta à distância d, as pessoas ou objetos das salas que ela liga ficam a d mais o percurso em linha reta
+        # desde a porta, que nunca é inferior a d. Como as portas são fixadas por ordem crescente de distância,
+        # a pesquisa termina assim que d excede a k-ésima menor distância já encontrada.
+
+        rooms = self._roomsByCategory.get(category)
+        if not rooms or k <= 0:
+            return []
+        position = self._robot.getPosition()
+
+        found = {}      # (sala, índice na sala) -> (distância, ordem, nome)
+        if self._currentRoom in rooms:
+            for (j, (pos, name)) in enumerate(self._floor.nodes[self._currentRoom][category]):
+                found[(self._currentRoom, j)] = (Utils.distance(position, pos), len(found), name)
+
+        bound = float('inf')
+        if len(found) >= k:
+            bound = heapq.nsmallest(k, found.values())[-1][0]
+
+        dist, heap = {}, []
+        if self.roomToStr(self._currentRoom) in self._map:
+            for (e, hop) in self.getRobotSources():
+                if hop < dist.get(e, float('inf')):
+                    dist[e] = hop
+                    heap.append((hop, e))
+            heapq.heapify(heap)
+
+        while heap:
+            d, n = heapq.heappop(heap)
+            if d > dist[n]:
+                continue
+            if d > bound:
+                break
+            changed = False
+            for (m, w) in self._map.weightedNeighbors(n):
+                if m[0] == 'R':
+                    room = int(m[1:])
+                    if room in rooms and room != self._currentRoom:
+                        door = self._map.nodes[n][MAP_MIDPOINT]
+                        for (j, (pos, name)) in enumerate(self._floor.nodes[room][category]):
+                            candidate = d + Utils.distance(door, pos)
+                            previous = found.get((room, j))
+                            if previous is None:
+                                found[(room, j)] = (candidate, len(found), name)
+                                changed = True
+                            elif candidate < previous[0]:
+                                found[(room, j)] = (candidate, previous[1], name)
+                                changed = True
+                nd = d + w
+                if nd < dist.get(m, float('inf')):
+                    dist[m] = nd
+                    heapq.heappush(heap, (nd, m))
+            if changed and len(found) >= k:
+                bound = heapq.nsmallest(k, found.values())[-1][0]
+
+        nearest = heapq.nsmallest(k, ((d, i, room, name) for ((room, _), (d, i, name)) in found.items()))
+        return [(d, room, name) for (d, _, room, name) in nearest]
+
+
+    def getDistanceToNearestDoctor(self):
         """Determina a distância até ao médico mais próximo, que seja do conhecimento do robot."""
 
-        # NOTA: Utiliza a distância euclidiana uma vez que não é pedido o caminho.
-        # 1. Encontra todos os médicos em todas as salas visitadas até ao momento e codifica-os em 3-tuplos (sala, posição, nome).
-        # 2. Mapeia os 3-tuplos de forma a transformar a posição em distâncias euclidianas.
-        # 3. Ordena a lista pela distância.
-        # 4. Devolve a informação detalhada sobre o médico (nome, sala onde se encontra e distância em linha reta).
+        # NOTA: A distância é a pé, pelo grafo map, e não em linha reta através das paredes
+        # (ver getNearestObjectsByWalking(); a distância em linha reta é dada por getNearestObjects()).
 
-        doctors = []
-        for (room, things) in Hospital._floor.nodes(data=True):
-            if OBJ_DOCTOR in things:
-                doctors += list(map(lambda t: (room, t[0], t[1]), things[OBJ_DOCTOR]))
+        doctors = self.getNearestObjectsByWalking(OBJ_DOCTOR, 1)
         if len(doctors) > 0:
-            doctors = list(map(lambda d: (d[0], Utils.distance(d[1], Robot.getPosition()), d[2]), doctors))
-            doctors.sort(key = lambda d: d[1])
-            return "Médico {0} na sala {1} a uma distância de {2:.3f}.".format(doctors[0][2], doctors[0][0], doctors[0][1])
+            (distance, room, name) = doctors[0]
+            return "Médico {0} na sala {1} a uma distância de {2:.3f}.".format(name, room, distance)
         else:
             return "Ainda não encontrei médicos"
     
 
-    @staticmethod
-    def getPathToNearestNurseOffice():
+    def getPathToNearestNurseOffice(self):
         """Determina o caminho mais curto até à sala de enfermeiros mais próxima.
-        Recorre ao algoritmo A* sobre o grafo map."""
-
-        # Determina quais as salas de enfermeiros encontradas até ao momento
-        nurse_rooms = list(filter(lambda n: Hospital.getTypeOfRoom(n) == ROOM_NURSES, Hospital._floor.nodes()))
-
-        # Se houver salas de enfermeiros, determina o caminho mais curto até cada uma delas e a respetiva distância.
-        # A lista resultante, contendo tuplos (distância, caminho), é ordenada pela distância.
-        # O caminho do primeiro elemento da lista ordenada é então retornado.
-        # O robot é adicionado temporariamente ao grafo map para obter um resultado mais exato.
-
-        if len(nurse_rooms) > 0:
-            result = []
-            if Hospital.getTypeOfRoom(Hospital._currentRoom) == ROOM_NURSES:
-                return [Hospital.roomToStr(Hospital._currentRoom)]
-            Hospital.addRobotToMap()
-            for r in nurse_rooms:
-                try:
-                    path   = nx.astar_path(Hospital._map, MAP_ROBOT, Hospital.roomToStr(r))
-                    weight = nx.astar_path_length(Hospital._map, MAP_ROBOT, Hospital.roomToStr(r))
-                    result.append((weight, path))
-                except nx.NetworkXNoPath:
-                    continue
-            Hospital.removeRobotFromMap()
-            if len(result) == 0:
-                return []
-            result.sort(key = lambda t: t[0])
-            return result[0][1]
-        else:
+        Recorre a uma única pesquisa sobre o grafo map (ver nearestRoomOfType())."""
+
+        try:
+            return self.nearestRoomOfType(ROOM_NURSES)[1]
+        except nx.NetworkXNoPath:
             return []
     
 
-    @staticmethod
-    def getTimeToStairs():
-        """Determina o tempo estimado até chegar às escadas a partir da posição atual do robot.
-        Recorre ao algoritmo A* sobre o grafo map."""
+    def isRoomOfType(self, room, room_type):
+        """Determina se uma sala é do tipo indicado. As escadas (ROOM_STAIRS) correspondem à sala 0."""
+        if room_type == ROOM_STAIRS:
+            return room == 0
+        return self.getTypeOfRoom(room) == room_type
 
-        # O robot é adicionado temporariamente ao grafo map para obter um resultado mais exato.
-        Hospital.addRobotToMap()
-        weight = nx.astar_path_length(Hospital._map, MAP_ROBOT, Hospital.roomToStr(0))
-        Hospital.removeRobotFromMap()
-        return Robot.predictTimeFromDistance(weight)
-    
 
-    @staticmethod
-    def getProbabilityOfPatientKnowingNurses():
-        """Determina a probabilidade de encontrar um doente sabendo que encontrou um enfermeiro."""
-
-        # Contabiliza as salas encontradas que não são corredores nem escadas,
-        # assim como as salas com enfermeiros e as salas com enfermeiros e doentes.
-        total_rooms                    = 0
-        rooms_with_nurses              = 0
-        rooms_with_nurses_and_patients = 0
-
-        for (room, things) in Hospital._floor.nodes(data=True):
-            if room not in range(0, 5):
-                total_rooms += 1
-            if OBJ_NURSE in things:
-                rooms_with_nurses += 1
-                if OBJ_PATIENT in things:
-                    rooms_with_nurses_and_patients += 1
-
-        # Probabilidade de existir doente e enfermeiros numa divisão
-        prob_patient_and_nurse = rooms_with_nurses_and_patients / total_rooms
-
-        # Probabilidade de existir enfermeiros na divisão
-        prob_nurse = rooms_with_nurses / total_rooms
-        
-        # Probabilidade condicionada
-        return prob_patient_and_nurse / prob_nurse
+    def nearestRoomOfType(self, room_type):
+        """Determina a sala do tipo indicado mais próxima do robot pelo grafo map.
+        Devolve um tuplo (distância, caminho), com o caminho a começar em MAP_ROBOT,
+        ou apenas com a sala atual caso esta seja já do tipo pretendido."""
+
+        # Algoritmo:
+        # Pesquisa de Dijkstra com vários destinos, a partir do robot como origem virtual:
+        # a heap é inicializada com os vizinhos da sala atual, à distância a que se encontram do robot.
+        # A pesquisa termina assim que é fixada a primeira sala do tipo pretendido, que é por isso a mais próxima.
+
+        sources = self.getRobotSources()
+        if self.isRoomOfType(self._currentRoom, room_type):
+            return (0.0, [self.roomToStr(self._currentRoom)])
+
+        # O índice de tipos indica à partida as salas de destino; sem nenhuma não é preciso pesquisar
+        targets = set(self.roomToStr(r) for r in self.getRoomsOfType(room_type))
+        if not targets:
+            raise nx.NetworkXNoPath("No room of type {0} was found".format(room_type))
+
+        dist, pred, heap = {}, {}, []
+        for (e, hop) in sources:
+            dist[e], pred[e] = hop, MAP_ROBOT
+            heap.append((hop, e))
+        heapq.heapify(heap)
+
+        settled = set()
+        while heap:
+            d, n = heapq.heappop(heap)
+            if n in settled:
+                continue
+            settled.add(n)
+            if n in targets:
+                path = [n]
+                while path[-1] != MAP_ROBOT:
+                    path.append(pred[path[-1]])
+                return (d, path[::-1])
+            for (m, w) in self._map.weightedNeighbors(n):
+                nd = d + w
+                if nd < dist.get(m, float('inf')) - EPSILON:
+                    dist[m], pred[m] = nd, n
+                    heapq.heappush(heap, (nd, m))
+
+        raise nx.NetworkXNoPath("No room of type {0} was found".format(room_type))
+
+
+    def getTimeToStairs(self):
+        """Determina o tempo estimado até chegar às escadas a partir da posição atual do robot.
+        Recorre à cache de caminhos sobre o grafo map. Devolve (estimativa, mínimo, máximo)."""
+        weight, _ = self.getDistanceFromRobot(self.roomToStr(0))
+        return self._robot.predictTimeFromDistance(weight)
     
 
-    @staticmethod
-    def getProbabilityOfBookIfChairFound():
-        """Determina a probabilidade de encontrar um livro caso encontre uma cadeira."""
+    def getProbability(self, present, absent=()):
+        """Determina a probabilidade de uma sala (que não seja corredor nem escadas) ter todas as categorias
+        de objetos de present e nenhuma das de absent. Os corredores e as escadas não contam nem para as salas
+        com as categorias nem para o total. Tem custo constante."""
+        return self._cooccurrence.count(present, absent) / self._cooccurrence.getTotal()
 
-        # Contabiliza as salas encontradas que não são corredores nem escadas
-        total_rooms = 0
-        
-        # Contabiliza as restantes salas necessárias ao cálculo da probabilidade
-
-        # Let:
-        #   L = Book
-        #   C = Chair
-        #   X = Bed
-        #   n = NOT
-        # Example: LCnX = Book and Chair and NOT Bed
-
-        rooms_C     = 0     # Salas com cadeiras
-        rooms_X     = 0     # Salas com camas
-        rooms_CX    = 0     # Salas com cadeiras e camas
-        rooms_LCX   = 0     # Salas com livros, cadeiras e camas
-        rooms_LCnX  = 0     # Salas com livros e cadeiras, mas sem camas
-
-        for (room, things) in Hospital._floor.nodes(data=True):
-            if room not in range(0, 5):
-                total_rooms += 1
-            
-            if OBJ_CHAIR in things:
-                rooms_C += 1
-            if OBJ_BED in things:
-                rooms_X += 1
-            
-            if set([OBJ_CHAIR, OBJ_BED]).issubset(set(things)):
-                rooms_CX += 1
-            if set([OBJ_BOOK, OBJ_CHAIR, OBJ_BED]).issubset(set(things)):
-                rooms_LCX += 1
-            elif set([OBJ_BOOK, OBJ_CHAIR]).issubset(set(things)):
-                rooms_LCnX += 1
-
-        # Cálculo das probabilidades
-        prob_X = rooms_X / total_rooms
-        prob_C = rooms_C / total_rooms
-        prob_L_knowing_CX = [rooms_LCX / rooms_CX, rooms_LCnX / rooms_CX]
-
-        # Somatório das probabilidades
-        prob_sum  = (1 - prob_X) * prob_C * prob_L_knowing_CX[0]
-        prob_sum += prob_X * prob_C * prob_L_knowing_CX[1]
-
-        # Probabilidade condicionada baseada numa Rede Bayesiana
-        return prob_sum / prob_C
 
+    def getConditionalProbability(self, event, given, eventAbsent=(), givenAbsent=()):
+        """Determina P(A | B): a probabilidade de uma sala ter todas as categorias de event (e nenhuma de eventAbsent)
+        sabendo que tem todas as de given (e nenhuma de givenAbsent). Tem custo constante.
+        Lança ZeroDivisionError se ainda não houver salas que satisfaçam B."""
+        both = self.getProbability(list(event) + list(given), list(eventAbsent) + list(givenAbsent))
+        return both / self.getProbability(given, givenAbsent)
 
-    @staticmethod
-    def getTimeToDie():
-        """Estima o tempo restante da bateria até esta esgotar."""
-        return Robot.predictTimeFromBattery(0.0)
 
+    def getBayesianProbability(self, event, given=()):
+        """Determina P(event | given) pela rede Bayesiana (NETWORK_DEFAULT) sobre as categorias presentes nas salas.
+        Os argumentos são dicionários {categoria: presente} ou listas de categorias presentes (ver BayesianNetwork.query)."""
+        return self._network.query(event, given)
 
-    @staticmethod
-    def getRoomIndex():
+
+    def getProbabilityOfBookIfChairFound(self):
+        """Determina a probabilidade de encontrar um livro caso encontre uma cadeira.
+        Na rede, os livros dependem das cadeiras e das camas: P(L | C) = soma em X de P(L | C, X) P(X)."""
+        return self.getBayesianProbability([OBJ_BOOK], [OBJ_CHAIR])
+
+
+    def getTimeToDie(self):
+        """Estima o tempo restante da bateria até esta esgotar. Devolve (estimativa, mínimo, máximo)."""
+        return self._robot.predictTimeFromBattery(0.0)
+
+
+    def getRoomIndex(self):
         """Devolve a sala atual"""
-        return Hospital._currentRoom
+        return self._currentRoom
+
+
+    def getState(self):
+        """Devolve o estado do piso: salas atual e anterior, grafo floor com as pessoas e objetos de cada sala
+        e grafo map com as posições dos nodos e as distâncias das arestas.
+        Os grafos são dados em formato CSR (ver NetworkxGraph.getAdjacency()), que mantém a ordem dos vizinhos,
+        e as pessoas e objetos pela ordem em que foram registados. O restante estado é derivado destes."""
+
+        # As pessoas e os objetos de cada categoria indexada seguem a ordem do índice espacial
+        objects = []
+        for (category, index) in self._spatial.items():
+            objects += [(room, category, name, (x, y)) for (x, y, (room, name)) in index.items()]
+        for (room, data) in self._floor.nodes(data=True):
+            for (category, items) in data.items():
+                if category not in self._spatial:
+                    objects += [(room, category, name, position) for (position, name) in items]
+
+        (floorNodes, floorPtr, floorIdx, _) = self._floor.getAdjacency()
+        (mapNodes, mapPtr, mapIdx, mapWeights) = self._map.getAdjacency(weighted=True)
+        return {
+            'currentRoom':    self._currentRoom,
+            'lastVisited':    self._lastVisited,
+            'floorNodes':     floorNodes,
+            'floorAdjacency': (floorPtr, floorIdx),
+            'objects':        objects,
+            'mapNodes':       [(n, self._map.nodes[n].get(MAP_MIDPOINT)) for n in mapNodes],
+            'mapAdjacency':   (mapPtr, mapIdx, mapWeights)
+        }
+
+
+    def setState(self, state):
+        """Repõe um estado devolvido por getState() num piso acabado de criar."""
+        self._currentRoom = state['currentRoom']
+        self._lastVisited = state['lastVisited']
+
+        self._floor.setAdjacency(state['floorNodes'], *state['floorAdjacency'])
+        for room in state['floorNodes']:
+            self.registerRoom(room)
+        for (room, category, name, position) in state['objects']:
+            self.addObject(room, category, name, tuple(position))
+
+        self._map.setAdjacency([n for (n, _) in state['mapNodes']], *state['mapAdjacency'])
+        for (n, midpoint) in state['mapNodes']:
+            if midpoint is not None:
+                self._map.nodes[n][MAP_MIDPOINT] = tuple(midpoint)
 
 
 
@@ -820,6 +2046,16 @@ class Utils:
     def timeToStr(t):
         """Formata um dado tempo em segundos e milissegundos."""
         return "{0:3d} segundos e {1:3d} milissegundos".format(int(t), int((t - int(t)) * 1000))
+
+
+    @staticmethod
+    def estimateToStr(estimate):
+        """Formata uma estimativa de tempo (estimativa, mínimo, máximo) com o seu intervalo de confiança."""
+        (t, low, high) = estimate
+        if math.isinf(high):
+            return "{0} (pelo menos {1}, com 95% de confiança)".format(Utils.timeToStr(t), Utils.timeToStr(low).strip())
+        return "{0} (entre {1} e {2}, com 95% de confiança)".format(
+            Utils.timeToStr(t), Utils.timeToStr(low).strip(), Utils.timeToStr(high).strip())
     
 
     @staticmethod
@@ -835,7 +2071,8 @@ class Utils:
                 elif p[0] == 'R':   # Sala
                     desc += "\nEstá na sala {0:2d}.".format(int(p[1:]))
                 elif p[0] == 'D':   # Porta -> indica um caminho a fazer entre duas salas
-                    desc += "\nVá da sala {0:2d} para a sala {1:2d}.".format(int(p[1:3]), int(p[3:]))
+                    (r1, r2) = p[1:].split('_') if '_' in p else (p[1:3], p[3:])
+                    desc += "\nVá da sala {0:2d} para a sala {1:2d}.".format(int(r1), int(r2))
                 else:
                     raise Exception("I dunno!")     # Outros formatos desconhecidos, interrompe a execução
             except:
@@ -845,6 +2082,382 @@ class Utils:
 
 
 
+class LatencyHistogram:
+    """Histograma de latências (em nanossegundos) no estilo HDR: as classes têm largura proporcional ao valor,
+    com 2^bits classes por potência de 2, pelo que qualquer percentil tem um erro relativo inferior a 2^-bits
+    e o histograma ocupa poucas centenas de contadores, qualquer que seja o número de amostras.
+    Os valores abaixo de 2^(bits+1) têm classes de largura 1 (exatas)."""
+
+    def __init__(self, bits=HISTOGRAM_BITS):
+        self._bits   = bits
+        self._counts = array('q')
+        self._count  = 0
+        self._total  = 0
+        self._min    = None
+        self._max    = 0
+
+
+    def _bucket(self, value):
+        """Devolve a classe de um valor."""
+        shift = value.bit_length() - self._bits - 1
+        if shift <= 0:
+            return value
+        return ((shift + 1) << self._bits) + (value >> shift) - (1 << self._bits)
+
+
+    def _upper(self, bucket):
+        """Devolve o maior valor de uma classe."""
+        size = 2 << self._bits
+        if bucket < size:
+            return bucket
+        shift = (bucket >> self._bits) - 1
+        mantissa = (bucket & ((1 << self._bits) - 1)) + (1 << self._bits)
+        return ((mantissa + 1) << shift) - 1
+
+
+    def record(self, value):
+        """Acrescenta uma amostra (inteiro não negativo)."""
+        bucket = self._bucket(value)
+        counts = self._counts
+        if bucket >= len(counts):
+            counts.extend([0] * (bucket + 1 - len(counts)))
+        counts[bucket] += 1
+        self._count += 1
+        self._total += value
+        if self._min is None or value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+
+    def getCount(self):
+        return self._count
+
+    def getTotal(self):
+        return self._total
+
+    def getMean(self):
+        return self._total / self._count if self._count > 0 else 0.0
+
+    def getMin(self):
+        return self._min if self._min is not None else 0
+
+    def getMax(self):
+        return self._max
+
+
+    def getPercentile(self, percentile):
+        """Devolve o valor abaixo do qual está a percentagem indicada das amostras (o maior valor da classe, até ao máximo)."""
+        if self._count == 0:
+            return 0
+        rank = max(1, math.ceil(percentile / 100 * self._count))
+        seen = 0
+        for (bucket, count) in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._upper(bucket), self._max)
+        return self._max
+
+
+    def reset(self):
+        self.__init__(self._bits)
+
+
+
+class Instrumentation:
+    """Instrumentação de uma sessão: tempo de cada etapa de work() e de cada resposta, em histogramas de latência,
+    e contadores de eventos. Pode ser ligada e desligada em qualquer momento.
+    Ligada, substitui os métodos instrumentados das instâncias da sessão por versões que os cronometram;
+    desligada, repõe os métodos originais, pelo que não tem qualquer custo.
+    Os tempos são inclusivos: o de work() inclui o das etapas que invoca."""
+
+    def __init__(self, session):
+        self._session  = session
+        self._enabled  = False
+        self._timers   = collections.OrderedDict()     # Etapa -> LatencyHistogram
+        self._counters = collections.OrderedDict()     # Evento -> contagem
+        for (_, _, stage) in self._stages():
+            self._timers[stage] = LatencyHistogram()
+        for (_, _, event) in self._events():
+            self._counters[event] = 0
+
+
+    def _stages(self):
+        """Métodos cronometrados: (instância, nome do método, etapa). Uma etapa pode agrupar vários métodos:
+        as pesquisas de caminhos incluem as linhas novas da cache e as correções das já guardadas."""
+        session = self._session
+        hospital = session.hospital
+        return [
+            (session,         'work',                   'work'),
+            (session.robot,   'updateRobot',            'robot.update'),
+            (hospital,        'updateWithPosition',     'hospital.position'),
+            (hospital,        'updateWithObjects',      'hospital.objects'),
+            (hospital,        'updateMap',              'hospital.map'),
+            (hospital,        'computeDirectDoorPaths', 'hospital.doors'),
+            (hospital._map,   'shortestPaths',          'paths.search'),
+            (hospital._paths, '_propagate',             'paths.search')
+        ] + [(session, 'resp{0}'.format(q), 'resp{0}'.format(q)) for q in range(1, 9)]
+
+
+    def _events(self):
+        """Métodos contados: (instância, nome do método, evento)."""
+        hospital = self._session.hospital
+        return [
+            (hospital, 'addObject', 'objects.registered')
+        ]
+
+
+    def isEnabled(self):
+        return self._enabled
+
+
+    def enable(self):
+        """Liga a instrumentação."""
+        if self._enabled:
+            return
+        clock = time.perf_counter_ns
+        for (instance, name, stage) in self._stages():
+            method, histogram = getattr(instance, name), self._timers[stage]
+            def timed(*args, _method=method, _record=histogram.record, **kwargs):
+                start = clock()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    _record(clock() - start)
+            setattr(instance, name, functools.update_wrapper(timed, method))
+        counters = self._counters
+        for (instance, name, event) in self._events():
+            method = getattr(instance, name)
+            def counted(*args, _method=method, _event=event, **kwargs):
+                counters[_event] += 1
+                return _method(*args, **kwargs)
+            setattr(instance, name, functools.update_wrapper(counted, method))
+        self._enabled = True
+
+
+    def disable(self):
+        """Desliga a instrumentação, mantendo os valores já medidos."""
+        if not self._enabled:
+            return
+        for (instance, name, _) in self._stages() + self._events():
+            delattr(instance, name)
+        self._enabled = False
+
+
+    def reset(self):
+        """Esquece os valores medidos."""
+        for histogram in self._timers.values():
+            histogram.reset()
+        for event in self._counters:
+            self._counters[event] = 0
+
+
+    def getSummary(self):
+        """Devolve um resumo em valores simples (para JSON): por etapa, o número de chamadas, o tempo total (ms)
+        e o tempo médio, mínimo, máximo e dos percentis (µs); e os contadores de eventos."""
+        stages = collections.OrderedDict()
+        for (stage, h) in self._timers.items():
+            entry = collections.OrderedDict([
+                ('count',    h.getCount()),
+                ('total_ms', h.getTotal() / 1e6),
+                ('mean_us',  h.getMean() / 1e3),
+                ('min_us',   h.getMin() / 1e3),
+                ('max_us',   h.getMax() / 1e3)
+            ])
+            for p in PERCENTILES:
+                entry['p{0:g}_us'.format(p)] = h.getPercentile(p) / 1e3
+            stages[stage] = entry
+        return collections.OrderedDict([
+            ('enabled',  self._enabled),
+            ('stages',   stages),
+            ('counters', collections.OrderedDict(self._counters))
+        ])
+
+
+    def toJson(self):
+        """Devolve o resumo (ver getSummary()) em JSON."""
+        return json.dumps(self.getSummary())
+
+
+    def toText(self):
+        """Devolve o resumo (ver getSummary()) numa tabela de texto, omitindo as etapas sem chamadas."""
+        summary = self.getSummary()
+        percentiles = ['p{0:g}_us'.format(p) for p in PERCENTILES]
+        lines = ["{0:<20} {1:>9} {2:>11} {3:>10} {4} {5:>10}".format(
+            "etapa", "chamadas", "total ms", "média µs", " ".join("{0:>10}".format(p[:-3] + " µs") for p in percentiles), "máx µs")]
+        for (stage, entry) in summary['stages'].items():
+            if entry['count'] > 0:
+                lines.append("{0:<20} {1:>9} {2:>11.2f} {3:>10.2f} {4} {5:>10.2f}".format(
+                    stage, entry['count'], entry['total_ms'], entry['mean_us'],
+                    " ".join("{0:>10.2f}".format(entry[p]) for p in percentiles), entry['max_us']))
+        for (event, count) in summary['counters'].items():
+            lines.append("{0:<20} {1:>9}".format(event, count))
+        return "\n".join(lines)
+
+
+
+def synchronized(method):
+    """Decorador que serializa as chamadas a um método através do lock da instância (atributo _lock)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+
+class AgentSession:
+    """Modelo do mundo de um robot: agrega o seu próprio registo de objetos, o seu estado cinemático e o piso.
+    Várias sessões podem coexistir no mesmo processo, pois não partilham qualquer estado.
+    As atualizações e as perguntas de uma sessão podem ser feitas a partir de várias threads."""
+
+    def __init__(self, graph=None, clock=None, estimator=LeastSquaresEstimator, log=None, rooms=None, corridors=None):
+        """graph é a classe usada para os grafos do piso e rooms e corridors as suas salas e corredores (ver Hospital).
+        clock é o relógio do robot (WallClock por omissão, TickClock ou ReplayClock).
+        estimator é a classe dos estimadores de bateria e velocidade do robot (ver LinearEstimator).
+        log, se indicado, regista cada leitura dos sensores para a reproduzir mais tarde (ver registo.TickLogWriter)."""
+        self.things   = Things()
+        self.robot    = Robot(clock, estimator)
+        self.hospital = Hospital(self.robot, self.things, graph, rooms, corridors)
+        self._lock    = threading.RLock()
+        self._log     = log
+
+        # Instrumentação das etapas de work() e das respostas (desligada por omissão; ver Instrumentation)
+        self.instrumentation = Instrumentation(self)
+        if log is not None:
+            log.start(self.robot.getStartTime())
+
+
+    @synchronized
+    def work(self, posicao, bateria, objetos):
+        """Atualiza o modelo do mundo com uma leitura dos sensores do robot."""
+
+        # Dada a estrutura do código, esta função apenas tem de fazer 3 coisas:
+        # 1. Atualizar a posição do robot na classe Robot;
+        # 2. Atualizar a classe Hospital com a nova posição do Robot;
+        # 3. Informar quais os objetos encontrados pelo robot.
+        # Todo o processamento associado a estas informações é feito automaticamente pelas classes.
+
+        self.robot.updateRobot(posicao, bateria)
+        if self._log is not None:
+            self._log.record(self.robot.getTickTime(), posicao, bateria, objetos)
+        self.hospital.updateWithPosition(self.robot.getPosition())
+        self.hospital.updateWithObjects(objetos, self.robot.getPosition())
+
+
+    @synchronized
+    def getState(self):
+        """Devolve o estado completo da sessão (registo de objetos, robot e piso), em valores simples
+        (números, strings, listas, tuplos e dicionários), para ser guardado (ver estado.py)."""
+        return {
+            'things':   self.things.getState(),
+            'robot':    self.robot.getState(),
+            'hospital': self.hospital.getState()
+        }
+
+
+    @synchronized
+    def setState(self, state):
+        """Repõe um estado devolvido por getState() numa sessão acabada de criar, com os mesmos estimadores."""
+        self.things.setState(state['things'])
+        self.robot.setState(state['robot'])
+        self.hospital.setState(state['hospital'])
+
+
+    # As respostas são fornecidas por métodos previamente implementados nas respetivas classes.
+    # É apenas necessário obter o resultado destas funções e formatar o output quando necessário.
+    # O tratamento de algumas exceções é feito nestes métodos a fim de obter informações sobre
+    # os erros encontrados e porventura adaptar a mensagem consoante o tipo de erro.
+
+    @synchronized
+    def resp1(self):
+        # Qual foi a penúltima pessoa que viste?
+        return "Resposta: {0}\n".format(self.things.getLastButOnePerson())
+
+
+    @synchronized
+    def resp2(self):
+        # Em que tipo de sala estás agora?
+        return "Resposta: {0}\n".format(self.hospital.roomDescription(self.hospital.getCurrentTypeOfRoom()))
+
+
+    @synchronized
+    def resp3(self):
+        # Qual o caminho para a sala de enfermeiros mais próxima?
+        return "Resposta: {0}\n".format(Utils.pathDescription(self.hospital.getPathToNearestNurseOffice()))
+
+
+    @synchronized
+    def resp4(self):
+        # Qual a distância até ao médico mais próximo?
+        return "Resposta: {0}\n".format(self.hospital.getDistanceToNearestDoctor())
+
+
+    @synchronized
+    def resp5(self):
+        # Quanto tempo achas que demoras a ir de onde estás até às escadas?
+        try:
+            return "Resposta: {0}\n".format(Utils.estimateToStr(self.hospital.getTimeToStairs()))
+        except:
+            return "Não tenho dados suficientes para saber como me comporto.\n"
+
+
+    @synchronized
+    def resp6(self):
+        # Quanto tempo achas que falta até ficares sem bateria?
+        try:
+            return "Resposta: {0}\n".format(Utils.estimateToStr(self.hospital.getTimeToDie()))
+        except:
+            return "Não tenho dados suficientes para saber quando irei entregar a alma ao meu criador.\n"
+
+
+    @synchronized
+    def resp7(self):
+        # Qual a probabilidade de encontrar um livro numa divisão se já encontraste uma cadeira?
+        try:
+            return "Resposta: {0:.3f}\n".format(self.hospital.getProbabilityOfBookIfChairFound())
+        except ZeroDivisionError:
+            return "Não me é possível calcular esta probabilidade de momento (divisão por zero)\n"
+        except Exception as e:
+            return "Ocorreu um erro não previsto: {0}\n".format(repr(e))
+
+
+    @synchronized
+    def resp8(self):
+        # Se encontrares um enfermeiro numa divisão, qual é a probabilidade de estar lá um doente?
+        try:
+            return "Resposta: {0:.3f}\n".format(self.hospital.getConditionalProbability([OBJ_PATIENT], [OBJ_NURSE]))
+        except ZeroDivisionError:
+            return "Não me é possível calcular esta probabilidade de momento (divisão por zero)\n"
+        except Exception as e:
+            return "Ocorreu um erro não previsto: {0}\n".format(repr(e))
+
+
+
+
+# -----------------------------------------------------------------------------
+# SESSÃO POR OMISSÃO
+# -----------------------------------------------------------------------------
+
+# O simulador comunica apenas através das funções work() e resp1() a resp8().
+# Estas funções delegam numa sessão criada quando o módulo é importado.
+_session = AgentSession()
+
+
+def getDefaultSession():
+    """Devolve a sessão utilizada pelas funções work() e resp1() a resp8()."""
+    return _session
+
+
+def resetDefaultSession(**options):
+    """Substitui a sessão por omissão por uma nova, esquecendo tudo o que o robot aprendeu.
+    As opções são passadas a AgentSession (por exemplo, log=registo.TickLogWriter(ficheiro) para registar as leituras)."""
+    global _session
+    _session = AgentSession(**options)
+    return _session
+
+
+
 # -----------------------------------------------------------------------------
 # FUNÇÃO DE TRABALHO
 # -----------------------------------------------------------------------------
@@ -855,16 +2468,7 @@ def work(posicao, bateria, objetos):
     posicao -> a posição atual do agente, uma lista [X,Y]
     bateria -> valor de energia na bateria, um número inteiro >= 0
     objetos -> o nome do(s) objeto(s) próximos do agente, uma string"""
-
-    # Dada a estrutura do código, esta função apenas tem de fazer 3 coisas:
-    # 1. Atualizar a posição do robot na classe Robot;
-    # 2. Atualizar a classe Hospital com a nova posição do Robot;
-    # 3. Informar quais os objetos encontrados pelo robot.
-    # Todo o processamento associado a estas informações é feito automaticamente pelas classes.
-
-    Robot.updateRobot(posicao, bateria)
-    Hospital.updateWithPosition(Robot.getPosition())
-    Hospital.updateWithObjects(objetos, Robot.getPosition())
+    _session.work(posicao, bateria, objetos)
 
 
 
@@ -872,63 +2476,41 @@ def work(posicao, bateria, objetos):
 # RESPOSTAS ÀS PERGUNTAS
 # -----------------------------------------------------------------------------
 
-# As respostas são fornecidas por métodos previamente implementados nas respetivas classes.
-# É apenas necessário obter o resultado destas funções e formatar o output quando necessário.
-# O tratamento de algumas exceções é feito nestas funções a fim de obter informações sobre
-# os erros encontrados e porventura adaptar a mensagem consoante o tipo de erro.
-
-
 def resp1():
     # Qual foi a penúltima pessoa que viste?
-    print("Resposta: {0}\n".format(Things.getLastButOnePerson()))
+    print(_session.resp1())
 
 
 def resp2():
     # Em que tipo de sala estás agora?
-    print("Resposta: {0}\n".format(Hospital.roomDescription(Hospital.getCurrentTypeOfRoom())))
+    print(_session.resp2())
 
 
 def resp3():
     # Qual o caminho para a sala de enfermeiros mais próxima?
-    print("Resposta: {0}\n".format(Utils.pathDescription(Hospital.getPathToNearestNurseOffice())))
+    print(_session.resp3())
 
 
 def resp4():
     # Qual a distância até ao médico mais próximo?
-    print("Resposta: {0}\n".format(Hospital.getDistanceToNearestDoctor()))
+    print(_session.resp4())
 
 
 def resp5():
     # Quanto tempo achas que demoras a ir de onde estás até às escadas?
-    try:
-        print("Resposta: {0}\n".format(Utils.timeToStr(Hospital.getTimeToStairs())))
-    except:
-        print("Não tenho dados suficientes para saber como me comporto.\n")
+    print(_session.resp5())
 
 
 def resp6():
     # Quanto tempo achas que falta até ficares sem bateria?
-    try:
-        print("Resposta: {0}\n".format(Utils.timeToStr(Hospital.getTimeToDie())))
-    except:
-        print("Não tenho dados suficientes para saber quando irei entregar a alma ao meu criador.\n")
+    print(_session.resp6())
 
 
 def resp7():
     # Qual a probabilidade de encontrar um livro numa divisão se já encontraste uma cadeira?
-    try:
-        print("Resposta: {0:.3f}\n".format(Hospital.getProbabilityOfBookIfChairFound()))
-    except ZeroDivisionError:
-        print("Não me é possível calcular esta probabilidade de momento (divisão por zero)\n")
-    except Exception as e:
-        print("Ocorreu um erro não previsto: {0}\n".format(repr(e)))
+    print(_session.resp7())
 
 
 def resp8():
     # Se encontrares um enfermeiro numa divisão, qual é a probabilidade de estar lá um doente?
-    try:
-        print("Resposta: {0:.3f}\n".format(Hospital.getProbabilityOfPatientKnowingNurses()))
-    except ZeroDivisionError:
-        print("Não me é possível calcular esta probabilidade de momento (divisão por zero)\n")
-    except Exception as e:
-        print("Ocorreu um erro não previsto: {0}\n".format(repr(e)))
+    print(_session.resp8())
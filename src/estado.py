@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+estado.py
+
+Instantâneos binários do modelo do mundo de uma sessão do agente (ver AgentSession.getState()):
+registo de pessoas e objetos, estado do robot e dos seus estimadores, grafos floor e map.
+Permitem guardar periodicamente o que o robot aprendeu e retomá-lo depois de o processo ser reiniciado.
+
+O formato é versionado e não depende do pickle nem das classes do networkx. Após o cabeçalho (MAGIC + versão)
+vem uma tabela com todas as strings (categorias, nomes e nodos do grafo map: os seus comprimentos, em carateres,
+e o texto de todas em UTF-8), seguida de campos com
+arrays de inteiros (int64) ou de reais (double), little-endian, sempre pela mesma ordem:
+
+    registo     pessoas e objetos (pares de strings), duas últimas pessoas e "última leitura vazia"
+    robot       posições, bateria, instantes e velocidades; para cada estimador, a classe, as contagens,
+                as somas e a janela de amostras (se a tiver)
+    piso        salas atual e anterior; nodos e adjacência (CSR) do grafo floor; pessoas e objetos (sala, categoria,
+                nome e posição); nodos do grafo map com as posições e adjacência (CSR) com as distâncias
+
+Os valores em falta (uma posição ou a primeira abcissa de um estimador) são guardados como NaN.
+"""
+
+import itertools
+import math
+import os
+import struct
+import sys
+
+from array import array
+
+import agente
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+SNAPSHOT_MAGIC   = b"ANDE"
+SNAPSHOT_VERSION = 1
+
+HEADER = struct.Struct("<4sH")
+COUNT  = struct.Struct("<Q")
+
+# Os arrays são escritos em little-endian, qualquer que seja a máquina
+BIG_ENDIAN = sys.byteorder == "big"
+
+NAN = float('nan')
+
+
+
+# -----------------------------------------------------------------------------
+# CODIFICAÇÃO
+# -----------------------------------------------------------------------------
+
+class SnapshotEncoder:
+    """Acumula os campos de um instantâneo: strings (por índice numa tabela comum), inteiros e reais."""
+
+    def __init__(self):
+        self._strings = {}      # String -> índice na tabela
+        self._parts   = []
+
+    def string(self, value):
+        """Devolve o índice de uma string na tabela, acrescentando-a se for nova."""
+        return self._strings.setdefault(value, len(self._strings))
+
+    def strings(self, values):
+        """Devolve os índices de uma sequência de strings na tabela (ver string())."""
+        table = self._strings
+        return [table.setdefault(value, len(table)) for value in values]
+
+    def _array(self, typecode, values):
+        values = array(typecode, values)
+        if BIG_ENDIAN:
+            values.byteswap()
+        self._parts.append(COUNT.pack(len(values)))
+        self._parts.append(values.tobytes())
+
+    def ints(self, values):
+        self._array('q', values)
+
+    def doubles(self, values):
+        self._array('d', values)
+
+    def getvalue(self):
+        """Devolve o instantâneo: cabeçalho, tabela de strings e campos."""
+        text = "".join(self._strings).encode("utf-8")
+        lengths = array('q', map(len, self._strings))       # Em carateres
+        if BIG_ENDIAN:
+            lengths.byteswap()
+        return b"".join([HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION), COUNT.pack(len(lengths)), lengths.tobytes(),
+                         COUNT.pack(len(text)), text] + self._parts)
+
+
+
+class SnapshotDecoder:
+    """Lê os campos de um instantâneo pela ordem em que foram escritos."""
+
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise ValueError("Empty or truncated snapshot")
+        (magic, version) = HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Unknown snapshot format")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version: {0}".format(version))
+        self._data   = data
+        self._offset = HEADER.size
+
+        lengths = self._array('q')
+        (size,) = COUNT.unpack_from(data, self._offset)
+        start = self._offset + COUNT.size
+        text = data[start:start + size].decode("utf-8")
+        self._offset = start + size
+        ends = list(itertools.accumulate(lengths))
+        self.strings = [text[a:b] for (a, b) in zip([0] + ends, ends)]
+
+    def _array(self, typecode):
+        if self._offset + COUNT.size > len(self._data):
+            raise ValueError("Truncated snapshot")
+        (count,) = COUNT.unpack_from(self._data, self._offset)
+        values = array(typecode)
+        start = self._offset + COUNT.size
+        end = start + count * values.itemsize
+        if end > len(self._data):
+            raise ValueError("Truncated snapshot")
+        values.frombytes(self._data[start:end])
+        if BIG_ENDIAN:
+            values.byteswap()
+        self._offset = end
+        return values
+
+    def ints(self):
+        return self._array('q')
+
+    def doubles(self):
+        return self._array('d')
+
+
+
+def pairs(values):
+    """Agrupa uma sequência plana [a0, b0, a1, b1, ...] em pares."""
+    return list(zip(values[0::2], values[1::2]))
+
+
+def optional(value):
+    """Converte um valor em falta (NaN) em None."""
+    return None if math.isnan(value) else value
+
+
+
+# -----------------------------------------------------------------------------
+# ESTADO DA SESSÃO
+# -----------------------------------------------------------------------------
+
+def encodeState(state):
+    """Codifica o estado de uma sessão (ver AgentSession.getState()) num instantâneo binário."""
+    out = SnapshotEncoder()
+    s, strings = out.string, out.strings
+
+    things = state['things']
+    out.ints(strings(x for pair in things['people'] for x in pair))
+    out.ints(strings(x for pair in things['objects'] for x in pair))
+    out.ints([s(things['lastPeople'][0]), s(things['lastPeople'][1]), int(things['lastWasBlank'])])
+
+    robot = state['robot']
+    out.doubles(list(robot['positions'][0]) + list(robot['positions'][1]) + list(robot['battery'])
+                + list(robot['times']) + list(robot['velocity']))
+    for estimator in robot['estimators']:
+        window = estimator.get('window')
+        out.ints([s(estimator['kind']), estimator['count'], int(window is not None)])
+        out.doubles([estimator['origin'] if estimator['origin'] is not None else NAN] + list(estimator['sums']))
+        out.doubles([v for sample in window or () for v in sample])
+
+    hospital = state['hospital']
+    out.ints([hospital['currentRoom'], hospital['lastVisited']])
+    out.ints(hospital['floorNodes'])
+    out.ints(hospital['floorAdjacency'][0])
+    out.ints(hospital['floorAdjacency'][1])
+    objects = hospital['objects']
+    out.ints([room for (room, _, _, _) in objects])
+    out.ints(strings(x for (_, category, name, _) in objects for x in (category, name)))
+    out.doubles([v for (_, _, _, position) in objects for v in position])
+    out.ints(strings(n for (n, _) in hospital['mapNodes']))
+    out.doubles([v for (_, midpoint) in hospital['mapNodes'] for v in (midpoint if midpoint is not None else (NAN, NAN))])
+    out.ints(hospital['mapAdjacency'][0])
+    out.ints(hospital['mapAdjacency'][1])
+    out.doubles(hospital['mapAdjacency'][2])
+
+    return out.getvalue()
+
+
+def decodeState(data):
+    """Descodifica um instantâneo binário no estado de uma sessão (ver AgentSession.setState())."""
+    src = SnapshotDecoder(data)
+    strings = src.strings
+
+    people  = [(strings[c], strings[n]) for (c, n) in pairs(src.ints())]
+    objects = [(strings[c], strings[n]) for (c, n) in pairs(src.ints())]
+    (last, lastButOne, blank) = src.ints()
+    things = {
+        'people':       people,
+        'objects':      objects,
+        'lastPeople':   (strings[last], strings[lastButOne]),
+        'lastWasBlank': bool(blank)
+    }
+
+    values = src.doubles()
+    estimators = []
+    for _ in range(3):
+        (kind, count, windowed) = src.ints()
+        sums = src.doubles()
+        window = pairs(src.doubles())
+        estimator = {'kind': strings[kind], 'origin': optional(sums[0]), 'count': count, 'sums': tuple(sums[1:])}
+        if windowed:
+            estimator['window'] = window
+        estimators.append(estimator)
+    robot = {
+        'positions':  ((values[0], values[1]), (values[2], values[3])),
+        'battery':    (values[4], values[5]),
+        'times':      tuple(values[6:10]),
+        'velocity':   (values[10], values[11]),
+        'estimators': estimators
+    }
+
+    (currentRoom, lastVisited) = src.ints()
+    floorNodes = list(src.ints())
+    floorAdjacency = (src.ints(), src.ints())
+    rooms = src.ints()
+    names = pairs(src.ints())
+    positions = pairs(src.doubles())
+    mapNodes = [strings[n] for n in src.ints()]
+    midpoints = pairs(src.doubles())
+    mapAdjacency = (src.ints(), src.ints(), src.doubles())
+    hospital = {
+        'currentRoom':    currentRoom,
+        'lastVisited':    lastVisited,
+        'floorNodes':     floorNodes,
+        'floorAdjacency': floorAdjacency,
+        'objects':        [(room, strings[c], strings[n], position) for (room, (c, n), position) in zip(rooms, names, positions)],
+        'mapNodes':       [(n, None if math.isnan(m[0]) else m) for (n, m) in zip(mapNodes, midpoints)],
+        'mapAdjacency':   mapAdjacency
+    }
+
+    return {'things': things, 'robot': robot, 'hospital': hospital}
+
+
+
+# -----------------------------------------------------------------------------
+# GUARDAR E CARREGAR
+# -----------------------------------------------------------------------------
+
+def dumps(session):
+    """Devolve o instantâneo binário de uma sessão."""
+    return encodeState(session.getState())
+
+
+def loads(data, **options):
+    """Cria uma sessão nova a partir de um instantâneo binário.
+    As opções são passadas a AgentSession (graph, clock, estimator, log); os estimadores devem ser da mesma classe."""
+    session = agente.AgentSession(**options)
+    session.setState(decodeState(data))
+    return session
+
+
+def save(session, path):
+    """Guarda o instantâneo de uma sessão num ficheiro.
+    O ficheiro é escrito ao lado e depois substitui o anterior, pelo que um instantâneo nunca fica a meio."""
+    data = dumps(session)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def load(path, **options):
+    """Cria uma sessão nova a partir de um instantâneo guardado num ficheiro (ver loads())."""
+    with open(path, "rb") as f:
+        return loads(f.read(), **options)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+lote.py
+
+Executa lotes de episódios do simulador headless em paralelo, um por processo de um pool.
+Cada episódio tem a sua própria sessão do agente; os resultados (respostas às perguntas 1 a 8, ciclos e tempo)
+são escritos em JSON, uma linha por episódio, à medida que os episódios terminam.
+
+Um episódio é descrito por um dicionário, em que todas as chaves são opcionais:
+    id       identificador do episódio
+    ticks    número de ciclos (5000)
+    seed     semente do controlador RandomExplorer (0)
+    start    posição inicial do robot [x, y] (a da planta)
+    battery  carga inicial da bateria (a da planta)
+    drain    consumo da bateria por ciclo, como fração da carga (simulador.BATTERY_IDLE)
+    layout   semente para baralhar as posições dos objetos, ou null para a disposição da planta
+    plan     ficheiro JSON da planta do piso (ver planta.py), ou null para o piso original
+    metrics  se verdadeiro, o resultado inclui a instrumentação da sessão (ver agente.Instrumentation)
+
+Uso: python src/lote.py episodios.json [-p processos] > resultados.jsonl
+     python src/lote.py -n 100 [-t ciclos] [-s semente] [-p processos] > resultados.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import mundo
+import planta
+import simulador
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+DEFAULT_TICKS = 5000
+
+# Intervalo do consumo da bateria por ciclo nos episódios aleatórios
+RANDOM_DRAIN = (1500.0, 3000.0)
+
+
+
+# -----------------------------------------------------------------------------
+# EPISÓDIOS
+# -----------------------------------------------------------------------------
+
+def shuffleLayout(seed, objects=mundo.OBJECTS):
+    """Devolve uma disposição dos objetos (no formato de mundo.OBJECTS) com as posições baralhadas entre todos."""
+    rng = random.Random(seed)
+    points = [point for (_, _, items) in objects for (point, _) in items]
+    rng.shuffle(points)
+    points = iter(points)
+    return [
+        (category, image, [(next(points), name) for (_, name) in items])
+        for (category, image, items) in objects
+    ]
+
+
+def randomStart(grid, rng):
+    """Devolve uma posição aleatória do piso onde o robot cabe sem tocar em paredes nem objetos."""
+    half = simulador.SPRITE_HALF + 5
+    while True:
+        x = rng.randrange(half, mundo.WIDTH - half)
+        y = rng.randrange(half, mundo.HEIGHT - half)
+        if all(grid.isFree(i, j) for i in range(x - half, x + half + 1) for j in range(y - half, y + half + 1)):
+            return [x, y]
+
+
+def randomEpisodes(count, ticks=DEFAULT_TICKS, seed=0):
+    """Gera episódios com posição inicial, disposição dos objetos e consumo da bateria aleatórios."""
+    rng = random.Random(seed)
+    episodes = []
+    for i in range(count):
+        layout = rng.randrange(2 ** 31)
+        grid = simulador.getOccupancyGrid(shuffleLayout(layout))
+        episodes.append({
+            'id':     i,
+            'ticks':  ticks,
+            'seed':   rng.randrange(2 ** 31),
+            'start':  randomStart(grid, rng),
+            'drain':  round(rng.uniform(*RANDOM_DRAIN), 1),
+            'layout': layout
+        })
+    return episodes
+
+
+def runEpisode(episode):
+    """Executa um episódio numa sessão nova do agente e devolve o resultado como um dicionário."""
+    layout = episode.get('layout')
+    plan = planta.load(episode['plan']) if episode.get('plan') else planta.original()
+    sim = simulador.Simulator(
+        position = episode.get('start'),
+        battery  = episode.get('battery'),
+        objects  = shuffleLayout(layout, plan.getObjects()) if layout is not None else None,
+        drain    = episode.get('drain', simulador.BATTERY_IDLE),
+        plan     = plan
+    )
+    ticks = episode.get('ticks', DEFAULT_TICKS)
+    if episode.get('metrics'):
+        sim.session.instrumentation.enable()
+    elapsed = sim.run(simulador.RandomExplorer(episode.get('seed', 0)), ticks)
+
+    result = {
+        'id':       episode.get('id'),
+        'ticks':    ticks,
+        'time':     elapsed,
+        'position': list(sim.getPosition()),
+        'battery':  sim.getBattery(),
+        'answers':  {}
+    }
+    for question in simulador.QUESTIONS:
+        result['answers'][str(question)] = str(sim.ask(question)).strip()
+    if episode.get('metrics'):
+        result['metrics'] = sim.session.instrumentation.getSummary()
+    return result
+
+
+
+# -----------------------------------------------------------------------------
+# LOTE
+# -----------------------------------------------------------------------------
+
+def runBatch(episodes, processes=None, output=sys.stdout):
+    """Executa os episódios num pool de processos (um por núcleo, por omissão),
+    escrevendo cada resultado em output, numa linha JSON, assim que fica disponível.
+    Devolve (número de episódios, total de ciclos, tempo decorrido em segundos)."""
+    start = time.perf_counter()
+    count, ticks = 0, 0
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(runEpisode, episodes):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            count += 1
+            ticks += result['ticks']
+    return (count, ticks, time.perf_counter() - start)
+
+
+
+# -----------------------------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa episódios do simulador em paralelo.")
+    parser.add_argument('episodes', nargs='?', help="ficheiro JSON com a lista de episódios")
+    parser.add_argument('-n', type=int, default=8, help="número de episódios aleatórios (sem ficheiro)")
+    parser.add_argument('-t', type=int, default=DEFAULT_TICKS, help="ciclos por episódio aleatório")
+    parser.add_argument('-s', type=int, default=0, help="semente dos episódios aleatórios")
+    parser.add_argument('-p', type=int, default=None, help="número de processos (um por núcleo)")
+    args = parser.parse_args()
+
+    if args.episodes:
+        with open(args.episodes, encoding='utf-8') as f:
+            episodes = json.load(f)
+    else:
+        episodes = randomEpisodes(args.n, args.t, args.s)
+
+    (count, ticks, elapsed) = runBatch(episodes, args.p)
+    print("episódios: {0}, ciclos: {1}, tempo: {2:.2f} s, ciclos/s: {3:.0f}".format(
+        count, ticks, elapsed, ticks / elapsed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+mundo.py
+
+Descrição do piso do hospital usado pelo simulador (ia.py): paredes, portas, objetos, pessoas e carregadores.
+Os valores são os mesmos do simulador original, para que os resultados do simulador headless sejam comparáveis.
+Outros pisos são descritos por plantas (ver planta.py), que usam as mesmas imagens e a mesma grelha de ocupação.
+"""
+
+import os
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+# Dimensões do ecrã do simulador
+WIDTH  = 800
+HEIGHT = 600
+
+# Pasta com as imagens do simulador
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imgs")
+
+# Imagens de cada elemento do piso
+IMG_WALL    = "tijolo3.png"
+IMG_DOOR    = "porta.png"
+IMG_ROBOT   = "bot3.png"
+IMG_CHARGER = "bateria.png"
+
+# Tamanho das imagens
+SIZE_WALL   = 15
+SIZE_SPRITE = 25
+
+# Posição inicial do robot e carga inicial da bateria
+START_POSITION = (100, 100)
+START_BATTERY  = 100.0
+
+# Deslocamento do robot, em píxeis, por cada tecla premida num ciclo
+STEP = 5
+
+# Frequência (ciclos por segundo) do ciclo principal do simulador
+FPS = 50
+
+
+# Portas (canto superior esquerdo da imagem)
+DOORS = [
+    (30, 425), (45, 425), (60, 425), (290, 425), (305, 425), (320, 425),
+    (420, 425), (435, 425), (450, 425), (680, 425), (695, 425), (710, 425),
+    (140, 150), (155, 150), (160, 150), (300, 300), (315, 300), (330, 300),
+    (530, 200), (530, 215), (530, 230), (650, 20), (650, 35), (650, 50),
+    (650, 125), (650, 140), (650, 155), (650, 240), (650, 255), (650, 270)
+]
+
+# Carregadores da bateria (canto superior esquerdo da imagem)
+CHARGERS = [(17, 85), (760, 325)]
+
+# Objetos e pessoas, por categoria e pela ordem em que o sensor os reporta: (centro, nome)
+OBJECTS = [
+    ('medico', "M1.png", [
+        ((475, 125), "Ana"), ((175, 270), "Carlos"), ((365, 570), "Maria")
+    ]),
+    ('enfermeiro', "E1.png", [
+        ((730, 50), "Paulo"), ((50, 350), "Miguel"), ((425, 35), "Maria"),
+        ((50, 500), "Rui"), ((100, 550), "Paula"), ((200, 550), "Adérito")
+    ]),
+    ('doente', "D1.png", [
+        ((210, 200), "Joaquim"), ((310, 230), "Fábio"), ((500, 470), "Susana"),
+        ((700, 500), "Micaela"), ((730, 240), "Amália")
+    ]),
+    ('cadeira', "cadeira1.png", [
+        ((435, 195), "cadeira1"), ((435, 275), "cadeira2"), ((490, 275), "cadeira3"),
+        ((140, 465), "cadeira4"), ((170, 465), "cadeira5"), ((225, 465), "cadeira6"),
+        ((300, 550), "cadeira7")
+    ]),
+    ('livro', "livro.png", [
+        ((220, 270), "os_lusíadas"), ((510, 190), "amor_em_tempos_de_cólera"),
+        ((760, 270), "kapput"), ((700, 550), "as_vinhas_da_ira"),
+        ((315, 500), "gog"), ((500, 560), "senhor_dos_anéis")
+    ]),
+    ('mesa', "mesa.png", [
+        ((730, 135), "mesa1"), ((430, 545), "mesa2"), ((30, 550), "mesa3"), ((365, 540), "mesa4")
+    ]),
+    ('cama', "cama.png", [
+        ((750, 145), "cama1"), ((700, 240), "cama2"), ((630, 550), "cama3"), ((340, 230), "cama4"),
+        ((140, 230), "cama5"), ((550, 550), "cama6"), ((550, 520), "cama7")
+    ])
+]
+
+
+# -----------------------------------------------------------------------------
+# PAREDES
+# -----------------------------------------------------------------------------
+
+def wallTiles():
+    """Devolve a lista de tijolos (canto superior esquerdo), pela ordem em que o simulador os desenha."""
+    tiles = []
+    for i in range(0, WIDTH, SIZE_WALL):
+        tiles += [(i, 0), (i, 585), (i, 425)]
+    for i in range(0, HEIGHT, SIZE_WALL):
+        tiles += [(0, i), (785, i)]
+    for i in range(100, 550, SIZE_WALL):
+        tiles += [(i, 150), (i, 300)]
+    for i in range(150, 300, SIZE_WALL):
+        tiles += [(100, i), (250, i), (400, i), (535, i)]
+    for i in range(425, 585, SIZE_WALL):
+        tiles += [(250, i), (400, i), (585, i)]
+    for i in range(15, 315, SIZE_WALL):
+        tiles += [(650, i)]
+    for i in range(650, WIDTH, SIZE_WALL):
+        tiles += [(i, 100), (i, 200), (i, 300)]
+    for i in range(15, 150, 30):
+        tiles += [(i, 15), (i, 30), (i, 45), (i, 60), (i + 15, 60)]
+    return tiles
+
+
+
+# -----------------------------------------------------------------------------
+# GRELHA DE OCUPAÇÃO
+# -----------------------------------------------------------------------------
+
+class OccupancyGrid:
+    """Mapa de ocupação do piso, com um byte por píxel (1: ocupado, 0: livre) num bytearray de linhas consecutivas.
+    É construído uma única vez e pode ser partilhado (por exemplo, através de getCells()) sem desenhar o piso."""
+
+    def __init__(self, width, height):
+        self._width  = width
+        self._height = height
+        self._cells  = bytearray(width * height)
+
+
+    def getWidth(self):
+        return self._width
+
+    def getHeight(self):
+        return self._height
+
+    def getCells(self):
+        return self._cells
+
+
+    def fill(self, x, y, width, height, value=1):
+        """Marca um retângulo (recortado pelos limites do piso) como ocupado (1) ou livre (0)."""
+        x0, x1 = max(x, 0), min(x + width, self._width)
+        if x0 >= x1:
+            return
+        row = bytes([value]) * (x1 - x0)
+        for j in range(max(y, 0), min(y + height, self._height)):
+            self._cells[j * self._width + x0 : j * self._width + x1] = row
+
+
+    def paste(self, x, y, mask):
+        """Copia uma máscara (lista de linhas de bytes 0/1) para o piso, a partir de (x, y)."""
+        for (j, line) in enumerate(mask):
+            if 0 <= y + j < self._height:
+                x0, x1 = max(x, 0), min(x + len(line), self._width)
+                if x0 < x1:
+                    self._cells[(y + j) * self._width + x0 : (y + j) * self._width + x1] = line[x0 - x : x1 - x]
+
+
+    def isFree(self, x, y):
+        """Indica se o píxel (x, y) está livre. Fora do piso nada está livre."""
+        return 0 <= x < self._width and 0 <= y < self._height and self._cells[y * self._width + x] == 0
+
+
+
+def wallRectangles():
+    """Devolve as paredes como retângulos (x, y, largura, altura), um por tijolo, pela ordem de wallTiles()."""
+    return [(x, y, SIZE_WALL, SIZE_WALL) for (x, y) in wallTiles()]
+
+
+def buildOccupancyGrid(masks=None, objects=OBJECTS, walls=None, doors=DOORS, chargers=CHARGERS,
+                       width=WIDTH, height=HEIGHT):
+    """Constrói a grelha de ocupação do piso a partir dos retângulos das paredes, portas, objetos e carregadores,
+    pela ordem em que o simulador os desenha (as portas abrem as paredes, os objetos sobrepõem-se a ambos).
+    masks associa o nome de uma imagem à sua máscara de ocupação; as imagens sem máscara são retângulos cheios.
+    objects permite usar uma disposição dos objetos diferente da original (no formato de OBJECTS);
+    walls (retângulos, por omissão os tijolos de wallTiles()), doors, chargers e as dimensões permitem usar
+    outro piso (ver planta.FloorPlan)."""
+    masks = masks or {}
+    grid = OccupancyGrid(width, height)
+
+    def place(image, x, y):
+        if image in masks:
+            grid.paste(x, y, masks[image])
+        else:
+            grid.fill(x, y, SIZE_SPRITE, SIZE_SPRITE)
+
+    for (x, y, w, h) in (walls if walls is not None else wallRectangles()):
+        grid.fill(x, y, w, h)
+    for (x, y) in doors:
+        grid.fill(x, y, SIZE_SPRITE, SIZE_SPRITE, 0)        # As portas são brancas
+    for (_, image, items) in objects:
+        for ((x, y), _) in items:
+            place(image, x - SIZE_SPRITE // 2, y - SIZE_SPRITE // 2)
+    for (x, y) in chargers:
+        place(IMG_CHARGER, x, y)
+    return grid
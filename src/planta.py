@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""
+planta.py
+
+Plantas dos pisos do hospital: dimensões, divisões (escadas, corredores e salas), paredes, portas, carregadores,
+pessoas e objetos. Uma planta é lida de um ficheiro JSON, ou gerada proceduralmente com qualquer número de divisões,
+e dela são construídos tanto o lado do agente (as divisões que o robot localiza, ver FloorPlan.createSession())
+como o cenário do simulador (grelha de ocupação, sensor e carregadores, ver simulador.Simulator),
+para que ambos descrevam sempre o mesmo piso. O piso original (mundo.py e Hospital._rooms) é original().
+
+Formato JSON (coordenadas em píxeis; os retângulos das divisões incluem os limites):
+    width, height   dimensões do piso
+    rooms           divisões, a primeira das quais as escadas:
+                    {"x": [x0, x1], "y": [y0, y1], "kind": "escadas" | "corredor" | "sala", "name": nome}
+    walls           paredes: [x, y, largura, altura]
+    doors           portas, blocos de mundo.SIZE_SPRITE píxeis que abrem as paredes (canto superior esquerdo): [x, y]
+    chargers        carregadores (canto superior esquerdo): [x, y]
+    objects         pessoas e objetos de cada categoria, com uma imagem de mundo.IMAGES:
+                    {"category": categoria, "image": imagem, "items": [[x, y, nome], ...]}
+    start, battery  posição inicial do robot e carga inicial da bateria
+A grelha de ocupação do simulador tem um byte por píxel, pelo que a sua memória cresce com a área do piso.
+
+Uso: python src/planta.py [planta.json | -n salas] [-t ciclos] [-s semente]   (episódio do simulador headless)
+     python src/planta.py -n salas [-s semente] -o planta.json              (gera e grava uma planta)
+"""
+
+import argparse
+import json
+import math
+import random
+
+import agente
+import mundo
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+# KIND_*: Tipos de divisão
+KIND_STAIRS   = "escadas"
+KIND_CORRIDOR = "corredor"
+KIND_ROOM     = "sala"
+KINDS         = [KIND_STAIRS, KIND_CORRIDOR, KIND_ROOM]
+
+# Tipo e nome das divisões do piso original, pela ordem de Hospital._rooms
+ORIGINAL_ROOMS = [(KIND_STAIRS, "Escadas")] + \
+                 [(KIND_CORRIDOR, "Corredor {0}".format(i)) for i in range(1, 5)] + \
+                 [(KIND_ROOM, "Sala {0}".format(i)) for i in range(5, 15)]
+
+# Imagem de cada categoria de pessoas e objetos (as do piso original)
+IMAGES = {category: image for (category, image, _) in mundo.OBJECTS}
+
+# Plantas geradas: lado do interior de cada divisão, espessura das paredes, blocos de porta por abertura (como no
+# piso original), uma fila de corredores a cada CORRIDOR_ROWS filas e número médio de pessoas e objetos por sala
+ROOM_SIDE        = 150
+WALL             = mundo.SIZE_WALL
+DOOR_BLOCKS      = 3
+CORRIDOR_ROWS    = 3
+OBJECTS_PER_ROOM = 3
+
+# Distância mínima dos objetos ao centro da sala, em cada eixo, que deixa livre a passagem entre as portas
+OBJECT_CLEARANCE = 35
+
+
+
+# -----------------------------------------------------------------------------
+# PLANTA
+# -----------------------------------------------------------------------------
+
+class FloorPlan:
+    """Planta de um piso. As divisões são retângulos [(x0, x1), (y0, y1)], como em Hospital._rooms,
+    cada um com um tipo (KIND_*) e um nome; a primeira são as escadas. Os objetos estão no formato de mundo.OBJECTS."""
+
+    def __init__(self, width, height, rooms, walls=(), doors=(), chargers=(), objects=(), start=None,
+                 battery=mundo.START_BATTERY):
+        """rooms é uma lista de (retângulo, tipo, nome). Sem start, o robot começa no centro da segunda divisão."""
+        if len(rooms) < 2 or rooms[0][1] != KIND_STAIRS:
+            raise ValueError("A floor plan needs the stairs as its first room and at least one more room")
+        for (_, kind, _) in rooms:
+            if kind not in KINDS:
+                raise ValueError("Unknown room kind: {0}".format(kind))
+
+        self._width    = width
+        self._height   = height
+        self._rooms    = [[tuple(x), tuple(y)] for ((x, y), _, _) in rooms]
+        self._kinds    = [kind for (_, kind, _) in rooms]
+        self._names    = [name for (_, _, name) in rooms]
+        self._walls    = [tuple(wall) for wall in walls]
+        self._doors    = [tuple(door) for door in doors]
+        self._chargers = [tuple(charger) for charger in chargers]
+        self._objects  = [(category, image, [(tuple(point), name) for (point, name) in items])
+                          for (category, image, items) in objects]
+        self._start    = tuple(start) if start is not None else agente.Utils.midpoint(*self._rooms[1])
+        self._battery  = battery
+        self._grid     = None       # Grelha de ocupação, construída na primeira vez que é pedida
+
+
+    def getWidth(self):
+        return self._width
+
+    def getHeight(self):
+        return self._height
+
+    def getRooms(self):
+        return self._rooms
+
+    def getKinds(self):
+        return self._kinds
+
+    def getNames(self):
+        return self._names
+
+    def getWalls(self):
+        return self._walls
+
+    def getDoors(self):
+        return self._doors
+
+    def getChargers(self):
+        return self._chargers
+
+    def getObjects(self):
+        return self._objects
+
+    def getStart(self):
+        return self._start
+
+    def getBattery(self):
+        return self._battery
+
+
+    def getCorridors(self):
+        """Devolve o conjunto dos índices dos corredores."""
+        return frozenset(i for (i, kind) in enumerate(self._kinds) if kind == KIND_CORRIDOR)
+
+
+    def getImages(self):
+        """Devolve as imagens usadas pelos objetos e pelos carregadores da planta."""
+        return sorted(set(image for (_, image, _) in self._objects) | {mundo.IMG_CHARGER})
+
+
+    def createSession(self, **options):
+        """Cria uma sessão do agente que localiza o robot nas divisões da planta (as opções são passadas a AgentSession)."""
+        options.setdefault('rooms', self._rooms)
+        options.setdefault('corridors', self.getCorridors())
+        return agente.AgentSession(**options)
+
+
+    def buildOccupancyGrid(self, masks=None, objects=None):
+        """Constrói a grelha de ocupação do piso (ver mundo.buildOccupancyGrid()).
+        objects permite usar uma disposição dos objetos diferente da da planta."""
+        return mundo.buildOccupancyGrid(masks, objects if objects is not None else self._objects,
+                                        self._walls, self._doors, self._chargers, self._width, self._height)
+
+
+    def getOccupancyGrid(self, masks=None):
+        """Devolve a grelha de ocupação com a disposição dos objetos da planta, construída apenas na primeira chamada."""
+        if self._grid is None:
+            self._grid = self.buildOccupancyGrid(masks)
+        return self._grid
+
+
+    def toDict(self):
+        """Devolve a planta em valores simples, no formato JSON descrito em planta.py."""
+        return {
+            'width':    self._width,
+            'height':   self._height,
+            'rooms':    [{'x': list(x), 'y': list(y), 'kind': kind, 'name': name}
+                         for ((x, y), kind, name) in zip(self._rooms, self._kinds, self._names)],
+            'walls':    [list(wall) for wall in self._walls],
+            'doors':    [list(door) for door in self._doors],
+            'chargers': [list(charger) for charger in self._chargers],
+            'objects':  [{'category': category, 'image': image, 'items': [[x, y, name] for ((x, y), name) in items]}
+                         for (category, image, items) in self._objects],
+            'start':    list(self._start),
+            'battery':  self._battery
+        }
+
+
+    @staticmethod
+    def fromDict(data):
+        """Cria uma planta a partir de valores no formato JSON descrito em planta.py."""
+        try:
+            rooms = [((room['x'], room['y']), room.get('kind', KIND_ROOM), room.get('name', ""))
+                     for room in data['rooms']]
+            objects = [(group['category'], group.get('image', IMAGES.get(group['category'])),
+                        [((x, y), name) for (x, y, name) in group['items']]) for group in data.get('objects', ())]
+            return FloorPlan(data['width'], data['height'], rooms, data.get('walls', ()), data.get('doors', ()),
+                             data.get('chargers', ()), objects, data.get('start'),
+                             data.get('battery', mundo.START_BATTERY))
+        except (KeyError, TypeError) as e:
+            raise ValueError("Invalid floor plan: {0!r}".format(e))
+
+
+
+# -----------------------------------------------------------------------------
+# PLANTAS
+# -----------------------------------------------------------------------------
+
+_original = None
+
+def original():
+    """Devolve a planta do piso original (mundo.py e Hospital._rooms), criada apenas na primeira chamada."""
+    global _original
+    if _original is None:
+        rooms = [(room, kind, name) for (room, (kind, name)) in zip(agente.Hospital._rooms, ORIGINAL_ROOMS)]
+        _original = FloorPlan(mundo.WIDTH, mundo.HEIGHT, rooms, mundo.wallRectangles(), mundo.DOORS,
+                              mundo.CHARGERS, mundo.OBJECTS, mundo.START_POSITION, mundo.START_BATTERY)
+    return _original
+
+
+def generate(rooms, seed=0, objects=OBJECTS_PER_ROOM):
+    """Gera a planta de um hospital com rooms divisões em grelha, separadas por paredes.
+    A divisão 0 (canto superior esquerdo) são as escadas; a primeira coluna e uma fila em cada CORRIDOR_ROWS
+    são corredores, ligados entre si, e cada sala tem uma porta para o corredor vizinho (ou, na última fila,
+    para a sala acima ou à esquerda). As salas têm pessoas e objetos ao acaso, fora da passagem entre as portas,
+    e os corredores da primeira coluna têm um carregador. O robot começa no primeiro corredor."""
+    if rooms < 2:
+        raise ValueError("A generated floor plan needs at least 2 rooms")
+    rng = random.Random(seed)
+    columns = int(math.ceil(math.sqrt(rooms)))
+    rows = int(math.ceil(rooms / columns))
+    pitch = ROOM_SIDE + WALL
+    (width, height) = (columns * pitch + WALL, rows * pitch + WALL)
+
+    def index(c, r):
+        return r * columns + c if 0 <= c < columns and r >= 0 and r * columns + c < rooms else None
+
+    def kind(c, r):
+        if c == 0 and r == 0:
+            return KIND_STAIRS
+        return KIND_CORRIDOR if c == 0 or r % CORRIDOR_ROWS == 1 else KIND_ROOM
+
+    # Divisões: interior de cada célula da grelha
+    plan = []
+    for i in range(rooms):
+        (c, r) = (i % columns, i // columns)
+        (x0, y0) = (c * pitch + WALL, r * pitch + WALL)
+        k = kind(c, r)
+        name = "Escadas" if k == KIND_STAIRS else "{0} {1}".format("Corredor" if k == KIND_CORRIDOR else "Sala", i)
+        plan.append(([(x0, x0 + ROOM_SIDE - 1), (y0, y0 + ROOM_SIDE - 1)], k, name))
+
+    # Ligações entre divisões
+    links = []
+    for i in range(rooms):
+        (c, r) = (i % columns, i // columns)
+        k = kind(c, r)
+        if k == KIND_STAIRS:
+            neighbors = [index(0, 1)]
+        elif k == KIND_CORRIDOR:
+            neighbors = [index(c + 1, r) if r % CORRIDOR_ROWS == 1 else None, index(c, r + 1) if c == 0 else None]
+        elif r % CORRIDOR_ROWS == 2:
+            neighbors = [index(c, r - 1)]
+        else:
+            below = index(c, r + 1)
+            neighbors = [below if below is not None else (index(c, r - 1) if r > 0 else index(c - 1, r))]
+        links += [(i, n) for n in neighbors if n is not None]
+
+    # Paredes (linhas da grelha) e portas (blocos centrados no meio da parede comum)
+    walls = [(c * pitch, 0, WALL, height) for c in range(columns + 1)] + \
+            [(0, r * pitch, width, WALL) for r in range(rows + 1)]
+    span = (DOOR_BLOCKS - 1) * WALL + mundo.SIZE_SPRITE
+    offset = (mundo.SIZE_SPRITE - WALL) // 2
+    doors = []
+    for (a, b) in links:
+        ((ca, ra), (cb, rb)) = ((a % columns, a // columns), (b % columns, b // columns))
+        if ra == rb:
+            (x, y) = (max(ca, cb) * pitch - offset, ra * pitch + WALL + (ROOM_SIDE - span) // 2)
+            doors += [(x, y + k * WALL) for k in range(DOOR_BLOCKS)]
+        else:
+            (x, y) = (ca * pitch + WALL + (ROOM_SIDE - span) // 2, max(ra, rb) * pitch - offset)
+            doors += [(x + k * WALL, y) for k in range(DOOR_BLOCKS)]
+
+    # Pessoas e objetos, num dos quatro cantos de cada sala; carregadores nos corredores da primeira coluna
+    items = {category: [] for category in agente.CATEGORY_ALL}
+    reach = ROOM_SIDE // 2 - mundo.SIZE_SPRITE // 2 - 1
+    count = 0
+    for (rect, k, _) in plan:
+        if k != KIND_ROOM:
+            continue
+        (cx, cy) = agente.Utils.midpoint(*rect)
+        for _ in range(rng.randrange(2 * objects + 1)):
+            category = rng.choice(agente.CATEGORY_ALL)
+            dx = rng.randint(OBJECT_CLEARANCE, reach) * rng.choice((-1, 1))
+            dy = rng.randint(OBJECT_CLEARANCE, reach) * rng.choice((-1, 1))
+            items[category].append(((cx + dx, cy + dy), "{0}{1}".format(category, count)))
+            count += 1
+    chargers = [(rect[0][0] + 5, rect[1][0] + 5) for (i, (rect, k, _)) in enumerate(plan)
+                if k == KIND_CORRIDOR and i % columns == 0]
+
+    first = index(0, 1)
+    start = agente.Utils.midpoint(*plan[first if first is not None else 1][0])
+    return FloorPlan(width, height, plan, walls, doors, chargers,
+                     [(category, IMAGES[category], items[category]) for category in agente.CATEGORY_ALL],
+                     start, mundo.START_BATTERY)
+
+
+def load(path):
+    """Lê uma planta de um ficheiro JSON."""
+    with open(path, encoding="utf-8") as f:
+        return FloorPlan.fromDict(json.load(f))
+
+
+def save(plan, path):
+    """Grava uma planta num ficheiro JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan.toDict(), f, ensure_ascii=False)
+
+
+
+# -----------------------------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------------------------
+
+def main():
+    import simulador
+
+    parser = argparse.ArgumentParser(description="Gera plantas do hospital e executa episódios do simulador nelas.")
+    parser.add_argument('plan', nargs='?', help="ficheiro JSON da planta (por omissão, a original)")
+    parser.add_argument('-n', type=int, default=None, help="gerar uma planta com este número de divisões")
+    parser.add_argument('-s', type=int, default=0, help="semente da planta gerada e do episódio")
+    parser.add_argument('-o', default=None, help="gravar a planta neste ficheiro, sem executar o episódio")
+    parser.add_argument('-t', type=int, default=10000, help="ciclos do episódio")
+    args = parser.parse_args()
+
+    if args.plan:
+        plan = load(args.plan)
+    elif args.n is not None:
+        plan = generate(args.n, args.s)
+    else:
+        plan = original()
+    if args.o:
+        save(plan, args.o)
+        print("divisões:    {0}".format(len(plan.getRooms())))
+        print("dimensões:   {0} x {1}".format(plan.getWidth(), plan.getHeight()))
+        return
+
+    simulator = simulador.Simulator(plan=plan)
+    elapsed = simulator.run(simulador.RandomExplorer(args.s), args.t)
+    print("divisões:    {0}".format(len(plan.getRooms())))
+    print("ciclos:      {0}".format(args.t))
+    print("tempo:       {0:.3f} s".format(elapsed))
+    print("ciclos/s:    {0:.0f}".format(args.t / elapsed))
+    print("posição:     {0}".format(simulator.getPosition()))
+    for question in range(1, 9):
+        print("{0}- {1}".format(question, simulator.ask(question)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+"""
+registo.py
+
+Registo binário das leituras dos sensores recebidas pelo agente (as chamadas a work()) e a sua reprodução.
+O registo é um ficheiro só de acrescento, escrito com I/O em buffer, com um registo por ciclo:
+instante do relógio do robot, posição, bateria e identificadores dos objetos detetados.
+Os nomes dos objetos são guardados uma única vez, na primeira vez que aparecem, e depois referidos pelo identificador.
+A reprodução reconstrói o estado de uma sessão (Things, Robot e Hospital) tão depressa quanto o CPU o permita,
+com um relógio ReplayClock que repõe os instantes registados, pelo que as respostas são as da sessão original.
+
+Formato (little-endian): cabeçalho MAGIC + versão, seguido de registos que começam por uma etiqueta:
+    S  início de uma sessão     instante inicial do relógio (double)
+    N  nome de um objeto        comprimento (uint16) + nome em UTF-8; o identificador é o número de nomes anteriores
+    T  ciclo                    instante, x, y, bateria (doubles), tipos (byte), número de objetos (uint16),
+                                identificadores dos objetos (uint32)
+
+Uso: python src/registo.py ficheiro.log [-u ciclo] [-m texto|json]      (reproduz o registo)
+     python src/registo.py -g ficheiro.log [-t ciclos] [-s semente]   (grava um episódio do simulador headless)
+     Com -p planta.json, o episódio é gravado (e reproduzido) nessa planta do piso (ver planta.py).
+"""
+
+import argparse
+import os
+import struct
+import time
+
+import agente
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+LOG_MAGIC   = b"ANDL"
+LOG_VERSION = 1
+
+# Tamanho do buffer de escrita
+LOG_BUFFER = 1 << 16
+
+# LOG_*: Etiquetas dos registos
+LOG_START = b"S"
+LOG_NAME  = b"N"
+LOG_TICK  = b"T"
+
+# Estruturas dos registos (sem os identificadores dos objetos, que são uint32 em número variável)
+HEADER = struct.Struct("<4sH")
+START  = struct.Struct("<cd")
+NAME   = struct.Struct("<cH")
+TICK   = struct.Struct("<cddddBH")
+OBJECT = struct.Struct("<I")
+
+# INT_*: Bits do byte de tipos de um ciclo, para repor como inteiros os valores que o eram
+INT_X       = 1
+INT_Y       = 2
+INT_BATTERY = 4
+
+
+
+# -----------------------------------------------------------------------------
+# ESCRITA
+# -----------------------------------------------------------------------------
+
+class TickLogWriter:
+    """Escreve as leituras dos sensores de uma sessão num registo binário (ver AgentSession).
+    Se o ficheiro já existir, os novos registos são acrescentados e os nomes já registados são reutilizados;
+    um registo incompleto no fim do ficheiro (de um processo interrompido) é antes descartado, para que os novos
+    registos se sigam ao último registo completo e continuem a ser lidos. Um ficheiro sem o cabeçalho completo
+    (interrompido enquanto era criado) é tratado como vazio e reescrito.
+    Os registos ficam no buffer até flush() ou close(); pode ser usado como gestor de contexto."""
+
+    def __init__(self, path, buffering=LOG_BUFFER):
+        self._names = {}        # Nome de um objeto -> identificador
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            reader = TickLogReader(path)
+            self._names = {name: i for (i, name) in enumerate(reader.getNames())}
+            if reader.getEnd() < os.path.getsize(path):
+                os.truncate(path, reader.getEnd())
+            self._file = open(path, "ab", buffering)
+        else:
+            self._file = open(path, "wb", buffering)
+            self._file.write(HEADER.pack(LOG_MAGIC, LOG_VERSION))
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def start(self, timestamp):
+        """Regista o início de uma sessão, com o instante inicial do relógio do robot."""
+        self._file.write(START.pack(LOG_START, timestamp))
+
+
+    def record(self, timestamp, position, battery, objects):
+        """Regista um ciclo: os argumentos de work() e o instante do relógio do robot nesse ciclo."""
+        ids = []
+        for obj in objects:
+            i = self._names.get(obj)
+            if i is None:
+                i = self._names[obj] = len(self._names)
+                data = obj.encode("utf-8")
+                self._file.write(NAME.pack(LOG_NAME, len(data)) + data)
+            ids.append(i)
+        (x, y) = position
+        types = (INT_X if isinstance(x, int) else 0) | (INT_Y if isinstance(y, int) else 0) | \
+                (INT_BATTERY if isinstance(battery, int) else 0)
+        self._file.write(TICK.pack(LOG_TICK, timestamp, x, y, battery, types, len(ids)))
+        if ids:
+            self._file.write(struct.pack("<{0}I".format(len(ids)), *ids))
+
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+
+# -----------------------------------------------------------------------------
+# LEITURA
+# -----------------------------------------------------------------------------
+
+class TickLogReader:
+    """Lê um registo binário de uma só vez e percorre os seus registos.
+    A iteração devolve pares (LOG_START, instante) e (LOG_TICK, (instante, posição, bateria, objetos)),
+    com a posição como lista [x, y] e os objetos como lista de nomes, tal como recebidos por work().
+    Um registo incompleto no fim do ficheiro (por exemplo, de um processo interrompido) é ignorado;
+    getEnd() indica onde termina o último registo completo."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._data = f.read()
+        if len(self._data) < HEADER.size:
+            raise ValueError("Empty or truncated tick log: {0}".format(path))
+        (magic, version) = HEADER.unpack_from(self._data, 0)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError("Unknown tick log format: {0}".format(path))
+        self._names = None
+        self._end   = None
+
+
+    def getNames(self):
+        """Devolve os nomes dos objetos registados, pela ordem dos identificadores."""
+        if self._names is None:
+            for _ in self:
+                pass
+        return self._names
+
+
+    def getEnd(self):
+        """Devolve a posição no ficheiro a seguir ao último registo completo."""
+        if self._end is None:
+            for _ in self:
+                pass
+        return self._end
+
+
+    def __iter__(self):
+        data, size = self._data, len(self._data)
+        names = []
+        offset = HEADER.size
+        while offset < size:
+            tag = data[offset:offset + 1]
+            if tag == LOG_TICK:
+                if offset + TICK.size > size:
+                    break
+                (_, timestamp, x, y, battery, types, count) = TICK.unpack_from(data, offset)
+                end = offset + TICK.size + count * OBJECT.size
+                if end > size:
+                    break
+                ids = struct.unpack_from("<{0}I".format(count), data, offset + TICK.size) if count else ()
+                position = [int(x) if types & INT_X else x, int(y) if types & INT_Y else y]
+                battery = int(battery) if types & INT_BATTERY else battery
+                offset = end
+                yield (LOG_TICK, (timestamp, position, battery, [names[i] for i in ids]))
+            elif tag == LOG_NAME:
+                if offset + NAME.size > size:
+                    break
+                (_, length) = NAME.unpack_from(data, offset)
+                end = offset + NAME.size + length
+                if end > size:
+                    break
+                names.append(data[offset + NAME.size:end].decode("utf-8"))
+                offset = end
+            elif tag == LOG_START:
+                if offset + START.size > size:
+                    break
+                (_, timestamp) = START.unpack_from(data, offset)
+                offset += START.size
+                yield (LOG_START, timestamp)
+            else:
+                raise ValueError("Corrupted tick log at offset {0}".format(offset))
+        self._names = names
+        self._end   = offset
+
+
+
+# -----------------------------------------------------------------------------
+# REPRODUÇÃO
+# -----------------------------------------------------------------------------
+
+def replay(path, graph=None, estimator=agente.LeastSquaresEstimator, until=None, instrument=False, plan=None):
+    """Reproduz um registo numa sessão nova do agente, com um relógio ReplayClock que repõe os instantes registados.
+    Cada início de sessão no registo começa uma sessão nova; é devolvida a última, com o número de ciclos
+    que reproduziu. until limita o número total de ciclos reproduzidos (por exemplo, até ao ciclo de um incidente).
+    graph e estimator são passados à sessão (ver AgentSession) e devem ser os da sessão registada.
+    Com instrument, a instrumentação de cada sessão é ligada (ver Instrumentation).
+    plan é a planta do piso da sessão registada (ver planta.FloorPlan), ou None para o piso original."""
+    session, clock, ticks, total = None, None, 0, 0
+    for (tag, value) in TickLogReader(path):
+        if tag == LOG_START:
+            clock = agente.ReplayClock(start=value)
+            if plan is not None:
+                session = plan.createSession(graph=graph, clock=clock, estimator=estimator)
+            else:
+                session = agente.AgentSession(graph, clock, estimator)
+            if instrument:
+                session.instrumentation.enable()
+            ticks = 0
+        else:
+            if until is not None and total >= until:
+                break
+            if session is None:
+                raise ValueError("Tick log without a session start: {0}".format(path))
+            (timestamp, position, battery, objects) = value
+            clock.setTime(timestamp)
+            session.work(position, battery, objects)
+            ticks += 1
+            total += 1
+    return (session, ticks)
+
+
+
+# -----------------------------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------------------------
+
+def record(path, ticks, seed, plan=None):
+    """Grava num registo um episódio do simulador headless com o controlador RandomExplorer,
+    no piso original ou numa planta (ver planta.FloorPlan)."""
+    import mundo
+    import planta
+    import simulador
+
+    plan = plan or planta.original()
+    with TickLogWriter(path) as log:
+        session = plan.createSession(clock=agente.TickClock(1 / mundo.FPS), log=log)
+        simulator = simulador.Simulator(session, plan=plan)
+        elapsed = simulator.run(simulador.RandomExplorer(seed), ticks)
+    print("ciclos:      {0}".format(ticks))
+    print("tempo:       {0:.3f} s".format(elapsed))
+    print("ciclos/s:    {0:.0f}".format(ticks / elapsed))
+    print("tamanho:     {0} bytes".format(os.path.getsize(path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz (ou grava) um registo das leituras dos sensores do agente.")
+    parser.add_argument('log', help="ficheiro do registo")
+    parser.add_argument('-g', action='store_true', help="gravar um episódio do simulador headless em vez de reproduzir")
+    parser.add_argument('-t', type=int, default=10000, help="ciclos do episódio a gravar")
+    parser.add_argument('-s', type=int, default=0, help="semente do episódio a gravar")
+    parser.add_argument('-u', type=int, default=None, help="reproduzir apenas até este ciclo")
+    parser.add_argument('-m', choices=['texto', 'json'], default=None, help="mostrar a instrumentação da reprodução")
+    parser.add_argument('-p', default=None, help="ficheiro JSON da planta do piso (por omissão, o original)")
+    args = parser.parse_args()
+
+    plan = None
+    if args.p:
+        import planta
+        plan = planta.load(args.p)
+
+    if args.g:
+        record(args.log, args.t, args.s, plan)
+        return
+
+    start = time.perf_counter()
+    (session, ticks) = replay(args.log, until=args.u, instrument=args.m is not None, plan=plan)
+    elapsed = time.perf_counter() - start
+    print("ciclos:      {0}".format(ticks))
+    print("tempo:       {0:.3f} s".format(elapsed))
+    print("ciclos/s:    {0:.0f}".format(ticks / elapsed if elapsed > 0 else 0))
+    if session is not None:
+        for question in range(1, 9):
+            print("{0}- {1}".format(question, getattr(session, "resp{0}".format(question))()))
+        if args.m == 'texto':
+            print(session.instrumentation.toText())
+        elif args.m == 'json':
+            print(session.instrumentation.toJson())
+
+
+if __name__ == "__main__":
+    main()
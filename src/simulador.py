@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+
+"""
+simulador.py
+
+Simulador headless do hospital: reproduz o ciclo principal de ia.py (movimento, bateria, sensor e perguntas)
+sem janela, sem fontes e sem limitar a frequência do ciclo, para correr episódios de exploração
+tão depressa quanto o CPU o permita.
+Inclui também uma janela interativa, equivalente à de ia.py, que apenas redesenha o que muda em cada ciclo.
+Uso: python src/simulador.py [ciclos] [semente]
+     python src/simulador.py --janela [fps]        (fps 0: sem limite)
+"""
+
+import collections
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# O pygame é usado apenas para ler as imagens; sem ele, os objetos são tratados como retângulos cheios
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+import agente
+import mundo
+import planta
+
+
+# -----------------------------------------------------------------------------
+# CONSTANTES
+# -----------------------------------------------------------------------------
+
+# KEY_*: Teclas de movimento do simulador e o respetivo deslocamento
+KEY_UP    = 'w'
+KEY_DOWN  = 's'
+KEY_LEFT  = 'a'
+KEY_RIGHT = 'd'
+KEYS      = KEY_UP + KEY_DOWN + KEY_LEFT + KEY_RIGHT    # Ordem pela qual o simulador trata as teclas
+
+MOVES = {
+    KEY_UP:    (0, -mundo.STEP),
+    KEY_DOWN:  (0,  mundo.STEP),
+    KEY_LEFT:  (-mundo.STEP, 0),
+    KEY_RIGHT: ( mundo.STEP, 0)
+}
+
+# Píxeis que têm de estar livres (brancos) para o robot se mover em cada direção, relativos à sua posição
+PROBES = {
+    KEY_UP:    [(-12, -17), (0, -17), (12, -17)],
+    KEY_DOWN:  [(-12,  17), (0,  17), (12,  17)],
+    KEY_LEFT:  [(-17, -12), (-17, 0), (-17, 12)],
+    KEY_RIGHT: [( 17, -12), ( 17, 0), ( 17, 12)]
+}
+
+# BATTERY_*: Consumo da bateria (fração da carga atual)
+BATTERY_IDLE = 2000.0       # Por ciclo
+BATTERY_MOVE = 4000.0       # Por cada deslocamento
+BATTERY_QUESTION = {        # Por cada pergunta
+    1: 4000.0, 2: 4123.0, 3: 4000.0, 4: 4000.0,
+    5: 4000.0, 6: 3333.0, 7: 4123.0, 8: 4123.0
+}
+
+# SENSOR_*: Alcance do sensor (distância de Manhattan) e desvio aplicado à posição do robot
+SENSOR_RANGE  = 50
+SENSOR_OFFSET = -6
+
+# Cor de um píxel livre
+FREE = (255, 255, 255, 255)
+
+# Meia largura das imagens dos objetos e do robot
+SPRITE_HALF = mundo.SIZE_SPRITE // 2
+
+# Perguntas feitas ao agente através das teclas 1 a 8
+QUESTIONS = {
+    1: "1- Qual foi a penúltima pessoa que viste?",
+    2: "2- Em que tipo de sala estás agora?",
+    3: "3- Qual o caminho para a sala de enfermeiros mais próxima?",
+    4: "4- Qual a distância até ao médico mais próximo?",
+    5: "5- Quanto tempo achas que demoras a ir de onde estás até às escadas?",
+    6: "6- Quanto tempo achas que falta até ficares sem bateria?",
+    7: "7- Qual a probabilidade de encontrar um livro numa divisão, se já encontraste uma cadeira?",
+    8: "8- Se encontrares um enfermeiro numa divisão, qual é a probabilidade de estar lá um doente?"
+}
+
+# WINDOW_*: Janela interativa
+WINDOW_CAPTION = "UBI -- IA 2020-21"
+WINDOW_HELP    = "Premir ESC para terminar, A,S,W,D para mover"
+WINDOW_EMPTY   = "Fiquei sem bateria!! Temos que terminar: premir ESC"
+WINDOW_FONTS   = ['dejavusans', 'couriernew', 'Papyrus', 'Comic Sans MS', 'timesnewroman']
+WINDOW_FONT    = 14
+WINDOW_COLOR   = (0, 0, 0)
+WINDOW_TEXTS   = 256            # Número máximo de textos desenhados guardados (os menos usados são descartados)
+
+# HUD_*: Posição dos textos na janela
+HUD_POSITION = (725, 584)
+HUD_BATTERY  = (700, 584)
+HUD_MESSAGE  = (0, 584)
+
+
+
+# -----------------------------------------------------------------------------
+# CENÁRIO
+# -----------------------------------------------------------------------------
+
+def loadImage(name):
+    """Carrega uma imagem do simulador. Não requer a inicialização do display, mas requer o pygame."""
+    return pygame.image.load(os.path.join(mundo.IMAGES, name))
+
+
+def renderScene(plan=None):
+    """Desenha o cenário estático (paredes, portas, objetos e carregadores) de uma planta (por omissão, a original)
+    numa superfície fora do ecrã, pela mesma ordem do simulador original."""
+    plan = plan or planta.original()
+    surface = pygame.Surface((plan.getWidth(), plan.getHeight()), 0, 32)
+    surface.fill((255, 255, 255))
+
+    # As paredes são cobertas por tijolos, recortados nos limites de cada parede
+    wall = loadImage(mundo.IMG_WALL)
+    for (x, y, width, height) in plan.getWalls():
+        for i in range(x, x + width, mundo.SIZE_WALL):
+            for j in range(y, y + height, mundo.SIZE_WALL):
+                surface.blit(wall, (i, j), (0, 0, min(mundo.SIZE_WALL, x + width - i), min(mundo.SIZE_WALL, y + height - j)))
+
+    door = loadImage(mundo.IMG_DOOR)
+    for position in plan.getDoors():
+        surface.blit(door, position)
+
+    for (_, image, objects) in plan.getObjects():
+        sprite = loadImage(image)
+        for ((x, y), _) in objects:
+            surface.blit(sprite, (x - SPRITE_HALF, y - SPRITE_HALF))
+
+    charger = loadImage(mundo.IMG_CHARGER)
+    for position in plan.getChargers():
+        surface.blit(charger, position)
+
+    return surface
+
+
+def loadMask(name):
+    """Devolve a máscara de ocupação de uma imagem: uma linha de bytes por linha de píxeis, com 0 nos píxeis brancos."""
+    image = loadImage(name)
+    (width, height) = image.get_size()
+    return [bytes(0 if tuple(image.get_at((x, y))) == FREE else 1 for x in range(width)) for y in range(height)]
+
+
+_masks = None
+
+def getMasks(images=()):
+    """Devolve as máscaras de ocupação das imagens dos objetos e dos carregadores (vazio sem o pygame),
+    acrescentando as de outras imagens usadas por uma planta."""
+    global _masks
+    if _masks is None:
+        _masks = {}
+        if pygame is not None:
+            for (_, image, _) in mundo.OBJECTS:
+                _masks[image] = loadMask(image)
+            _masks[mundo.IMG_CHARGER] = loadMask(mundo.IMG_CHARGER)
+    if pygame is not None:
+        for image in images:
+            if image not in _masks:
+                _masks[image] = loadMask(image)
+    return _masks
+
+
+def getOccupancyGrid(objects=None, plan=None):
+    """Devolve a grelha de ocupação do piso de uma planta (por omissão, a original) como mundo.OccupancyGrid.
+    Com o pygame disponível, as imagens com píxeis brancos (os livros) usam a sua máscara exata.
+    A grelha da disposição dos objetos da planta é construída apenas na primeira chamada."""
+    plan = plan or planta.original()
+    masks = getMasks(plan.getImages())
+    if objects is not None:
+        return plan.buildOccupancyGrid(masks, objects)
+    return plan.getOccupancyGrid(masks)
+
+
+
+# -----------------------------------------------------------------------------
+# SENSOR
+# -----------------------------------------------------------------------------
+
+class ProximityIndex:
+    """Índice em grelha de pontos, para encontrar os que estão a uma distância de Manhattan inferior a radius.
+    As células têm o lado igual a radius, pelo que basta consultar a célula do ponto e as 8 vizinhas;
+    o custo de uma consulta depende apenas do número de pontos próximos e não do total.
+    Os valores são devolvidos pela ordem em que os pontos foram dados."""
+
+    def __init__(self, radius, items):
+        self._radius = radius
+        self._cells  = {}       # (coluna, linha) -> [(ordem, x, y, valor)]
+        for (i, ((x, y), value)) in enumerate(items):
+            self._cells.setdefault((x // radius, y // radius), []).append((i, x, y, value))
+
+
+    def near(self, x, y):
+        """Devolve os valores dos pontos a uma distância de Manhattan de (x, y) inferior a radius."""
+        radius, cells = self._radius, self._cells
+        (col, row) = (x // radius, y // radius)
+        found = []
+        for c in (col - 1, col, col + 1):
+            for r in (row - 1, row, row + 1):
+                for entry in cells.get((c, r), ()):
+                    if abs(x - entry[1]) + abs(y - entry[2]) < radius:
+                        found.append(entry)
+        if len(found) > 1:
+            found.sort()
+        return [entry[3] for entry in found]
+
+
+
+# -----------------------------------------------------------------------------
+# SIMULADOR
+# -----------------------------------------------------------------------------
+
+class Simulator:
+    """Executa o ciclo principal do simulador para uma sessão do agente, um ciclo de cada vez.
+    Cada ciclo recebe as teclas de movimento premidas e, opcionalmente, uma pergunta (1 a 8);
+    a ordem dos passos e o consumo da bateria são os mesmos do simulador original.
+    objects (no formato de mundo.OBJECTS) e drain (consumo por ciclo) permitem variar o piso e a bateria;
+    plan permite usar outra planta (ver planta.FloorPlan), que dá o piso, a posição inicial e a carga por omissão
+    e as divisões da sessão criada pelo simulador.
+    Por omissão, a sessão do agente usa um relógio simulado (um ciclo a 50 por segundo), pelo que as
+    estimativas de tempo são as mesmas qualquer que seja a velocidade da simulação."""
+
+    def __init__(self, session=None, position=None, battery=None, objects=None, drain=BATTERY_IDLE, plan=None):
+        plan = plan or planta.original()
+        self.session   = session if session is not None else plan.createSession(clock=agente.TickClock(1 / mundo.FPS))
+        self._plan     = plan
+        self._grid     = getOccupancyGrid(objects, plan)
+        self._sensor   = ProximityIndex(SENSOR_RANGE, [
+            (point, category + agente.SEPARATOR + name)
+            for (category, _, items) in (objects or plan.getObjects()) for (point, name) in items
+        ])
+        self._chargers = ProximityIndex(SENSOR_RANGE, [(position, True) for position in plan.getChargers()])
+        self._position = list(position if position is not None else plan.getStart())
+        self._battery  = float(battery if battery is not None else plan.getBattery())
+        self._drain    = drain
+        self._drawn    = None       # Posição em que o robot foi desenhado no último ciclo
+        self._objects  = []         # Objetos detetados no último ciclo
+        self._ticks    = 0
+
+
+    # -------------------------------------------------------------------------
+    # GETTERS
+    # -------------------------------------------------------------------------
+
+    def getPosition(self):
+        return tuple(self._position)
+
+    def getBattery(self):
+        return self._battery
+
+    def getObjects(self):
+        return self._objects
+
+    def getTicks(self):
+        return self._ticks
+
+    def getPlan(self):
+        return self._plan
+
+
+    # -------------------------------------------------------------------------
+    # CICLO
+    # -------------------------------------------------------------------------
+
+    def isFree(self, x, y):
+        """Indica se o píxel (x, y) do ecrã estaria livre (branco) no último ciclo desenhado."""
+        if self._drawn is None:
+            return False        # Antes do primeiro ciclo o ecrã ainda está por desenhar
+        if abs(x - self._drawn[0]) <= SPRITE_HALF and abs(y - self._drawn[1]) <= SPRITE_HALF:
+            return False        # O próprio robot
+        return self._grid.isFree(x, y)
+
+
+    def canMove(self, key):
+        """Indica se o robot se pode deslocar na direção da tecla dada."""
+        (x, y) = self._position
+        return all(self.isFree(x + dx, y + dy) for (dx, dy) in PROBES[key])
+
+
+    def sense(self):
+        """Devolve os objetos ao alcance do sensor e recarrega a bateria junto de um carregador."""
+        x = self._position[0] + SENSOR_OFFSET
+        y = self._position[1] + SENSOR_OFFSET
+        if self._chargers.near(x, y):
+            self._battery = 100.0
+        return self._sensor.near(x, y)
+
+
+    def ask(self, question):
+        """Faz uma pergunta (1 a 8) ao agente e devolve a resposta. Consome bateria."""
+        answer = getattr(self.session, "resp{0}".format(question))()
+        self._battery -= self._battery / BATTERY_QUESTION[question]
+        return answer
+
+
+    def step(self, keys="", question=None):
+        """Executa um ciclo com as teclas de movimento dadas (por exemplo "wd") e, opcionalmente, uma pergunta.
+        Devolve a resposta à pergunta, ou None."""
+        answer = self.ask(question) if question is not None else None
+
+        if self._battery > 1:
+            for key in KEYS:
+                if key in keys and self.canMove(key):
+                    self._position[0] += MOVES[key][0]
+                    self._position[1] += MOVES[key][1]
+                    self._battery -= self._battery / BATTERY_MOVE
+        self._drawn = tuple(self._position)
+
+        if self._battery > 1.0:
+            self._battery -= self._battery / self._drain
+        else:
+            self._battery = 0.0
+
+        self._objects = self.sense()
+        self.session.work(list(self._position), self._battery, self._objects)
+        self._ticks += 1
+        return answer
+
+
+    def run(self, controller, ticks):
+        """Executa um número de ciclos, pedindo as teclas a controller(simulador) em cada um.
+        Devolve o tempo decorrido em segundos."""
+        start = time.perf_counter()
+        for _ in range(ticks):
+            self.step(controller(self))
+        return time.perf_counter() - start
+
+
+
+class RandomExplorer:
+    """Controlador que mantém uma direção aleatória até ficar bloqueado ou até a mudar ao acaso."""
+
+    def __init__(self, seed=None, turn=0.02):
+        self._random = random.Random(seed)
+        self._turn   = turn         # Probabilidade de mudar de direção em cada ciclo
+        self._key    = self._random.choice(KEYS)
+
+    def __call__(self, simulator):
+        if self._random.random() < self._turn or not simulator.canMove(self._key):
+            self._key = self._random.choice(KEYS)
+        return self._key
+
+
+
+# -----------------------------------------------------------------------------
+# JANELA
+# -----------------------------------------------------------------------------
+
+class Window:
+    """Janela interativa de um simulador.
+    O cenário estático é desenhado uma única vez numa superfície de fundo. Em cada ciclo são repostos
+    a partir do fundo apenas os retângulos do robot e dos textos do ciclo anterior, são desenhados os novos,
+    e só a união destes retângulos é atualizada no ecrã (display.update em vez de display.flip)."""
+
+    def __init__(self, simulator):
+        pygame.display.init()
+        pygame.font.init()
+        self._simulator  = simulator
+        plan = simulator.getPlan()
+        self._screen     = pygame.display.set_mode((plan.getWidth(), plan.getHeight()))
+        self._background = renderScene(plan).convert()
+        self._robot      = loadImage(mundo.IMG_ROBOT).convert()
+        self._font       = Window.loadFont(WINDOW_FONTS, WINDOW_FONT)
+        self._texts      = collections.OrderedDict()    # Texto -> imagem já desenhada, do menos para o mais recente
+        self._dirty      = []       # Retângulos desenhados no último ciclo
+        pygame.display.set_caption(WINDOW_CAPTION)
+        self._screen.blit(self._background, (0, 0))
+        pygame.display.flip()
+
+
+    @staticmethod
+    def loadFont(fonts, size):
+        """Devolve a primeira fonte do sistema disponível, ou a fonte por omissão do pygame."""
+        available = pygame.font.get_fonts()
+        for font in fonts:
+            if font.lower().replace(" ", "") in available:
+                return pygame.font.SysFont(font, size)
+        return pygame.font.Font(None, size)
+
+
+    def text(self, text):
+        """Devolve a imagem de um texto, desenhando-o apenas se não estiver entre os WINDOW_TEXTS usados mais recentemente.
+        Os textos que mudam em cada ciclo (a posição) não acumulam imagens ao longo de uma sessão longa."""
+        texts = self._texts
+        if text in texts:
+            texts.move_to_end(text)
+        else:
+            texts[text] = self._font.render(text, True, WINDOW_COLOR)
+            if len(texts) > WINDOW_TEXTS:
+                texts.popitem(last=False)
+        return texts[text]
+
+
+    def draw(self):
+        """Desenha o estado atual do simulador, atualizando apenas os retângulos que mudaram."""
+        for rect in self._dirty:
+            self._screen.blit(self._background, rect, rect)
+
+        (x, y) = self._simulator.getPosition()
+        battery = self._simulator.getBattery()
+        drawn = [
+            self._screen.blit(self._robot, (x - SPRITE_HALF, y - SPRITE_HALF)),
+            self._screen.blit(self.text(str([x, y])), HUD_POSITION),
+            self._screen.blit(self.text(str(int(battery))), HUD_BATTERY)
+        ]
+        if battery <= 1.0:
+            drawn.append(self._screen.blit(self.text(WINDOW_EMPTY), HUD_MESSAGE))
+
+        pygame.display.update(self._dirty + drawn)
+        self._dirty = drawn
+
+
+    def showFps(self, fps):
+        pygame.display.set_caption("{0} ({1:.0f} fps)".format(WINDOW_CAPTION, fps))
+
+
+    def close(self):
+        pygame.display.quit()
+        pygame.font.quit()
+
+
+
+# -----------------------------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------------------------
+
+def play(fps=mundo.FPS):
+    """Executa o simulador numa janela, controlado pelo teclado como em ia.py.
+    fps limita a frequência do ciclo (0: sem limite); a frequência real é mostrada no título da janela."""
+    keys = {pygame.K_w: KEY_UP, pygame.K_s: KEY_DOWN, pygame.K_a: KEY_LEFT, pygame.K_d: KEY_RIGHT}
+    questions = {pygame.K_1 + i - 1: i for i in QUESTIONS}
+
+    simulator = Simulator()
+    window = Window(simulator)
+    clock = pygame.time.Clock()
+    print(WINDOW_HELP)
+
+    held, previous, done = set(), [], False
+    while not done:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                done = True
+            elif event.type == pygame.KEYDOWN and event.key in keys:
+                held.add(keys[event.key])
+            elif event.type == pygame.KEYUP and event.key in keys:
+                held.discard(keys[event.key])
+            elif event.type == pygame.KEYDOWN and event.key in questions:
+                print(QUESTIONS[questions[event.key]])
+                print(simulator.ask(questions[event.key]))
+
+        simulator.step("".join(held))
+        window.draw()
+
+        objects = simulator.getObjects()
+        if objects != previous and objects != []:
+            print(objects)
+        previous = objects
+
+        clock.tick(fps)
+        if simulator.getTicks() % mundo.FPS == 0:
+            window.showFps(clock.get_fps())
+
+    window.close()
+
+
+
+def main(ticks, seed):
+    simulator = Simulator()
+    elapsed = simulator.run(RandomExplorer(seed), ticks)
+    print("ciclos:      {0}".format(ticks))
+    print("tempo:       {0:.3f} s".format(elapsed))
+    print("ciclos/s:    {0:.0f}".format(ticks / elapsed))
+    print("posição:     {0}".format(simulator.getPosition()))
+    print("bateria:     {0:.2f}".format(simulator.getBattery()))
+    for question in range(1, 9):
+        print("{0}- {1}".format(question, simulator.ask(question)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--janela":
+        play(int(sys.argv[2]) if len(sys.argv) > 2 else mundo.FPS)
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 0)
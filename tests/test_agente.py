@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_agente.py
+
+Testes do modelo do mundo do agente.
+
+Uso: python -m unittest discover tests
+"""
+
+import itertools
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+import mundo
+import planta
+import simulador
+
+
+
+class ProbabilityTest(unittest.TestCase):
+
+    def visit(self, hospital, rooms, category):
+        """Percorre as salas dadas, encontrando em cada uma delas uma pessoa ou objeto da categoria dada."""
+        for (i, room) in enumerate(rooms):
+            hospital.updateFloor(room)
+            hospital.addObject(room, category, "{0}_{1}".format(category, i), (100.0 * i, 50.0))
+
+    def test_corridors_not_counted(self):
+        """Os corredores com pessoas não contam para a probabilidade, que nunca excede 1."""
+        hospital = agente.Hospital(agente.Robot(), agente.Things())
+        self.visit(hospital, [1, 2, 3, 11], 'enfermeiro')
+        self.assertEqual(hospital.getProbability(['enfermeiro']), 1.0)
+        self.assertEqual(hospital.getProbability([], ['enfermeiro']), 0.0)
+
+    def test_probability_bounded(self):
+        """Com pessoas em corredores e em metade das salas, a probabilidade fica em [0, 1]."""
+        hospital = agente.Hospital(agente.Robot(), agente.Things())
+        self.visit(hospital, [1, 2, 3, 4], 'enfermeiro')
+        self.visit(hospital, [11, 12], 'enfermeiro')
+        self.visit(hospital, [13, 14], 'cama')
+        for present in (['enfermeiro'], ['cama'], []):
+            probability = hospital.getProbability(present)
+            self.assertGreaterEqual(probability, 0.0)
+            self.assertLessEqual(probability, 1.0)
+        self.assertEqual(hospital.getProbability(['enfermeiro']), 0.5)
+
+    def test_network_same_rooms(self):
+        """A rede Bayesiana é estimada sobre as mesmas salas, pelo que as marginais das raízes coincidem."""
+        hospital = agente.Hospital(agente.Robot(), agente.Things())
+        self.visit(hospital, [1, 2, 3], 'cama')
+        self.visit(hospital, [11, 12, 13], 'cama')
+        self.visit(hospital, [14], 'cadeira')
+        for category in ('cama', 'cadeira', 'mesa'):
+            self.assertAlmostEqual(hospital.getBayesianProbability([category]), hospital.getProbability([category]))
+
+
+
+class RoomLocatorTest(unittest.TestCase):
+
+    def rectangles(self, seed, count=60):
+        """Retângulos inteiros ao acaso, muitos deles sobrepostos, e alguns degenerados ou com limites partilhados."""
+        rng = random.Random(seed)
+        rooms = []
+        for _ in range(count):
+            (x0, y0) = (rng.randint(0, 900), rng.randint(0, 600))
+            (w, h) = (rng.choice([0, 10, 45, 120, 300]), rng.choice([0, 10, 45, 120, 300]))
+            rooms.append([(x0, x0 + w), (y0, y0 + h)])
+        return rooms
+
+    def assertSameRooms(self, rooms, points, **options):
+        """Localiza os pontos, pela ordem dada, com a grelha e com a pesquisa linear, incluindo a memorização."""
+        (grid, linear) = (agente.GridRoomLocator(rooms, **options), agente.LinearRoomLocator(rooms))
+        for (x, y) in points:
+            self.assertEqual(grid.locate(x, y), linear.locate(x, y), (x, y))
+
+    def test_random_rooms(self):
+        """A grelha dá a mesma divisão que a pesquisa linear, incluindo nas sobreposições, em que prevalece a de menor índice."""
+        for seed in range(5):
+            rooms = self.rectangles(seed)
+            rng = random.Random(seed)
+            points = [(rng.randint(-10, 1250), rng.randint(-10, 950)) for _ in range(2000)]
+            # Limites das divisões e percursos contínuos, que exercitam a memorização da última divisão
+            points += [(x, y) for ((x0, x1), (y0, y1)) in rooms for x in (x0, x1) for y in (y0, y1)]
+            points += [(x, 300) for x in range(0, 1200, 3)] + [(450, y) for y in range(0, 900, 3)]
+            for cell in (None, 7, 100):
+                self.assertSameRooms(rooms, points, cell=cell)
+
+    def test_original_floor(self):
+        """No piso original (com os corredores sobrepostos), a grelha coincide com a pesquisa linear em todos os pontos."""
+        points = [(x, y) for x in range(0, mundo.WIDTH, 5) for y in range(0, mundo.HEIGHT, 5)]
+        self.assertSameRooms(agente.Hospital._rooms, points)
+
+
+
+class DoorPathsTest(unittest.TestCase):
+
+    def edges(self, graph):
+        g = graph.toNetworkx()
+        return sorted((min(u, v), max(u, v), w) for (u, v, w) in g.edges(data=agente.MAP_DISTANCE))
+
+    def assertIncrementalEqualsFull(self, session):
+        hospital = session.hospital
+        before = self.edges(hospital.getMapGraph())
+        hospital.computeDirectDoorPaths()
+        self.assertEqual(self.edges(hospital.getMapGraph()), before)
+
+    def test_incremental_equals_full(self):
+        """As ligações entre portas criadas a cada porta nova são as de uma recomputação sobre todo o piso."""
+        plan = planta.original()
+        session = plan.createSession(clock=agente.TickClock(1 / mundo.FPS))
+        simulador.Simulator(session, plan=plan).run(simulador.RandomExplorer(2), 20000)
+        self.assertIncrementalEqualsFull(session)
+
+        # Num piso gerado, o robot salta entre salas ao acaso, o que cria muitas portas por sala
+        plan = planta.generate(120, seed=4)
+        rng = random.Random(4)
+        session = plan.createSession(clock=agente.TickClock(1 / mundo.FPS))
+        for _ in range(600):
+            ((x0, x1), (y0, y1)) = plan.getRooms()[rng.randrange(1, len(plan.getRooms()))]
+            session.work([rng.randint(x0 + 1, x1 - 1), rng.randint(y0 + 1, y1 - 1)], 100.0, [])
+        self.assertGreater(session.hospital.getMapGraph().number_of_edges(), 2000)
+        self.assertIncrementalEqualsFull(session)
+
+
+
+class SpatialIndexTest(unittest.TestCase):
+
+    def points(self, seed, count=300):
+        """Pontos ao acaso, muitos deles sobre os limites das células e com posições repetidas (empates)."""
+        rng = random.Random(seed)
+        points = []
+        for i in range(count):
+            if i % 3 == 0:
+                (x, y) = (50.0 * rng.randint(-4, 8), 50.0 * rng.randint(-4, 8))
+            elif i % 3 == 1:
+                (x, y) = (float(rng.randint(-200, 400)), float(rng.randint(-200, 400)))
+            else:
+                (x, y) = (rng.uniform(-200, 400), rng.uniform(-200, 400))
+            points.append((x, y, "p{0}".format(i)))
+        return points
+
+    def scan(self, points, x, y):
+        """Pesquisa linear: (distância, ordem de inserção, valor) de todos os pontos, do mais próximo para o mais afastado."""
+        return sorted((math.hypot(px - x, py - y), order, value) for (order, (px, py, value)) in enumerate(points))
+
+    def test_empty(self):
+        index = agente.SpatialIndex()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.nearest(0, 0, 3), [])
+        self.assertEqual(index.within(0, 0, 1000), [])
+
+    def test_nearest(self):
+        """Os k mais próximos coincidem com a pesquisa linear, com os empates a favor do inserido primeiro."""
+        for seed in range(5):
+            points = self.points(seed)
+            index = agente.SpatialIndex()
+            for (x, y, value) in points:
+                index.add(x, y, value)
+            rng = random.Random(seed)
+            queries = [(0.0, 0.0), (50.0, 50.0), (-1000.0, 2000.0)] + [(50.0 * rng.randint(-5, 9), rng.uniform(-300, 500)) for _ in range(30)]
+            for (x, y) in queries:
+                expected = self.scan(points, x, y)
+                for k in (1, 2, 7, len(points) + 5):
+                    self.assertEqual(index.nearest(x, y, k), [(d, value) for (d, _, value) in expected[:k]])
+
+    def test_ties(self):
+        """Pontos à mesma distância, em células diferentes: prevalece o inserido primeiro."""
+        index = agente.SpatialIndex()
+        for (x, y, value) in [(100, 0, 'e'), (0, 100, 's'), (-100, 0, 'o'), (0, -100, 'n'), (0, 0, 'c')]:
+            index.add(x, y, value)
+        self.assertEqual(index.nearest(0, 0, 1), [(0.0, 'c')])
+        self.assertEqual(index.nearest(0, 0, 3), [(0.0, 'c'), (100.0, 'e'), (100.0, 's')])
+        self.assertEqual([v for (_, v) in index.nearest(50, 50, 4)], ['e', 's', 'c', 'o'])
+
+    def test_within(self):
+        """Os pontos num raio coincidem com a pesquisa linear, incluindo os que estão exatamente à distância radius."""
+        points = self.points(7)
+        index = agente.SpatialIndex()
+        for (x, y, value) in points:
+            index.add(x, y, value)
+        for (x, y) in [(0.0, 0.0), (50.0, 100.0), (123.4, -56.7), (5000.0, 5000.0)]:
+            for radius in (0.0, 49.9, 50.0, 100.0, 275.0, 10000.0):
+                expected = [(d, value) for (d, order, value) in sorted(self.scan(points, x, y), key=lambda e: e[1]) if d <= radius]
+                self.assertEqual(index.within(x, y, radius), expected)
+
+
+
+class BayesianNetworkTest(unittest.TestCase):
+
+    def counter(self, seed, rooms=40):
+        """Contador com salas ao acaso e os conjuntos de categorias de cada sala."""
+        rng = random.Random(seed)
+        counter = agente.CooccurrenceCounter(agente.CATEGORY_ALL)
+        contents = []
+        for room in range(rooms):
+            categories = {c for c in agente.CATEGORY_ALL if rng.random() < 0.4}
+            counter.addRoom(room)
+            for c in categories:
+                counter.add(room, c)
+            contents.append(categories)
+        return (counter, contents)
+
+    def enumerate(self, contents, parents=agente.NETWORK_DEFAULT):
+        """Distribuição conjunta da rede por enumeração de todas as atribuições, com as tabelas estimadas
+        diretamente das salas: {atribuição (frozenset dos pares (categoria, presente)): probabilidade}."""
+        def probability(variable, assignment):
+            rooms = [r for r in contents if all((p in r) == assignment[p] for p in parents[variable])]
+            if not rooms:
+                rooms = contents
+            p = sum(1 for r in rooms if variable in r) / len(rooms)
+            return p if assignment[variable] else 1.0 - p
+        joint = {}
+        for values in itertools.product((False, True), repeat=len(parents)):
+            assignment = dict(zip(parents, values))
+            product = 1.0
+            for variable in parents:
+                product *= probability(variable, assignment)
+            joint[frozenset(assignment.items())] = product
+        return joint
+
+    def bruteForce(self, joint, event, given):
+        def marginal(assignment):
+            return sum(p for (a, p) in joint.items() if set(assignment.items()) <= a)
+        both = dict(given)
+        both.update(event)
+        return marginal(both) / marginal(given)
+
+    def test_query(self):
+        """As respostas por eliminação de variáveis coincidem com a enumeração da distribuição conjunta."""
+        queries = [
+            ({'cama': True}, {}),
+            ({'doente': True}, {}),
+            ({'medico': True}, {}),
+            ({'doente': True}, {'cama': True}),
+            ({'medico': True}, {'enfermeiro': True, 'livro': False}),
+            ({'livro': True}, {'medico': True}),
+            ({'cadeira': False, 'doente': True}, {'mesa': True}),
+            ({'enfermeiro': True}, {'medico': False, 'cama': True})
+        ]
+        for seed in range(5):
+            (counter, contents) = self.counter(seed)
+            network = agente.BayesianNetwork(counter)
+            joint = self.enumerate(contents)
+            self.assertAlmostEqual(sum(joint.values()), 1.0)
+            for (event, given) in queries:
+                with self.subTest(seed=seed, event=event, given=given):
+                    self.assertAlmostEqual(network.query(event, given), self.bruteForce(joint, event, given))
+
+    def test_zero_probability_evidence(self):
+        """Evidência com probabilidade nula (ou sem salas) lança ZeroDivisionError; evento incompatível dá 0."""
+        counter = agente.CooccurrenceCounter(agente.CATEGORY_ALL)
+        network = agente.BayesianNetwork(counter)
+        with self.assertRaises(ZeroDivisionError):
+            network.query(['cama'])
+        for room in range(5):
+            counter.add(room, 'mesa')
+        with self.assertRaises(ZeroDivisionError):
+            network.query(['livro'], ['cama'])
+        self.assertEqual(network.query({'mesa': False}, {'mesa': True}), 0.0)
+        self.assertEqual(network.query(['mesa']), 1.0)
+
+
+
+class GraphTest(unittest.TestCase):
+
+    def build(self, seed, nodes=40, edges=300):
+        """Grafos NetworkxGraph e CompactGraph com as mesmas arestas ao acaso, algumas redefinidas várias vezes,
+        com pesos inteiros para que haja empates nos caminhos mais curtos."""
+        rng = random.Random(seed)
+        graphs = (agente.NetworkxGraph(), agente.CompactGraph())
+        for _ in range(edges):
+            (u, v, w) = ("n{0}".format(rng.randrange(nodes)), "n{0}".format(rng.randrange(nodes)), float(rng.randint(1, 5)))
+            for g in graphs:
+                g.add_edge(u, v, weight=w)
+        return graphs
+
+    def assertSameGraph(self, expected, graph):
+        self.assertEqual(sorted(graph), sorted(expected))
+        self.assertEqual(graph.number_of_edges(), expected.number_of_edges())
+        for n in expected:
+            self.assertEqual(sorted(graph.weightedNeighbors(n)), sorted(expected.weightedNeighbors(n)))
+
+    def test_compaction(self):
+        """As arestas fora do CSR, antes e depois de serem integradas, e as redefinições de pesos em ambos."""
+        (expected, graph) = (agente.NetworkxGraph(), agente.CompactGraph())
+        edges = [(i, i + 1, 1.0) for i in range(200)] + [(i // 2, i + 1, 2.0) for i in range(0, 200, 3)]
+        edges += [(0, 1, 7.0), (200, 199, 8.0)]     # Redefinições: no CSR e fora dele
+        for (u, v, w) in edges:
+            expected.add_edge(u, v, weight=w)
+            graph.add_edge(u, v, weight=w)
+        self.assertGreater(len(graph._indices), 0)
+        self.assertGreater(graph._pending, 0)
+        self.assertEqual(graph.get_edge_data(1, 0), {agente.MAP_DISTANCE: 7.0})
+        self.assertEqual(graph.get_edge_data(199, 200), {agente.MAP_DISTANCE: 8.0})
+        self.assertSameGraph(expected, graph)
+        graph.getAdjacency()
+        self.assertEqual(graph._pending, 0)
+        self.assertSameGraph(expected, graph)
+
+    def test_equivalence(self):
+        """CompactGraph tem as mesmas arestas, adjacência e caminhos mais curtos que NetworkxGraph."""
+        for seed in range(20):
+            (expected, graph) = self.build(seed)
+            self.assertSameGraph(expected, graph)
+            for source in ("n0", "n1", "n7"):
+                if source in expected:
+                    self.assertEqual(graph.shortestPaths(source), expected.shortestPaths(source))
+            copy = agente.CompactGraph()
+            (labels, indptr, indices, weights) = expected.getAdjacency(weighted=True)
+            copy.setAdjacency(labels, indptr, indices, weights)
+            self.assertSameGraph(expected, copy)
+            self.assertSameGraph(expected, agente.NetworkxGraph(graph.toNetworkx()))
+
+    def test_path_cache(self):
+        """A cache de caminhos dá as mesmas linhas com os dois grafos, incluindo depois de novas arestas."""
+        (expected, graph) = self.build(3)
+        caches = (agente.PathCache(expected), agente.PathCache(graph))
+        for cache in caches:
+            cache.row("n0")
+        for (u, v, w) in (("n0", "n39", 1.0), ("n5", "n6", 0.5)):
+            for (g, cache) in zip((expected, graph), caches):
+                data = g.get_edge_data(u, v)
+                g.add_edge(u, v, weight=w)
+                cache.edgeChanged(u, v, data[agente.MAP_DISTANCE] if data is not None else None, w)
+            self.assertEqual(caches[1].row("n0")[0], caches[0].row("n0")[0])
+        self.assertEqual(caches[1].row("n0")[0], expected.shortestPaths("n0")[0])
+
+
+
+class PathCacheTest(unittest.TestCase):
+
+    def test_bounded_rows(self):
+        """A cache guarda no máximo capacity linhas, descartando a usada há mais tempo, e continua correta."""
+        graph = agente.NetworkxGraph()
+        for i in range(9):
+            graph.add_edge(i, i + 1, weight=1.0)
+        cache = agente.PathCache(graph, capacity=3)
+        for source in range(10):
+            cache.row(source)
+        cache.row(7)
+        cache.row(0)
+        self.assertEqual(len(cache._rows), 3)
+        self.assertEqual(list(cache._rows), [9, 7, 0])
+        graph.add_edge(0, 9, weight=1.0)
+        cache.edgeChanged(0, 9, None, 1.0)
+        self.assertEqual(cache.distance(0, 9), 1.0)
+        self.assertEqual(cache.distance(7, 0), 3.0)
+        self.assertEqual(cache.distance(4, 0), 4.0)
+
+
+
+
+class RobotTest(unittest.TestCase):
+
+    def test_clock_without_timestamps(self):
+        """Um ReplayClock sem mais instantes não faz avançar o tempo: as leituras seguintes não dão amostras de velocidade."""
+        robot = agente.Robot(clock=agente.ReplayClock([0.0, 0.02]))
+        for i in range(5):
+            robot.updateRobot((100 + 3 * i, 100), 100.0 - i)
+        self.assertEqual(robot.getTickTime(), 0.02)
+        self.assertAlmostEqual(robot.getState()['velocity'][1], 3 / 0.02)
+
+    def drain(self, estimator):
+        """Robot com um consumo exponencial da bateria, que a reta de todas as amostras já leva a zero."""
+        robot = agente.Robot(clock=agente.TickClock(1.0), estimator=estimator)
+        battery = 100.0
+        for i in range(60):
+            battery *= 0.95
+            robot.updateRobot((100 + i, 100), battery)
+        return robot
+
+    def test_battery_root_in_the_past(self):
+        """Sem estimativa quando a reta estimada atinge o nível num instante passado, em vez de um tempo nulo."""
+        with self.assertRaises(Exception):
+            self.drain(agente.LeastSquaresEstimator).predictTimeFromBattery(0.0)
+        (t, low, high) = self.drain(lambda: agente.WindowEstimator(10)).predictTimeFromBattery(0.0)
+        self.assertGreater(t, 0.0)
+        self.assertLessEqual(0.0, low)
+        self.assertLessEqual(low, t)
+        self.assertLessEqual(t, high)
+
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        """Os percentis do histograma ficam acima do valor exato, com um erro relativo inferior a 2^-bits."""
+        rng = random.Random(0)
+        for bits in (2, agente.HISTOGRAM_BITS, 8):
+            histogram = agente.LatencyHistogram(bits)
+            values = [int(10 ** rng.uniform(0, 10)) for _ in range(5000)] + [0, 1, 2, 3]
+            for value in values:
+                histogram.record(value)
+            values.sort()
+            self.assertEqual((histogram.getCount(), histogram.getMin(), histogram.getMax()), (len(values), values[0], values[-1]))
+            self.assertEqual(histogram.getTotal(), sum(values))
+            for percentile in (0, 1, 10, 50, 90, 99, 99.9, 100):
+                exact = values[max(1, math.ceil(percentile / 100 * len(values))) - 1]
+                reported = histogram.getPercentile(percentile)
+                self.assertGreaterEqual(reported, exact)
+                self.assertLess(reported - exact, max(exact * 2 ** -bits, 1))
+
+    def test_small_values_exact(self):
+        """Os valores abaixo de 2^(bits+1) são guardados em classes exatas."""
+        histogram = agente.LatencyHistogram(3)
+        for value in range(16):
+            histogram.record(value)
+        self.assertEqual([histogram.getPercentile(100 * (v + 1) / 16) for v in range(16)], list(range(16)))
+
+    def test_disable_restores_methods(self):
+        """Depois de disable() as instâncias voltam a usar os métodos originais das classes, sem invólucros."""
+        for graph in (agente.NetworkxGraph, agente.CompactGraph):
+            session = agente.AgentSession(graph, agente.TickClock())
+            instrumentation = session.instrumentation
+            methods = [(instance, name) for (instance, name, _) in instrumentation._stages() + instrumentation._events()]
+            for _ in range(2):
+                instrumentation.enable()
+                instrumentation.enable()
+                self.assertTrue(all(name in vars(instance) for (instance, name) in methods))
+                session.work([100, 100], 100.0, [])
+                session.resp1()
+                instrumentation.disable()
+                instrumentation.disable()
+                for (instance, name) in methods:
+                    self.assertNotIn(name, vars(instance))
+                    self.assertIs(getattr(instance, name).__func__, getattr(type(instance), name))
+            self.assertEqual(instrumentation.getSummary()['stages']['work']['count'], 2)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
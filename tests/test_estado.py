@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_estado.py
+
+Testes dos instantâneos binários do modelo do mundo.
+
+Uso: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+import estado
+import mundo
+import simulador
+
+
+GRAPHS = [agente.NetworkxGraph, agente.CompactGraph]
+
+
+def answers(session):
+    """Respostas da sessão às perguntas 1 a 8."""
+    return [getattr(session, "resp{0}".format(question))() for question in range(1, 9)]
+
+
+def contents(graph):
+    """Nodos (com os atributos) e arestas (com os pesos) de um grafo, para comparação."""
+    g = graph.toNetworkx()
+    nodes = sorted((str(n), sorted(data.items(), key=str)) for (n, data) in g.nodes(data=True))
+    edges = sorted(tuple(sorted((str(u), str(v)))) + (data.get('weight'),) for (u, v, data) in g.edges(data=True))
+    return (nodes, edges)
+
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        """As respostas e os grafos floor e map de uma sessão sobrevivem a um instantâneo, com cada grafo."""
+        for graph in GRAPHS:
+            with self.subTest(graph=graph.__name__):
+                session = agente.AgentSession(graph, agente.TickClock(1 / mundo.FPS))
+                simulador.Simulator(session).run(simulador.RandomExplorer(2), 10000)
+                restored = estado.loads(estado.dumps(session), graph=graph, clock=agente.TickClock(1 / mundo.FPS))
+                self.assertIsInstance(restored.hospital.getMapGraph(), graph)
+                self.assertEqual(answers(restored), answers(session))
+                self.assertEqual(contents(restored.hospital.getFloorGraph()), contents(session.hospital.getFloorGraph()))
+                self.assertEqual(contents(restored.hospital.getMapGraph()), contents(session.hospital.getMapGraph()))
+                self.assertEqual(estado.dumps(restored), estado.dumps(session))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_registo.py
+
+Testes do registo binário das leituras dos sensores e da sua reprodução.
+
+Uso: python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import agente
+import mundo
+import planta
+import registo
+import simulador
+
+
+def answers(session):
+    """Respostas da sessão às perguntas 1 a 8."""
+    return [getattr(session, "resp{0}".format(question))() for question in range(1, 9)]
+
+
+def ticks(path):
+    """Número de ciclos lidos de um registo."""
+    return sum(1 for (tag, _) in registo.TickLogReader(path) if tag == registo.LOG_TICK)
+
+
+
+class TickLogTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sessao.log")
+
+    def write(self, start, count):
+        """Acrescenta ao registo uma sessão com count ciclos, a partir do instante start."""
+        with registo.TickLogWriter(self.path) as log:
+            log.start(start)
+            for i in range(count):
+                log.record(start + 0.02 * i, (100 + i, 100.5), 100.0 - 0.01 * i, ["cama_{0}".format(i % 7)])
+
+    def test_replay(self):
+        """A reprodução de um episódio gravado dá as mesmas respostas que a sessão original."""
+        plan = planta.original()
+        with registo.TickLogWriter(self.path) as log:
+            session = plan.createSession(clock=agente.TickClock(1 / mundo.FPS), log=log)
+            simulador.Simulator(session, plan=plan).run(simulador.RandomExplorer(2), 10000)
+        (replayed, count) = registo.replay(self.path, plan=plan)
+        self.assertEqual(count, 10000)
+        self.assertEqual(answers(replayed), answers(session))
+
+    def test_append_after_truncated_record(self):
+        """Depois de um registo incompleto no fim do ficheiro, os registos acrescentados continuam a ser lidos."""
+        self.write(0.0, 300)
+        os.truncate(self.path, os.path.getsize(self.path) - 5)
+        self.assertEqual(ticks(self.path), 299)
+        self.write(100.0, 50)
+        reader = registo.TickLogReader(self.path)
+        self.assertEqual(ticks(self.path), 349)
+        self.assertEqual(reader.getEnd(), os.path.getsize(self.path))
+        self.assertEqual(len(reader.getNames()), 7)
+
+    def test_truncated_header(self):
+        """Um ficheiro interrompido durante a escrita do cabeçalho é reescrito."""
+        with open(self.path, "wb") as f:
+            f.write(registo.LOG_MAGIC[:2])
+        self.write(0.0, 10)
+        self.assertEqual(ticks(self.path), 10)
+
+
+
+if __name__ == "__main__":
+    unittest.main()